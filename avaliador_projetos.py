@@ -1,5 +1,17 @@
+import datetime
 import streamlit as st
-from funcoes_auxiliares import conectar_mongo_cepf_gestao  # Função personalizada para conectar ao MongoDB
+from funcoes_auxiliares import conectar_mongo_ieb_selecao, ler_configuracao  # Função personalizada para conectar ao MongoDB
+from funcoes_avaliacoes import (
+    chave_avaliacao, respostas_alteradas, salvar_rascunho, enviar_avaliacao, status_avaliacoes,
+    STATUS_ENVIADA
+)
+from pymongo.errors import OperationFailure
+from funcoes_ranking import atualizar_ranking_projeto
+from funcoes_atribuicoes import atribuicoes_do_avaliador, marcar_atribuicao_concluida
+from funcoes_formulario import (
+    TIPOS_SEM_RESPOSTA, valor_vazio, iniciar_respostas, respostas_da_tela,
+    validadores_estagio, erros_respostas, formulario_por_secoes
+)
 
 
 ###########################################################################################################
@@ -7,17 +19,15 @@ from funcoes_auxiliares import conectar_mongo_cepf_gestao  # Função personaliz
 ###########################################################################################################
 
 # Conecta-se ao banco de dados MongoDB (usa cache automático para melhorar performance)
-db = conectar_mongo_cepf_gestao()
+db = conectar_mongo_ieb_selecao()
 
 # Define as coleções específicas que serão utilizadas a partir do banco
+col_editais = db["editais"]
+col_avaliacoes = db["avaliacoes"]
 
-# # Pessoas
-# col_pessoas = db["pessoas"]
-# df_pessoas = col_pessoas.find()
 
-# Projetos
-col_projetos = db["projetos"]
-df_projetos = col_projetos.find()
+# Intervalo (segundos) do salvamento automático do rascunho. Opcional em [configuracoes] no secrets.toml.
+INTERVALO_AUTOSALVAR = int(ler_configuracao("autosalvar_segundos", 10))
 
 
 
@@ -26,79 +36,210 @@ df_projetos = col_projetos.find()
 ###########################################################################################################
 
 
+def projetos_do_avaliador(id_avaliador):
+    """
+    Projetos atribuídos ao avaliador, um item por (edital, estágio, projeto),
+    com o nome do edital, o nome do estágio e as perguntas do estágio.
+    """
+
+    atribuicoes = atribuicoes_do_avaliador(db, id_avaliador)
+
+    editais = {
+        e["codigo_edital"]: e
+        for e in col_editais.find(
+            {"codigo_edital": {"$in": list({a["codigo_edital"] for a in atribuicoes})}},
+            {"codigo_edital": 1, "nome_edital": 1, "estagios": 1, "versao": 1}
+        )
+    }
+
+    estagios = {
+        (codigo_edital, e.get("id_estagio")): e
+        for codigo_edital, edital in editais.items()
+        for e in edital.get("estagios", [])
+    }
+
+    itens = []
+
+    for atribuicao in atribuicoes:
+        edital = editais.get(atribuicao["codigo_edital"])
+        estagio = estagios.get((atribuicao["codigo_edital"], atribuicao["id_estagio"]))
+        if not edital or not estagio:
+            continue
+
+        itens.append({
+            "codigo_edital": edital["codigo_edital"],
+            "nome_edital": edital.get("nome_edital", ""),
+            "versao": edital.get("versao", 0),
+            "id_estagio": estagio["id_estagio"],
+            "nome_estagio": estagio["nome_estagio"],
+            "codigo_recebimento": atribuicao["codigo_recebimento"],
+            "perguntas": sorted(estagio.get("perguntas_estagio", []), key=lambda p: p.get("ordem", 9999)),
+        })
+
+    return itens
+
+
+
+def iniciar_sessao_avaliacao(chave: dict, chave_sessao: str, perguntas: list, validadores: dict):
+    """
+    Na primeira vez que o projeto é aberto na sessão, lê a avaliação do banco, guarda a cópia
+    do que está salvo e inicia com ela as respostas do formulário.
+    Respostas que não valem mais (ex.: opção removida da pergunta) começam vazias.
+    """
+
+    if f"salvas_{chave_sessao}" not in st.session_state:
+        avaliacao = col_avaliacoes.find_one(chave, {"respostas": 1, "status": 1}) or {}
+        respostas = avaliacao.get("respostas", {})
+
+        salvas = {
+            p["id_pergunta"]: respostas.get(p["id_pergunta"], valor_vazio(p["tipo"]))
+            for p in perguntas
+            if p["tipo"] not in TIPOS_SEM_RESPOSTA
+        }
+
+        tipos = {p["id_pergunta"]: p["tipo"] for p in perguntas if p["tipo"] not in TIPOS_SEM_RESPOSTA}
+        for id_pergunta in erros_respostas(validadores, salvas, final=False):
+            salvas[id_pergunta] = valor_vazio(tipos[id_pergunta])
+
+        st.session_state[f"salvas_{chave_sessao}"] = salvas
+        st.session_state[f"status_{chave_sessao}"] = avaliacao.get("status")
+
+    iniciar_respostas(chave_sessao, st.session_state[f"salvas_{chave_sessao}"])
+
+
+
+@st.fragment(run_every=INTERVALO_AUTOSALVAR)
+def autosalvar(chave: dict, chave_sessao: str, perguntas: list):
+    """
+    Salvamento automático do rascunho, no máximo uma vez a cada INTERVALO_AUTOSALVAR segundos,
+    gravando só as respostas que mudaram desde a última gravação.
+    """
+
+    salvas = st.session_state[f"salvas_{chave_sessao}"]
+    alteradas = respostas_alteradas(respostas_da_tela(chave_sessao, perguntas), salvas)
+
+    if alteradas:
+        if salvar_rascunho(col_avaliacoes, chave, alteradas):
+            salvas.update(alteradas)
+            st.session_state[f"salvo_em_{chave_sessao}"] = datetime.datetime.now()
+        else:
+            st.session_state[f"status_{chave_sessao}"] = STATUS_ENVIADA
+            st.rerun()
+
+    salvo_em = st.session_state.get(f"salvo_em_{chave_sessao}")
+    if salvo_em:
+        st.caption(f"Rascunho salvo às {salvo_em.strftime('%H:%M:%S')}.")
+
 
 
 ###########################################################################################################
 # INTERFACE PRINCIPAL DA PÁGINA
 ###########################################################################################################
 
-# Define o layout da página como largura total
-# st.set_page_config(layout="centered")
+st.logo("images/logo_ieb.svg", size='large')
 
-# Exibe o logo
-container_logo = st.container(horizontal=True, horizontal_alignment="center")
-container_logo.image("images/cepf_logo.png", width=300)
+nome_usuario = st.session_state.get("nome") or "Avaliador(a)"
+st.header(f"Olá {nome_usuario.split(' ')[0]}")
 
-st.write('')
-st.write('')
-st.write('')
+id_avaliador = st.session_state.get("id_usuario")
 
+projetos = projetos_do_avaliador(id_avaliador)
 
+if not projetos:
+    st.write("Não há projetos atribuídos a você no momento.")
+    st.write("Entre em contato com a equipe do IEB.")
+    st.stop()
 
+# Status das avaliações já iniciadas, uma consulta por estágio
+status_por_projeto = {}
+for codigo_edital, id_estagio in {(p["codigo_edital"], p["id_estagio"]) for p in projetos}:
+    for codigo_recebimento, status in status_avaliacoes(col_avaliacoes, codigo_edital, id_estagio, id_avaliador).items():
+        status_por_projeto[(codigo_edital, id_estagio, codigo_recebimento)] = status
 
-# =====================================================================
-# OBTÉM OS PROJETOS DO BENEFICIÁRIO LOGADO
-# =====================================================================
-projetos_raw = st.session_state.get("projetos")
-projetos_usuario = projetos_raw if isinstance(projetos_raw, list) else []
 
-nome_usuario = st.session_state.get("nome", "Usuário")
-nome_usuario_split = nome_usuario.split(" ")
-nome_usuario_primeiro_nome = nome_usuario_split[0]
+def rotulo_projeto(i):
+    """Código do projeto, edital, estágio e status da avaliação."""
+    p = projetos[i]
+    status = status_por_projeto.get((p["codigo_edital"], p["id_estagio"], p["codigo_recebimento"]), "não iniciada")
+    return f"{p['codigo_recebimento']} — {p['nome_edital']} / {p['nome_estagio']} ({status})"
 
 
-col1, col2, col3 = st.columns([1, 3, 1])
+indice = st.selectbox(
+    "Selecione o projeto que deseja avaliar",
+    range(len(projetos)),
+    format_func=rotulo_projeto,
+    index=None,
+    placeholder="Selecione um projeto",
+    width=700
+)
 
-with col2:
-    st.header(f"Olá {nome_usuario_primeiro_nome}")
-    st.write('')
+if indice is None:
+    st.stop()
 
-    # =====================================================================
-    # FILTRA OS PROJETOS DO BANCO DE DADOS
-    # =====================================================================
+projeto = projetos[indice]
+perguntas = projeto["perguntas"]
 
-    if projetos_usuario:
-        st.subheader("Selecione o projeto que deseja acessar:")
+chave = chave_avaliacao(projeto["codigo_edital"], projeto["id_estagio"], id_avaliador, projeto["codigo_recebimento"])
+chave_sessao = f"{projeto['codigo_edital']}_{projeto['id_estagio']}_{projeto['codigo_recebimento']}"
 
-        st.markdown("""
-            <style>
-            div.stButton > button {
-                text-align: left !important;
-                justify-content: flex-start !important;
-            }
-            </style>
-        """, unsafe_allow_html=True)
+# Validadores compilados uma vez por versão do edital
+validadores = validadores_estagio(projeto["codigo_edital"], projeto["id_estagio"], projeto["versao"], perguntas)
 
-        projetos_cursor = col_projetos.find({"codigo": {"$in": projetos_usuario}})
-        projetos = list(projetos_cursor)
+iniciar_sessao_avaliacao(chave, chave_sessao, perguntas, validadores)
 
-        if projetos:
-            for i, projeto in enumerate(projetos):
-                codigo = str(projeto.get("codigo", "")).strip()
-                sigla = projeto.get("sigla", "")
-                nome_proj = projeto.get("nome_do_projeto", "")
-                texto_botao = f"**{codigo} - {sigla} - {nome_proj}**"
+enviada = st.session_state[f"status_{chave_sessao}"] == STATUS_ENVIADA
 
-                key = f"btn_proj_{i}_{codigo}"
+st.divider()
 
-                if st.button(texto_botao, key=key, type="tertiary"):
-                    st.session_state.projeto_atual = codigo
-                    st.session_state.pagina_atual = "ver_projeto"
-                    st.rerun()
+if not perguntas:
+    st.caption("Este estágio ainda não tem perguntas cadastradas.")
+    st.stop()
 
-        else:
-            st.warning("Nenhum projeto encontrado para este usuário.")
-    else:
-        st.write("Não há projetos associados a este usuário.")
-        st.write("Entre em contato com os administradores do sistema.")
+if enviada:
+    st.success("Avaliação enviada. As respostas não podem mais ser alteradas.", icon=":material/check:")
+
+erros_envio = st.session_state.get(f"erros_{chave_sessao}")
+if erros_envio and not enviada:
+    st.error(
+        f"{len(erros_envio)} pergunta(s) sem resposta ou com resposta inválida. Confira os campos indicados.",
+        icon=":material/error:"
+    )
+
+formulario_por_secoes(chave_sessao, validadores, enviada, erros_envio or {})
+
+if not enviada:
+
+    autosalvar(chave, chave_sessao, perguntas)
+
+    if st.button("Enviar avaliação", type="primary", icon=":material/send:"):
+
+        salvas = st.session_state[f"salvas_{chave_sessao}"]
+        atuais = respostas_da_tela(chave_sessao, perguntas)
+
+        # Com erros, não envia: recarrega para mostrar as mensagens junto de cada pergunta
+        erros = erros_respostas(validadores, atuais, final=True)
+        st.session_state[f"erros_{chave_sessao}"] = erros
+
+        if erros:
+            # Abre a primeira seção com pendências
+            st.session_state[f"ir_para_secao_{chave_sessao}"] = min(
+                validadores["secao_da_pergunta"].get(id_pergunta, 0) for id_pergunta in erros
+            )
+            st.rerun()
+
+        # Se já estava enviada (duplo clique, outra aba), nada é alterado
+        if enviar_avaliacao(col_avaliacoes, chave, respostas_alteradas(atuais, salvas)):
+            marcar_atribuicao_concluida(db, **chave)
+
+            # Atualiza só a linha deste projeto no ranking do estágio. A avaliação já foi enviada:
+            # uma falha aqui não pode aparecer para o avaliador (o ranking pode ser recalculado na gestão)
+            try:
+                atualizar_ranking_projeto(
+                    db, projeto["codigo_edital"], projeto["id_estagio"], perguntas, projeto["codigo_recebimento"]
+                )
+            except OperationFailure as e:
+                print(f"Erro ao atualizar o ranking do projeto {projeto['codigo_recebimento']}: {e}")
 
+        salvas.update(atuais)
+        st.session_state[f"status_{chave_sessao}"] = STATUS_ENVIADA
+        st.rerun()
@@ -1,9 +1,30 @@
 import streamlit as st
 import pandas as pd
 import time
+from collections import Counter
 from datetime import datetime, date
-from funcoes_auxiliares import conectar_mongo_ieb_selecao
+from funcoes_auxiliares import conectar_mongo_ieb_selecao, executar_em_transacao
+from funcoes_lista_pessoas import buscar_pessoas
+from funcoes_ranking import ler_ranking, recalcular_ranking_estagio
+from funcoes_atribuicoes import (
+    operacao_adicionar_estagio, operacao_remover_estagio, projetos_por_avaliador, operacoes_distribuicao
+)
+from funcoes_distribuicao import (
+    distribuir_projetos, matriz_distribuicao, distribuicao_da_matriz,
+    conflitos_do_edital, operacoes_conflitos, limite_no_estagio, operacao_limite
+)
+from funcoes_promocao import proximo_estagio, selecionar_para_promocao, planejar_promocao, executar_promocao
+from funcoes_calibracao import (
+    carregar_matriz_notas, ranking_normalizado, estatisticas_avaliadores, alfa_krippendorff
+)
+from funcoes_exportacao import (
+    botao_exportacao, cursor_pessoas, cursor_atribuicoes, cursor_projetos,
+    COLUNAS_PESSOAS, COLUNAS_ATRIBUICOES, COLUNAS_PROJETOS
+)
 from streamlit_sortables import sort_items
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 
 # Conectar google driva
@@ -60,43 +81,384 @@ def ler_planilha_google_sheets(id_planilha):
 
 
 
+@st.cache_data(ttl=300, show_spinner=False)
+def resumo_editais():
+    """
+    Lista leve dos editais para o seletor: só código, nome e data de lançamento,
+    do mais recente para o mais antigo. Estágios e perguntas não são trazidos.
+    O cache é limpo a cada gravação desses campos (limpar_resumo_editais); o ttl cobre
+    gravações feitas por outras instâncias do app.
+    """
+
+    resumo = list(colecao_editais.find(
+        {},
+        {"_id": 0, "codigo_edital": 1, "nome_edital": 1, "data_lancamento": 1}
+    ))
+
+    def data(e):
+        try:
+            return datetime.strptime(e.get("data_lancamento", ""), "%d/%m/%Y")
+        except ValueError:
+            return datetime.min
+
+    return sorted(resumo, key=data, reverse=True)
+
+
+
+def limpar_resumo_editais():
+    """Descarta o resumo em cache depois de criar ou editar um edital."""
+    resumo_editais.clear()
+
+
+
+###########################################################################################################
+# CONTROLE DE CONCORRÊNCIA DOS EDITAIS
+###########################################################################################################
+
+# Cada edital tem um contador "versao". O edital é lido do banco a cada execução da página (busca pontual
+# pelo índice único de codigo_edital), e toda gravação só acontece se a versão no banco ainda for a que a
+# pessoa viu na tela quando clicou (e incrementa a versão). Se outra pessoa gravou antes, nada é
+# sobrescrito: a alteração fica guardada e o aviso de conflito oferece descartá-la ou reaplicá-la.
+#
+# A alteração é guardada como intenção ({"tipo": ..., ids e valores editados}), não como o update pronto.
+# Reaplicar monta o update de novo sobre o edital recém-lido: a edição de pergunta grava só os campos
+# editados (nunca a ordem), a pergunta nova entra depois da última pergunta atual e a nova ordem é
+# encaixada na lista atual de perguntas, sem desfazer o que a outra pessoa mudou.
+#
+# Criar, editar ou excluir uma pergunta numérica refaz o ranking do estágio logo após a gravação.
+
+
+def edital_da_sessao(codigo_edital):
+    """
+    Edital atual lido do banco. Guarda em "versao_vista" a versão exibida na execução anterior,
+    que é a que a pessoa tinha na tela ao clicar e contra a qual as gravações são conferidas.
+    """
+
+    edital = colecao_editais.find_one({"codigo_edital": codigo_edital})
+
+    if edital is None:
+        return None
+
+    vistas = st.session_state.setdefault("versoes_vistas", {})
+    edital["versao_vista"] = vistas.get(codigo_edital, edital.get("versao", 0))
+    vistas[codigo_edital] = edital.get("versao", 0)
+
+    return edital
+
+
+
+def estagio_do_edital(edital, id_estagio):
+    """Estágio do edital pelo id, ou None se ele não existir (mais)."""
+    return next((e for e in edital.get("estagios", []) if e["id_estagio"] == id_estagio), None)
+
+
+
+def montar_alteracao(edital, alteracao: dict):
+    """
+    Monta (atualizacao, array_filters) da alteração sobre o edital informado.
+    Retorna None se a alteração não se aplica mais (estágio ou pergunta excluídos, ordem já usada).
+    """
+
+    tipo = alteracao["tipo"]
+
+    if tipo == "dados":
+        return {"$set": alteracao["campos"]}, None
+
+    if tipo == "novo_estagio":
+        ordens = [e.get("ordem_estagio") for e in edital.get("estagios", [])]
+        if alteracao["estagio"]["ordem_estagio"] in ordens:
+            return None
+        return {"$push": {"estagios": alteracao["estagio"]}}, None
+
+    estagio = estagio_do_edital(edital, alteracao["id_estagio"])
+
+    if estagio is None:
+        return None
+
+    filtro_estagio = {"e.id_estagio": alteracao["id_estagio"]}
+    perguntas = sorted(estagio.get("perguntas_estagio", []), key=lambda p: p.get("ordem", 9999))
+    ids_perguntas = [p["id_pergunta"] for p in perguntas]
+
+    if tipo == "editar_estagio":
+        ordens = [
+            e.get("ordem_estagio") for e in edital.get("estagios", [])
+            if e["id_estagio"] != alteracao["id_estagio"]
+        ]
+        if alteracao["ordem_estagio"] in ordens:
+            return None
+        return {"$set": {
+            "estagios.$[e].nome_estagio": alteracao["nome_estagio"],
+            "estagios.$[e].ordem_estagio": alteracao["ordem_estagio"]
+        }}, [filtro_estagio]
+
+    if tipo == "nova_pergunta":
+        nova = {
+            **alteracao["pergunta"],
+            "ordem": max((p.get("ordem", 0) for p in perguntas), default=0) + 1
+        }
+        return {"$push": {"estagios.$[e].perguntas_estagio": nova}}, [filtro_estagio]
+
+    if tipo in ["editar_pergunta", "excluir_pergunta"] and alteracao["id_pergunta"] not in ids_perguntas:
+        return None
+
+    if tipo == "editar_pergunta":
+        # Só os campos editados; opções e peso saem quando o novo tipo não os usa
+        prefixo = "estagios.$[e].perguntas_estagio.$[p]"
+        campos = alteracao["campos"]
+        atualizacao = {"$set": {f"{prefixo}.{campo}": valor for campo, valor in campos.items()}}
+        sobras = [campo for campo in ["opcoes", "peso"] if campo not in campos]
+        if sobras:
+            atualizacao["$unset"] = {f"{prefixo}.{campo}": "" for campo in sobras}
+        return atualizacao, [filtro_estagio, {"p.id_pergunta": alteracao["id_pergunta"]}]
+
+    if tipo == "excluir_pergunta":
+        return {"$pull": {
+            "estagios.$[e].perguntas_estagio": {"id_pergunta": alteracao["id_pergunta"]}
+        }}, [filtro_estagio]
+
+    if tipo == "ordem_perguntas":
+        # A ordem escolhida vale para as perguntas que ainda existem; as criadas depois vão para o fim
+        ordem = [i for i in alteracao["ids"] if i in ids_perguntas]
+        ordem += [i for i in ids_perguntas if i not in ordem]
+        ordem_atual = {p["id_pergunta"]: p.get("ordem") for p in perguntas}
+
+        alteracoes = {}
+        filtros = [filtro_estagio]
+
+        # Grava só o campo ordem das perguntas que mudaram de posição, um filtro de array por pergunta
+        for i, id_pergunta in enumerate(ordem, start=1):
+            if ordem_atual[id_pergunta] != i:
+                alteracoes[f"estagios.$[e].perguntas_estagio.$[p{i}].ordem"] = i
+                filtros.append({f"p{i}.id_pergunta": id_pergunta})
+
+        return ({"$set": alteracoes} if alteracoes else {}), filtros
+
+    raise ValueError(f"Tipo de alteração desconhecido: {tipo}")
+
+
+
+def altera_notas(edital, alteracao: dict) -> bool:
+    """Se a alteração muda as perguntas numéricas (ou seus pesos) do estágio, e portanto o ranking."""
+
+    if alteracao["tipo"] == "nova_pergunta":
+        return alteracao["pergunta"]["tipo"] == "numero"
+
+    if alteracao["tipo"] not in ["editar_pergunta", "excluir_pergunta"]:
+        return False
+
+    estagio = estagio_do_edital(edital, alteracao["id_estagio"]) or {}
+    anterior = next(
+        (p for p in estagio.get("perguntas_estagio", []) if p["id_pergunta"] == alteracao["id_pergunta"]),
+        {}
+    )
+
+    if alteracao["tipo"] == "excluir_pergunta":
+        return anterior.get("tipo") == "numero"
+
+    return "numero" in [anterior.get("tipo"), alteracao["campos"]["tipo"]]
+
+
+
+def apos_gravar_edital(edital, alteracao: dict):
+    """Efeitos da alteração fora do edital, executados depois de cada gravação bem-sucedida."""
+
+    if altera_notas(edital, alteracao):
+        # Refaz o ranking do estágio com as perguntas já gravadas
+        gravado = colecao_editais.find_one({"_id": edital["_id"]}, {"estagios": 1})
+        estagio = estagio_do_edital(gravado, alteracao["id_estagio"])
+        recalcular_ranking_estagio(
+            db, edital["codigo_edital"], alteracao["id_estagio"], estagio.get("perguntas_estagio", [])
+        )
+
+    if alteracao["tipo"] == "editar_estagio":
+        # Os vínculos seguem pelo id; o nome guardado nas pessoas é só para exibição
+        db.pessoas.update_many(
+            {
+                "editais.codigo_edital": edital["codigo_edital"],
+                "editais.estagios.id_estagio": alteracao["id_estagio"]
+            },
+            {"$set": {
+                "editais.$[e].estagios.$[s].nome_estagio": alteracao["nome_estagio"]
+            }},
+            array_filters=[
+                {"e.codigo_edital": edital["codigo_edital"]},
+                {"s.id_estagio": alteracao["id_estagio"]}
+            ]
+        )
+
+
+
+def gravar_edital(edital, alteracao: dict, descricao: str = "alteração"):
+    """
+    Monta a alteração sobre o edital e a aplica só se a versão no banco for a que a pessoa viu,
+    incrementando a versão. Em caso de conflito, guarda a alteração para o aviso e recarrega a página.
+    """
+
+    montada = montar_alteracao(edital, alteracao)
+
+    if montada is not None:
+        atualizacao, array_filters = montada
+
+        if not atualizacao:
+            return
+
+        resultado = colecao_editais.update_one(
+            {"_id": edital["_id"], "versao": edital["versao_vista"]},
+            {**atualizacao, "$inc": {"versao": 1}},
+            array_filters=array_filters
+        )
+
+        if resultado.matched_count:
+            # Se o código do edital mudou, a versão vista e a seleção passam para o código novo
+            codigo_novo = alteracao.get("campos", {}).get("codigo_edital", edital["codigo_edital"])
+            vistas = st.session_state["versoes_vistas"]
+            vistas.pop(edital["codigo_edital"], None)
+            vistas[codigo_novo] = edital["versao_vista"] + 1
+
+            if codigo_novo != edital["codigo_edital"]:
+                st.session_state["selecionar_edital"] = codigo_novo
+
+            apos_gravar_edital(edital, alteracao)
+            return
+
+    st.session_state["conflito_edital"] = {
+        "codigo_edital": edital["codigo_edital"],
+        "alteracao": alteracao,
+        "descricao": descricao,
+    }
+    st.rerun()
+
+
+
+def aviso_conflito_edital(edital):
+    """Mostra o conflito pendente deste edital com as opções de descartar ou reaplicar a alteração."""
+
+    conflito = st.session_state.get("conflito_edital")
+
+    if not conflito or conflito["codigo_edital"] != edital["codigo_edital"]:
+        return
+
+    with st.container(border=True):
+        st.warning(
+            f"Outra pessoa alterou este edital enquanto você editava. "
+            f"Sua alteração ({conflito['descricao']}) não foi gravada. "
+            "O edital abaixo já mostra a versão atual.",
+            icon=":material/sync_problem:"
+        )
+
+        with st.container(horizontal=True):
+
+            if st.button("Reaplicar minha alteração", type="primary", icon=":material/merge:"):
+                if montar_alteracao(edital, conflito["alteracao"]) is None:
+                    st.error(
+                        "Sua alteração não se aplica mais à versão atual: o estágio ou a pergunta "
+                        "foi excluído, ou a ordem do estágio já está em uso."
+                    )
+                else:
+                    st.session_state.pop("conflito_edital")
+                    gravar_edital(edital, conflito["alteracao"], conflito["descricao"])
+                    limpar_resumo_editais()
+                    st.rerun()
+
+            if st.button("Descartar minha alteração", icon=":material/close:"):
+                st.session_state.pop("conflito_edital")
+                st.rerun()
+
+
+
+
+###########################################################################################################
+# VÍNCULO DE AVALIADORES AOS ESTÁGIOS
+###########################################################################################################
+
+# A diferença entre os vínculos do banco e a seleção da tela é calculada em memória e aplicada com um único
+# bulk_write não ordenado por coleção, dentro de uma transação (operações em funcoes_atribuicoes).
+
+
+def salvar_avaliadores_estagio(codigo_edital, estagio, iniciais, selecao) -> tuple:
+    """
+    Aplica a diferença entre os avaliadores iniciais e a seleção atual ({id da pessoa em texto: nome}).
+    Quem sai do estágio perde também as atribuições de projetos nele. Retorna (adicionados, removidos).
+    """
+
+    id_estagio = estagio["id_estagio"]
+    adicionar = [ObjectId(pessoa_id) for pessoa_id in set(selecao) - set(iniciais)]
+    remover = [ObjectId(pessoa_id) for pessoa_id in set(iniciais) - set(selecao)]
+
+    operacoes = [
+        operacao_adicionar_estagio(pessoa_id, codigo_edital, estagio) for pessoa_id in adicionar
+    ] + [
+        operacao_remover_estagio(pessoa_id, codigo_edital, id_estagio) for pessoa_id in remover
+    ]
+
+    def gravar(sessao):
+        db.pessoas.bulk_write(operacoes, ordered=False, session=sessao)
+
+        if remover:
+            db.atribuicoes.delete_many(
+                {"codigo_edital": codigo_edital, "id_estagio": id_estagio, "id_avaliador": {"$in": remover}},
+                session=sessao
+            )
+
+    if operacoes:
+        executar_em_transacao(db, gravar)
+
+    return len(adicionar), len(remover)
+
+
+
+
 def carregar_projetos(df_recebidos_sheet, colecao_projetos, codigo_edital):
     """
-    Carrega projetos a partir do dataframe.
-    Retorna lista de códigos que foram adicionados.
+    Carrega os projetos novos da planilha num único bulk_write de upserts.
+    O índice único (codigo_edital, codigo_recebimento) torna a carga idempotente: se duas pessoas
+    carregarem ao mesmo tempo, cada projeto é criado uma única vez.
+    Retorna a lista de códigos que foram adicionados.
     """
 
+    if "codigo_recebimento" not in df_recebidos_sheet.columns:
+        return []
+
+    # Códigos da planilha, sem vazios e sem repetições
+    codigos = df_recebidos_sheet["codigo_recebimento"].dropna()
+    codigos = codigos[codigos.astype(str).str.strip() != ""].drop_duplicates()
+
     # Busca projetos já existentes desse edital
-    existentes = {
+    existentes = [
         p["codigo_recebimento"]
         for p in colecao_projetos.find(
             {"codigo_edital": codigo_edital},
-            {"codigo_recebimento": 1}
+            {"_id": 0, "codigo_recebimento": 1}
         )
-    }
-
-    adicionados = []
+    ]
 
-    for _, linha in df_recebidos_sheet.iterrows():
+    novos = codigos[~codigos.isin(existentes)].tolist()
 
-        codigo = linha.get("codigo_recebimento")
+    if not novos:
+        return []
 
-        if not codigo:
-            continue
+    agora = datetime.now()
 
-        # Se já existe, ignora
-        if codigo in existentes:
-            continue
+    operacoes = [
+        UpdateOne(
+            {"codigo_edital": codigo_edital, "codigo_recebimento": codigo},
+            {"$setOnInsert": {"carregado_em": agora}},
+            upsert=True
+        )
+        for codigo in novos
+    ]
 
-        # Insere novo projeto
-        colecao_projetos.insert_one({
-            "codigo_recebimento": codigo,
-            "codigo_edital": codigo_edital
-        })
+    try:
+        upserts = colecao_projetos.bulk_write(operacoes, ordered=False).upserted_ids
+    except BulkWriteError as e:
+        # Carga simultânea: o projeto já foi criado pela outra (chave duplicada); os demais seguem
+        if any(erro.get("code") != 11000 for erro in e.details.get("writeErrors", [])):
+            raise
+        upserts = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
 
-        adicionados.append(codigo)
+    # Só os que esta carga efetivamente criou
+    return [novos[i] for i in sorted(upserts)]
 
-    return adicionados
 
 
 
@@ -116,21 +478,24 @@ st.header('Gerenciar Editais')
 # CONTAINER SUPERIOR COM SELECT E BOTÃO NOVO
 ###########################################################################################################
 
-# Busca todos os editais cadastrados
-editais = list(colecao_editais.find())
+# Resumo dos editais cadastrados (em cache): código -> nome
+nomes_editais = {e["codigo_edital"]: e["nome_edital"] for e in resumo_editais()}
 
-# Mapeia os editais para o selectbox
-opcoes_editais = [""] + [
-    f"{e['codigo_edital']} - {e['nome_edital']}" for e in editais
-]
+# Edital renomeado na execução anterior: a seleção acompanha o código novo
+# (o valor do widget só pode ser trocado antes de ele ser criado)
+if "selecionar_edital" in st.session_state:
+    st.session_state["codigo_edital_selecionado"] = st.session_state.pop("selecionar_edital")
 
 with st.container(horizontal=True, horizontal_alignment="distribute"):
 
-    # Selectbox de escolha do edital
-    edital_selecionado_label = st.selectbox(
+    # Selectbox de escolha do edital (digitar filtra as opções)
+    codigo_selecionado = st.selectbox(
         "Selecione o edital",
-        options=opcoes_editais,
-        index=0,
+        options=list(nomes_editais),
+        index=None,
+        format_func=lambda codigo: f"{codigo} - {nomes_editais[codigo]}",
+        placeholder="Digite o código ou o nome do edital",
+        key="codigo_edital_selecionado",
         width=600
     )
 
@@ -174,10 +539,12 @@ def dialog_novo_edital():
                     "codigo_edital": codigo_edital,
                     "nome_edital": nome_edital,
                     "data_lancamento": data_lancamento.strftime("%d/%m/%Y"),
-                    "id_planilha_recebimento": id_planilha_recebimento
+                    "id_planilha_recebimento": id_planilha_recebimento,
+                    "versao": 0
                 }
 
                 colecao_editais.insert_one(documento)
+                limpar_resumo_editais()
 
                 st.success("Edital salvo com sucesso.", icon=":material/check:")
                 time.sleep(3)
@@ -187,25 +554,26 @@ def dialog_novo_edital():
 if abrir_dialog:
     dialog_novo_edital()
 
+# Edital completo (com estágios e perguntas), lido a cada execução pelo código
+edital_selecionado = edital_da_sessao(codigo_selecionado) if codigo_selecionado else None
+
+if edital_selecionado is not None:
+    aviso_conflito_edital(edital_selecionado)
+
 ###########################################################################################################
 # ABAS PRINCIPAIS
 ###########################################################################################################
 
-tabs = st.tabs(["Editar", "Estágios", "Carregar"])
+tabs = st.tabs(["Editar", "Estágios", "Carregar", "Exportar"])
 
 ###########################################################################################################
 # ABA EDITAR
 ###########################################################################################################
 with tabs[0]:
 
-    if edital_selecionado_label == "":
+    if edital_selecionado is None:
         st.caption("Selecione um edital para editar.")
     else:
-        edital_selecionado = next(
-            e for e in editais
-            if f"{e['codigo_edital']} - {e['nome_edital']}" == edital_selecionado_label
-        )
-
         data_edital = datetime.strptime(
             edital_selecionado["data_lancamento"], "%d/%m/%Y"
         ).date()
@@ -244,15 +612,17 @@ with tabs[0]:
                 if not codigo_edital_edit or not nome_edital_edit or not data_lancamento_edit:
                     st.error("Todos os campos são obrigatórios")
                 else:
-                    colecao_editais.update_one(
-                        {"_id": edital_selecionado["_id"]},
-                        {"$set": {
+                    gravar_edital(
+                        edital_selecionado,
+                        {"tipo": "dados", "campos": {
                             "codigo_edital": codigo_edital_edit,
                             "nome_edital": nome_edital_edit,
                             "data_lancamento": data_lancamento_edit.strftime("%d/%m/%Y"),
                             "id_planilha_recebimento": id_planilha_recebimento_edit
-                        }}
+                        }},
+                        descricao="dados do edital"
                     )
+                    limpar_resumo_editais()
 
                     st.success(
                         "Edital atualizado com sucesso.",
@@ -269,11 +639,11 @@ with tabs[0]:
 
 with tabs[1]:
 
-    if edital_selecionado_label == "":
+    if edital_selecionado is None:
         st.caption("Selecione um edital para gerenciar os estágios.")
     else:
-        codigo_edital = edital_selecionado_label.split(" - ")[0]
-        edital = colecao_editais.find_one({"codigo_edital": codigo_edital})
+        edital = edital_selecionado
+        codigo_edital = edital["codigo_edital"]
 
         estagios = sorted(
             edital.get("estagios", []),
@@ -299,15 +669,15 @@ with tabs[1]:
                 elif ordem_estagio in [e["ordem_estagio"] for e in estagios]:
                     st.error("Já existe um estágio com essa ordem.")
                 else:
-                    colecao_editais.update_one(
-                        {"_id": edital["_id"]},
-                        {"$push": {
-                            "estagios": {
-                                "nome_estagio": nome_estagio.strip(),
-                                "ordem_estagio": ordem_estagio,
-                                "perguntas_estagio": []
-                            }
-                        }}
+                    gravar_edital(
+                        edital,
+                        {"tipo": "novo_estagio", "estagio": {
+                            "id_estagio": str(ObjectId()),
+                            "nome_estagio": nome_estagio.strip(),
+                            "ordem_estagio": ordem_estagio,
+                            "perguntas_estagio": []
+                        }},
+                        descricao="novo estágio"
                     )
                     st.success("Estágio criado com sucesso.", icon=":material/check:")
                     time.sleep(3)
@@ -342,7 +712,10 @@ with tabs[1]:
                     # SEGMENTED CONTROL DE AÇÕES 
                     ###################################################################################################
 
-                    key_acao = f"acao_{codigo_edital}_{estagio['ordem_estagio']}"
+                    # Estágios e perguntas são endereçados pelos ids estáveis (id_estagio / id_pergunta)
+                    id_estagio = estagio["id_estagio"]
+
+                    key_acao = f"acao_{codigo_edital}_{id_estagio}"
 
                     if key_acao not in st.session_state:
                         st.session_state[key_acao] = "Ver perguntas"
@@ -352,14 +725,17 @@ with tabs[1]:
                         "",
                         [
                             "Ver perguntas",
+                            "Editar estágio",
                             "Nova pergunta",
                             "Editar pergunta",
                             "Reordenar perguntas",
                             "Selecionar avaliadores",
-                            "Distribuir projetos"
+                            "Distribuir projetos",
+                            "Ranking",
+                            "Promover projetos"
                         ],
                         width="stretch",
-                        key=f"acao_{codigo_edital}_{estagio['nome_estagio']}"
+                        key=key_acao
                     )
 
 
@@ -394,6 +770,11 @@ with tabs[1]:
                                     st.markdown(f"### {p['pergunta']} *( {tipo_legivel} )*")
                                 elif p["tipo"] == "subtitulo":
                                     st.markdown(f"#### {p['pergunta']} *( {tipo_legivel} )*")
+                                elif p["tipo"] == "numero":
+                                    st.write(
+                                        f"{str(p['ordem'])}. **{p['pergunta']}** "
+                                        f"*( {tipo_legivel}, peso {p.get('peso', 1):g} )*"
+                                    )
                                 else:
                                     st.write(
                                         f"{str(p['ordem'])}. **{p['pergunta']}** "
@@ -406,7 +787,7 @@ with tabs[1]:
 
                     elif acao == "Editar estágio":
 
-                        base_key = f"{codigo_edital}_{estagio['ordem_estagio']}_estagio"
+                        base_key = f"{codigo_edital}_{id_estagio}_estagio"
 
                         novo_nome = st.text_input(
                             "Nome do estágio",
@@ -430,7 +811,7 @@ with tabs[1]:
                         ):
                             ordens_existentes = [
                                 e["ordem_estagio"] for e in estagios
-                                if e["ordem_estagio"] != estagio["ordem_estagio"]
+                                if e["id_estagio"] != id_estagio
                             ]
 
                             if nova_ordem in ordens_existentes:
@@ -438,15 +819,16 @@ with tabs[1]:
                             elif not novo_nome.strip():
                                 st.error("O nome do estágio é obrigatório.")
                             else:
-                                colecao_editais.update_one(
-                                    {"_id": edital["_id"]},
-                                    {"$set": {
-                                        "estagios.$[e].nome_estagio": novo_nome.strip(),
-                                        "estagios.$[e].ordem_estagio": nova_ordem
-                                    }},
-                                    array_filters=[
-                                        {"e.ordem_estagio": estagio["ordem_estagio"]}
-                                    ]
+                                # O nome novo também é propagado às pessoas (apos_gravar_edital)
+                                gravar_edital(
+                                    edital,
+                                    {
+                                        "tipo": "editar_estagio",
+                                        "id_estagio": id_estagio,
+                                        "nome_estagio": novo_nome.strip(),
+                                        "ordem_estagio": nova_ordem
+                                    },
+                                    descricao="edição do estágio"
                                 )
 
                                 st.success(
@@ -462,7 +844,7 @@ with tabs[1]:
 
                     elif acao == "Nova pergunta":
 
-                        base_key = f"{codigo_edital}_{estagio['ordem_estagio']}_nova"
+                        base_key = f"{codigo_edital}_{id_estagio}_nova"
 
                         texto = st.text_input(
                             "Texto da pergunta",
@@ -486,6 +868,17 @@ with tabs[1]:
                                 key=f"{base_key}_opcoes"
                             ).split("\n")
 
+                        peso = 1.0
+                        if tipo == "numero":
+                            peso = st.number_input(
+                                "Peso na nota do projeto",
+                                min_value=0.0,
+                                value=1.0,
+                                step=0.5,
+                                help="Use 0 para uma pergunta numérica que não entra na nota.",
+                                key=f"{base_key}_peso"
+                            )
+
                         if st.button(
                             "Salvar pergunta",
                             type="primary",
@@ -497,8 +890,9 @@ with tabs[1]:
                             elif tipo in ["multipla_escolha", "escolha_unica"] and not any(o.strip() for o in opcoes):
                                 st.error("Informe pelo menos uma opção.")
                             else:
+                                # A ordem (depois da última pergunta) é definida na gravação
                                 nova = {
-                                    "ordem": len(perguntas) + 1,
+                                    "id_pergunta": str(ObjectId()),
                                     "tipo": tipo,
                                     "pergunta": texto.strip()
                                 }
@@ -506,14 +900,13 @@ with tabs[1]:
                                 if tipo in ["multipla_escolha", "escolha_unica"]:
                                     nova["opcoes"] = [o.strip() for o in opcoes if o.strip()]
 
-                                colecao_editais.update_one(
-                                    {"_id": edital["_id"]},
-                                    {"$push": {
-                                        "estagios.$[e].perguntas_estagio": nova
-                                    }},
-                                    array_filters=[
-                                        {"e.ordem_estagio": estagio["ordem_estagio"]}
-                                    ]
+                                if tipo == "numero":
+                                    nova["peso"] = peso
+
+                                gravar_edital(
+                                    edital,
+                                    {"tipo": "nova_pergunta", "id_estagio": id_estagio, "pergunta": nova},
+                                    descricao="nova pergunta"
                                 )
 
                                 st.success(
@@ -533,19 +926,20 @@ with tabs[1]:
                         if not perguntas:
                             st.caption("Nenhuma pergunta cadastrada.")
                         else:
-                            # Mapa para seleção
-                            mapa_perguntas = {
-                                f"{str(p['ordem'])}. {p['pergunta']}": p
-                                for p in perguntas
-                            }
+                            # Mapa para seleção: id_pergunta -> pergunta
+                            mapa_perguntas = {p["id_pergunta"]: p for p in perguntas}
 
-                            selecionada = st.selectbox(
+                            id_pergunta = st.selectbox(
                                 "Selecione a pergunta",
                                 list(mapa_perguntas.keys()),
-                                key=f"{codigo_edital}_{estagio['ordem_estagio']}_pergunta_editar"
+                                format_func=lambda i: f"{str(mapa_perguntas[i]['ordem'])}. {mapa_perguntas[i]['pergunta']}",
+                                key=f"{codigo_edital}_{id_estagio}_pergunta_editar"
                             )
 
-                            pergunta_atual = mapa_perguntas[selecionada]
+                            pergunta_atual = mapa_perguntas[id_pergunta]
+
+                            # Prefixo das keys dos campos da pergunta selecionada
+                            key_pergunta = f"{codigo_edital}_{id_estagio}_{id_pergunta}"
 
                             st.divider()
 
@@ -570,7 +964,7 @@ with tabs[1]:
                                 "Tipo de pergunta",
                                 list(mapa_tipo_inv.values()),
                                 index=list(mapa_tipo_inv.values()).index(tipo_legivel),
-                                key=f"{codigo_edital}_{estagio['ordem_estagio']}_{pergunta_atual['ordem']}_tipo"
+                                key=f"{key_pergunta}_tipo"
                             )
 
                             # ------------------------------------------------------
@@ -602,13 +996,13 @@ with tabs[1]:
                                 texto = st.text_area(
                                     label_texto,
                                     value=pergunta_atual.get("pergunta", ""),
-                                    key=f"{codigo_edital}_{estagio['ordem_estagio']}_{pergunta_atual['ordem']}_texto_area"
+                                    key=f"{key_pergunta}_texto_area"
                                 )
                             else:
                                 texto = st.text_input(
                                     label_texto,
                                     value=pergunta_atual.get("pergunta", ""),
-                                    key=f"{codigo_edital}_{estagio['ordem_estagio']}_{pergunta_atual['ordem']}_texto"
+                                    key=f"{key_pergunta}_texto"
                                 )
 
                             opcoes = []
@@ -616,9 +1010,20 @@ with tabs[1]:
                                 opcoes = st.text_area(
                                     "Opções (uma por linha)",
                                     value="\n".join(pergunta_atual.get("opcoes", [])),
-                                    key=f"{codigo_edital}_{estagio['ordem_estagio']}_{pergunta_atual['ordem']}_opcoes"
+                                    key=f"{key_pergunta}_opcoes"
                                 ).split("\n")
 
+                            peso = 1.0
+                            if tipo_db == "numero":
+                                peso = st.number_input(
+                                    "Peso na nota do projeto",
+                                    min_value=0.0,
+                                    value=float(pergunta_atual.get("peso", 1)),
+                                    step=0.5,
+                                    help="Use 0 para uma pergunta numérica que não entra na nota.",
+                                    key=f"{key_pergunta}_peso"
+                                )
+
                             st.write("")
 
                             # ------------------------------------------------------
@@ -632,35 +1037,34 @@ with tabs[1]:
                                 "Salvar alterações",
                                 type="primary",
                                 icon=":material/save:",
-                                key=f"{codigo_edital}_{estagio['ordem_estagio']}_{pergunta_atual['ordem']}_salvar"
+                                key=f"{key_pergunta}_salvar"
                             ):
                                 if not texto.strip():
                                     st.error("O texto não pode ficar vazio.")
                                 elif tipo_db in ["multipla_escolha", "escolha_unica"] and not any(o.strip() for o in opcoes):
                                     st.error("Informe pelo menos uma opção.")
                                 else:
-                                    nova = {
+                                    campos = {
                                         "tipo": tipo_db,
-                                        "ordem": pergunta_atual["ordem"],
                                         "pergunta": texto.strip()
                                     }
 
                                     if tipo_db in ["multipla_escolha", "escolha_unica"]:
-                                        nova["opcoes"] = [o.strip() for o in opcoes if o.strip()]
-
-                                    perguntas_atualizadas = [
-                                        nova if p == pergunta_atual else p
-                                        for p in perguntas
-                                    ]
-
-                                    colecao_editais.update_one(
-                                        {"_id": edital["_id"]},
-                                        {"$set": {
-                                            "estagios.$[e].perguntas_estagio": perguntas_atualizadas
-                                        }},
-                                        array_filters=[
-                                            {"e.ordem_estagio": estagio["ordem_estagio"]}
-                                        ]
+                                        campos["opcoes"] = [o.strip() for o in opcoes if o.strip()]
+
+                                    if tipo_db == "numero":
+                                        campos["peso"] = peso
+
+                                    # Grava só os campos editados desta pergunta (a ordem não é tocada)
+                                    gravar_edital(
+                                        edital,
+                                        {
+                                            "tipo": "editar_pergunta",
+                                            "id_estagio": id_estagio,
+                                            "id_pergunta": id_pergunta,
+                                            "campos": campos
+                                        },
+                                        descricao="edição da pergunta"
                                     )
 
                                     st.success(
@@ -674,20 +1078,12 @@ with tabs[1]:
                             if col_excluir.button(
                                 "Excluir pergunta",
                                 icon=":material/delete:",
-                                key=f"{codigo_edital}_{estagio['ordem_estagio']}_{pergunta_atual['ordem']}_excluir"
+                                key=f"{key_pergunta}_excluir"
                             ):
-                                perguntas_filtradas = [
-                                    p for p in perguntas if p != pergunta_atual
-                                ]
-
-                                colecao_editais.update_one(
-                                    {"_id": edital["_id"]},
-                                    {"$set": {
-                                        "estagios.$[e].perguntas_estagio": perguntas_filtradas
-                                    }},
-                                    array_filters=[
-                                        {"e.ordem_estagio": estagio["ordem_estagio"]}
-                                    ]
+                                gravar_edital(
+                                    edital,
+                                    {"tipo": "excluir_pergunta", "id_estagio": id_estagio, "id_pergunta": id_pergunta},
+                                    descricao="exclusão da pergunta"
                                 )
 
                                 st.success(
@@ -704,36 +1100,42 @@ with tabs[1]:
                     # REORDENAR PERGUNTAS
                     ###################################################################################################
 
-                    elif acao == "Reordenar pergunta":
+                    elif acao == "Reordenar perguntas":
 
                         if not perguntas:
                             st.caption("Nenhuma pergunta para reordenar.")
                         else:
+                            # Rótulo exibido -> id_pergunta (textos repetidos ganham um sufixo)
+                            rotulos = {}
+                            for p in perguntas:
+                                rotulo = p["pergunta"]
+                                n = 2
+                                while rotulo in rotulos:
+                                    rotulo = f"{p['pergunta']} ({n})"
+                                    n += 1
+                                rotulos[rotulo] = p["id_pergunta"]
+
                             nova_ordem = sort_items(
-                                items=[p["pergunta"] for p in perguntas],
-                                direction="vertical"
+                                items=list(rotulos),
+                                direction="vertical",
+                                key=f"{codigo_edital}_{id_estagio}_sortable"
                             )
 
                             if st.button(
                                 "Salvar nova ordem",
                                 type="primary",
                                 icon=":material/save:",
-                                key=f"{codigo_edital}_{estagio['ordem_estagio']}_reordenar"
+                                key=f"{codigo_edital}_{id_estagio}_reordenar"
                             ):
-                                novas = []
-                                for i, texto in enumerate(nova_ordem, start=1):
-                                    p = next(p for p in perguntas if p["pergunta"] == texto)
-                                    p["ordem"] = i
-                                    novas.append(p)
-
-                                colecao_editais.update_one(
-                                    {"_id": edital["_id"]},
-                                    {"$set": {
-                                        "estagios.$[e].perguntas_estagio": novas
-                                    }},
-                                    array_filters=[
-                                        {"e.ordem_estagio": estagio["ordem_estagio"]}
-                                    ]
+                                # Só o campo ordem das perguntas que mudaram de posição, num único update
+                                gravar_edital(
+                                    edital,
+                                    {
+                                        "tipo": "ordem_perguntas",
+                                        "id_estagio": id_estagio,
+                                        "ids": [rotulos[rotulo] for rotulo in nova_ordem]
+                                    },
+                                    descricao="nova ordem das perguntas"
                                 )
 
                                 st.success(
@@ -755,50 +1157,72 @@ with tabs[1]:
 
                         st.markdown("##### Selecione as pessoas que irão avaliar este estágio:")
 
-                        # Busca pessoas ativas
-                        pessoas_ativas = list(
+                        # Pessoas já vinculadas ao estágio (consulta indexada por edital + estágio)
+                        vinculadas = list(
                             db.pessoas.find(
-                                {"status": "ativo"},
+                                {
+                                    "editais.codigo_edital": codigo_edital,
+                                    "editais.estagios.id_estagio": id_estagio
+                                },
                                 {"nome_completo": 1, "editais": 1}
-                            )
+                            ).sort("nome_completo", 1)
                         )
 
-                        if not pessoas_ativas:
-                            st.caption("Nenhuma pessoa ativa encontrada.")
-                        else:
-                            selecao_ui = {}
+                        # Confere se o vínculo é com este estágio deste edital (e não de outro edital)
+                        vinculadas = [
+                            pessoa for pessoa in vinculadas
+                            if any(
+                                e.get("codigo_edital") == codigo_edital
+                                and any(s.get("id_estagio") == id_estagio for s in e.get("estagios", []))
+                                for e in pessoa.get("editais", [])
+                            )
+                        ]
 
-                            for pessoa in pessoas_ativas:
-                                pessoa_id = str(pessoa["_id"])
+                        iniciais = {str(p["_id"]): p["nome_completo"] for p in vinculadas}
 
-                                # Verifica se a pessoa já está vinculada ao estágio
-                                editais_pessoa = pessoa.get("editais", [])
+                        # Seleção atual fica na sessão para sobreviver às buscas
+                        key_selecao = f"selecao_avaliadores_{codigo_edital}_{id_estagio}"
+                        if key_selecao not in st.session_state:
+                            st.session_state[key_selecao] = dict(iniciais)
 
-                                edital_pessoa = next(
-                                    (e for e in editais_pessoa if e["codigo_edital"] == codigo_edital),
-                                    None
-                                )
+                        selecao = st.session_state[key_selecao]
 
-                                estagios_pessoa = edital_pessoa.get("estagios", []) if edital_pessoa else []
+                        # Busca por prefixo de nome ou e-mail entre as pessoas ativas
+                        termo = st.text_input(
+                            "Buscar pessoa por nome ou e-mail",
+                            key=f"busca_avaliadores_{codigo_edital}_{id_estagio}",
+                            icon=":material/search:"
+                        ).strip()
 
-                                ja_vinculado = any(
-                                    e["nome_estagio"] == estagio["nome_estagio"]
-                                    for e in estagios_pessoa
-                                )
+                        encontradas = (
+                            buscar_pessoas(db.pessoas, termo, {"status": "ativo"}, ["nome_completo"], limite=20)
+                            if termo else []
+                        )
+
+                        # Mostra as vinculadas, as selecionadas e, abaixo, os resultados da busca
+                        candidatas = dict(iniciais)
+                        candidatas.update(selecao)
+                        for pessoa in encontradas:
+                            candidatas.setdefault(str(pessoa["_id"]), pessoa["nome_completo"])
+
+                        if not candidatas:
+                            st.caption("Nenhuma pessoa selecionada. Use a busca para adicionar avaliadores(as).")
+                        else:
+                            for pessoa_id, nome_pessoa in candidatas.items():
 
-                                key_checkbox = f"dist_{pessoa_id}_{codigo_edital}_{estagio['nome_estagio']}"
+                                key_checkbox = f"dist_{pessoa_id}_{codigo_edital}_{id_estagio}"
 
                                 marcado = st.checkbox(
-                                    pessoa["nome_completo"],
-                                    value=ja_vinculado,
+                                    nome_pessoa,
+                                    value=pessoa_id in selecao,
                                     key=key_checkbox
                                 )
 
-                                selecao_ui[pessoa_id] = {
-                                    "marcado": marcado,
-                                    "marcado_inicial": ja_vinculado,
-                                    "_id": pessoa["_id"]
-                                }
+                                # Mantém a seleção da sessão em dia com os checkboxes
+                                if marcado:
+                                    selecao[pessoa_id] = nome_pessoa
+                                else:
+                                    selecao.pop(pessoa_id, None)
 
                             st.write("")
 
@@ -806,62 +1230,18 @@ with tabs[1]:
                                 "Salvar avaliadores(as)",
                                 type="primary",
                                 icon=":material/save:",
-                                key=f"salvar_avaliadores_{codigo_edital}_{estagio['nome_estagio']}"
+                                key=f"salvar_avaliadores_{codigo_edital}_{id_estagio}"
                             ):
-                                for pessoa_id, dados in selecao_ui.items():
-
-                                    marcado = dados["marcado"]
-                                    marcado_inicial = dados["marcado_inicial"]
-                                    pessoa_mongo_id = dados["_id"]
-
-                                    # Marcado agora → adiciona
-                                    if marcado and not marcado_inicial:
-
-                                        # Garante edital
-                                        db.pessoas.update_one(
-                                            {
-                                                "_id": pessoa_mongo_id,
-                                                "editais.codigo_edital": {"$ne": codigo_edital}
-                                            },
-                                            {"$push": {
-                                                "editais": {
-                                                    "codigo_edital": codigo_edital,
-                                                    "estagios": []
-                                                }
-                                            }}
-                                        )
-
-                                        # Adiciona estágio
-                                        db.pessoas.update_one(
-                                            {
-                                                "_id": pessoa_mongo_id,
-                                                "editais.codigo_edital": codigo_edital,
-                                                "editais.estagios.nome_estagio": {"$ne": estagio["nome_estagio"]}
-                                            },
-                                            {"$push": {
-                                                "editais.$.estagios": {
-                                                    "nome_estagio": estagio["nome_estagio"],
-                                                    "projetos": []
-                                                }
-                                            }}
-                                        )
+                                adicionados, removidos = salvar_avaliadores_estagio(
+                                    codigo_edital, estagio, iniciais, selecao
+                                )
 
-                                    # Desmarcado agora → remove
-                                    if not marcado and marcado_inicial:
-                                        db.pessoas.update_one(
-                                            {"_id": pessoa_mongo_id},
-                                            {"$pull": {
-                                                "editais.$[e].estagios": {
-                                                    "nome_estagio": estagio["nome_estagio"]
-                                                }
-                                            }},
-                                            array_filters=[
-                                                {"e.codigo_edital": codigo_edital}
-                                            ]
-                                        )
+                                # Recomeça a seleção a partir do banco
+                                st.session_state.pop(key_selecao, None)
 
                                 st.success(
-                                    "Avaliadores(as) atualizados com sucesso.",
+                                    f"Avaliadores(as) atualizados: {adicionados} vínculo(s) adicionado(s), "
+                                    f"{removidos} removido(s).",
                                     icon=":material/check:"
                                 )
 
@@ -882,9 +1262,14 @@ with tabs[1]:
                         ###################################################################################################
                         # BUSCA TODOS OS PROJETOS DO EDITAL
                         ###################################################################################################
+                        # No primeiro estágio entram todos os projetos; nos seguintes, só os promovidos
+                        filtro_projetos = {"codigo_edital": codigo_edital}
+                        if estagio["ordem_estagio"] != estagios[0]["ordem_estagio"]:
+                            filtro_projetos["estagios_habilitados"] = id_estagio
+
                         projetos = list(
                             db.projetos.find(
-                                {"codigo_edital": codigo_edital},
+                                filtro_projetos,
                                 {"codigo_recebimento": 1}
                             )
                         )
@@ -900,158 +1285,471 @@ with tabs[1]:
                             db.pessoas.find(
                                 {
                                     "editais.codigo_edital": codigo_edital,
-                                    "editais.estagios.nome_estagio": estagio["nome_estagio"]
+                                    "editais.estagios.id_estagio": id_estagio
                                 },
-                                {"nome_completo": 1, "editais": 1}
-                            )
+                                # Só a entrada deste edital (com os limites de projetos por estágio)
+                                {"nome_completo": 1, "editais": {"$elemMatch": {"codigo_edital": codigo_edital}}}
+                            ).sort("nome_completo", 1)
                         )
 
+                        # Projetos já atribuídos no estágio, numa única consulta indexada
+                        atribuidos = projetos_por_avaliador(db, codigo_edital, id_estagio)
+
                         if not pessoas_estagio:
                             st.caption("Nenhum avaliador selecionado para este estágio.")
                         else:
+                            base_key = f"distribuicao_{codigo_edital}_{id_estagio}"
+
+                            if f"{base_key}_mensagem" in st.session_state:
+                                st.success(st.session_state.pop(f"{base_key}_mensagem"), icon=":material/check:")
+
+                            nomes_pessoas = {p["_id"]: p["nome_completo"] for p in pessoas_estagio}
+
+                            # Rótulo único por pessoa (homônimos ganham o fim do id)
+                            homonimos = Counter(nomes_pessoas.values())
+                            rotulo_pessoa = {
+                                pessoa_id: nome if homonimos[nome] == 1 else f"{nome} ({str(pessoa_id)[-6:]})"
+                                for pessoa_id, nome in nomes_pessoas.items()
+                            }
+
                             ################################################################################################
-                            # COLUNAS PRINCIPAIS
+                            # CONFLITOS DE INTERESSE (por edital)
                             ################################################################################################
-                            col1, col2, col3 = st.columns([4, 2, 2])
+                            conflitos = conflitos_do_edital(db, codigo_edital)
+
+                            with st.expander("Conflitos de interesse", icon=":material/block:"):
+
+                                # Só os conflitos dos avaliadores deste estágio aparecem (e são alterados) aqui
+                                conflitos_estagio = {(a, c) for a, c in conflitos if a in nomes_pessoas}
+
+                                rotulos = {rotulo: pessoa_id for pessoa_id, rotulo in rotulo_pessoa.items()}
+
+                                df_conflitos = st.data_editor(
+                                    pd.DataFrame(
+                                        [{"Avaliador(a)": rotulo_pessoa[a], "Projeto": c} for a, c in sorted(
+                                            conflitos_estagio, key=lambda x: (rotulo_pessoa[x[0]], x[1])
+                                        )],
+                                        columns=["Avaliador(a)", "Projeto"]
+                                    ),
+                                    column_config={
+                                        "Avaliador(a)": st.column_config.SelectboxColumn(
+                                            options=list(rotulos), required=True
+                                        ),
+                                        "Projeto": st.column_config.SelectboxColumn(
+                                            options=lista_projetos, required=True
+                                        ),
+                                    },
+                                    num_rows="dynamic",
+                                    hide_index=True,
+                                    key=f"{base_key}_conflitos"
+                                )
+
+                                if st.button(
+                                    "Salvar conflitos",
+                                    icon=":material/save:",
+                                    key=f"{base_key}_salvar_conflitos"
+                                ):
+                                    novos = {
+                                        (rotulos[linha["Avaliador(a)"]], linha["Projeto"])
+                                        for linha in df_conflitos.dropna().to_dict("records")
+                                    }
+                                    operacoes = operacoes_conflitos(codigo_edital, conflitos_estagio, novos)
+                                    if operacoes:
+                                        db.conflitos_interesse.bulk_write(operacoes, ordered=False)
+
+                                    st.session_state[f"{base_key}_mensagem"] = (
+                                        f"Conflitos de interesse salvos ({len(novos)} neste estágio)."
+                                    )
+                                    st.rerun()
 
                             ################################################################################################
-                            # COLUNA 1 — DISTRIBUIÇÃO POR PESSOA
+                            # DISTRIBUIÇÃO AUTOMÁTICA
                             ################################################################################################
-                            with col1:
-                                st.write("##### Distribuição de projetos")
+                            with st.expander("Distribuição automática", icon=":material/auto_mode:"):
 
-                                # Guarda seleção atual para atualizar placares
-                                distribuicao_atual = {}
-
-                                for pessoa in pessoas_estagio:
+                                st.caption(
+                                    "Completa as vagas de cada projeto com os(as) avaliadores(as) menos carregados(as), "
+                                    "respeitando os limites e os conflitos de interesse. "
+                                    "As atribuições existentes são mantidas, exceto as que têm conflito."
+                                )
 
-                                    st.write('')
+                                por_projeto = st.number_input(
+                                    "Avaliadores(as) por projeto",
+                                    min_value=1,
+                                    max_value=len(pessoas_estagio),
+                                    value=min(3, len(pessoas_estagio)),
+                                    step=1,
+                                    key=f"{base_key}_por_projeto"
+                                )
 
-                                    nome = pessoa["nome_completo"]
-                                    pessoa_id = pessoa["_id"]
+                                limites_atuais = {
+                                    p["_id"]: limite_no_estagio(p, codigo_edital, id_estagio) for p in pessoas_estagio
+                                }
 
-                                    # Busca projetos já atribuídos
-                                    edital_pessoa = next(
-                                        e for e in pessoa["editais"]
-                                        if e["codigo_edital"] == codigo_edital
-                                    )
+                                df_limites = st.data_editor(
+                                    pd.DataFrame(
+                                        {
+                                            "Avaliador(a)": list(nomes_pessoas.values()),
+                                            "Atribuídos": [len(atribuidos.get(a, [])) for a in nomes_pessoas],
+                                            "Limite": [limites_atuais[a] for a in nomes_pessoas],
+                                        },
+                                        index=[str(a) for a in nomes_pessoas]
+                                    ).astype({"Limite": "float"}),
+                                    column_config={
+                                        "Limite": st.column_config.NumberColumn(
+                                            help="Máximo de projetos no estágio (vazio = sem limite)",
+                                            min_value=0,
+                                            step=1
+                                        ),
+                                    },
+                                    disabled=["Avaliador(a)", "Atribuídos"],
+                                    hide_index=True,
+                                    key=f"{base_key}_limites"
+                                )
 
-                                    estagio_pessoa = next(
-                                        e for e in edital_pessoa["estagios"]
-                                        if e["nome_estagio"] == estagio["nome_estagio"]
-                                    )
+                                limites = {
+                                    ObjectId(pessoa_id): None if pd.isna(limite) else int(limite)
+                                    for pessoa_id, limite in df_limites["Limite"].items()
+                                }
 
-                                    projetos_atual = estagio_pessoa.get("projetos", [])
+                                if st.toggle("Pré-visualizar a distribuição", key=f"{base_key}_previa"):
 
-                                
+                                    nova, faltantes = distribuir_projetos(
+                                        lista_projetos, list(nomes_pessoas), atribuidos, int(por_projeto),
+                                        limites, conflitos
+                                    )
+                                    operacoes = operacoes_distribuicao(codigo_edital, id_estagio, atribuidos, nova)
 
-                                    # Multiselect
-                                    selecionados = st.multiselect(
-                                        f"{nome}",
-                                        options=lista_projetos,
-                                        default=projetos_atual,
-                                        key=f"multi_{pessoa_id}_{estagio['nome_estagio']}"
+                                    adicionadas = sum(
+                                        len(set(nova[a]) - set(atribuidos.get(a, []))) for a in nova
+                                    )
+                                    removidas = sum(
+                                        len(set(atribuidos.get(a, [])) - set(nova[a])) for a in nova
                                     )
 
-                                    # Botão salvar por pessoa
-                                    if st.button(
-                                        "Salvar",
-                                        icon=":material/save:",
-                                        # type="tertiary",
-                                        key=f"salvar_proj_{pessoa_id}_{estagio['nome_estagio']}"
-                                    ):
-                                        # Atualiza projetos da pessoa
-                                        db.pessoas.update_one(
-                                            {"_id": pessoa_id},
-                                            {"$set": {
-                                                "editais.$[e].estagios.$[s].projetos": selecionados
-                                            }},
-                                            array_filters=[
-                                                {"e.codigo_edital": codigo_edital},
-                                                {"s.nome_estagio": estagio["nome_estagio"]}
-                                            ]
+                                    with st.container(border=True):
+                                        st.write(
+                                            f"**{adicionadas}** atribuições novas e "
+                                            f"**{removidas}** retiradas por conflito de interesse."
                                         )
+                                        if faltantes:
+                                            st.warning(
+                                                f"{len(faltantes)} projeto(s) ficarão com menos de {por_projeto} "
+                                                f"avaliadores(as) ({sum(faltantes.values())} vaga(s) sem "
+                                                "avaliador(a) disponível). Aumente os limites ou selecione "
+                                                "mais avaliadores(as).",
+                                                icon=":material/warning:"
+                                            )
 
-                                        # Placeholder para mensagem temporária
-                                        msg = st.empty()
+                                    if st.button(
+                                        "Confirmar distribuição",
+                                        type="primary",
+                                        icon=":material/auto_mode:",
+                                        key=f"{base_key}_confirmar"
+                                    ):
+                                        operacoes_limites = [
+                                            operacao_limite(a, codigo_edital, id_estagio, limite)
+                                            for a, limite in limites.items()
+                                            if limite != limites_atuais.get(a)
+                                        ]
 
-                                        msg.success(
-                                            f"Projetos salvos para {nome}.",
-                                            icon=":material/check:"
-                                        )
+                                        def gravar(sessao):
+                                            if operacoes_limites:
+                                                db.pessoas.bulk_write(operacoes_limites, ordered=False, session=sessao)
+                                            if operacoes:
+                                                db.atribuicoes.bulk_write(operacoes, ordered=False, session=sessao)
 
-                                        time.sleep(2)
-                                        msg.empty()
+                                        executar_em_transacao(db, gravar)
 
+                                        # A matriz recomeça a partir do banco
+                                        st.session_state.pop(f"{base_key}_matriz", None)
 
-                                    # Guarda para placar
-                                    distribuicao_atual[nome] = selecionados
+                                        st.session_state[f"{base_key}_mensagem"] = (
+                                            f"Distribuição salva: {adicionadas} atribuições novas, {removidas} retiradas."
+                                        )
+                                        st.rerun()
 
                             ################################################################################################
-                            # FUNÇÕES AUXILIARES DE PLACAR (em memória)
+                            # MATRIZ DE DISTRIBUIÇÃO (projetos x avaliadores)
                             ################################################################################################
-                            def calcular_placar_projetos(distrib):
-                                placar = {p: 0 for p in lista_projetos}
-                                for projetos in distrib.values():
-                                    for p in projetos:
-                                        placar[p] += 1
-                                return placar
-
-                            def calcular_placar_pessoas(distrib):
-                                return {
-                                    nome: len(projetos)
-                                    for nome, projetos in distrib.items()
-                                }
+                            st.write("##### Distribuição de projetos")
 
-                            ################################################################################################
-                            # COLUNA 2 — PLACAR DE PROJETOS
-                            ################################################################################################
-                            with col2:
-                                st.write("##### Avaliadores(as) por Projeto")
+                            avaliadores_estagio = list(nomes_pessoas)
+                            colunas_matriz = [rotulo_pessoa[a] for a in avaliadores_estagio]
 
-                                placar_projetos = calcular_placar_projetos(distribuicao_atual)
+                            if not lista_projetos:
+                                st.caption("Nenhum projeto habilitado neste estágio.")
+                            else:
+                                df_matriz = pd.DataFrame(
+                                    matriz_distribuicao(lista_projetos, avaliadores_estagio, atribuidos),
+                                    index=pd.Index(lista_projetos, name="Projeto"),
+                                    columns=colunas_matriz
+                                )
 
-                                for codigo, total in placar_projetos.items():
+                                df_editado = st.data_editor(
+                                    df_matriz,
+                                    column_config={
+                                        coluna: st.column_config.CheckboxColumn(coluna, width="small")
+                                        for coluna in colunas_matriz
+                                    },
+                                    height=min(600, 38 + 35 * len(lista_projetos)),
+                                    key=f"{base_key}_matriz"
+                                )
 
-                                    # Sempre cria 2 subcolunas por linha
-                                    sub1, sub2 = st.columns([3, 1])
+                                matriz = df_editado.to_numpy(dtype=bool)
 
-                                    # Código do projeto
-                                    sub1.write(codigo)
+                                ############################################################################################
+                                # PLACARES (somas das linhas e das colunas)
+                                ############################################################################################
+                                por_projeto_tela = matriz.sum(axis=1)
+                                por_avaliador_tela = matriz.sum(axis=0)
 
-                                    # Total de avaliadores
-                                    sub2.write(str(total))
+                                col1, col2 = st.columns(2)
 
+                                with col1:
+                                    st.write("##### Avaliadores(as) por Projeto")
+                                    st.dataframe(
+                                        pd.DataFrame({"Projeto": lista_projetos, "Avaliadores(as)": por_projeto_tela})
+                                        .sort_values(["Avaliadores(as)", "Projeto"]),
+                                        hide_index=True,
+                                        height=300
+                                    )
+
+                                with col2:
+                                    st.write("##### Projetos por Avaliador(a)")
+                                    st.dataframe(
+                                        pd.DataFrame({"Avaliador(a)": colunas_matriz, "Projetos": por_avaliador_tela})
+                                        .sort_values("Projetos", ascending=False),
+                                        hide_index=True,
+                                        height=300
+                                    )
+
+                                nova = distribuicao_da_matriz(matriz, lista_projetos, avaliadores_estagio, atribuidos)
+                                operacoes = operacoes_distribuicao(codigo_edital, id_estagio, atribuidos, nova)
+
+                                if st.button(
+                                    f"Salvar distribuição ({len(operacoes)} alteração(ões))" if operacoes
+                                    else "Salvar distribuição",
+                                    type="primary",
+                                    icon=":material/save:",
+                                    disabled=not operacoes,
+                                    key=f"{base_key}_salvar_matriz"
+                                ):
+                                    # Todas as alterações da matriz numa única gravação
+                                    db.atribuicoes.bulk_write(operacoes, ordered=False)
+
+                                    st.session_state.pop(f"{base_key}_matriz", None)
+                                    st.session_state[f"{base_key}_mensagem"] = "Distribuição salva."
+                                    st.rerun()
 
 
-                            ################################################################################################
-                            # COLUNA 3 — PLACAR DE AVALIADORES(AS)
-                            ################################################################################################
-                            with col3:
-                                st.write("##### Projetos por Avaliador(a)")
 
-                                placar_pessoas = calcular_placar_pessoas(distribuicao_atual)
 
-                                # Ordena do maior para o menor
-                                placar_ordenado = sorted(
-                                    placar_pessoas.items(),
-                                    key=lambda x: x[1],
-                                    reverse=True
+                    ###############################################################################################
+                    # RANKING DO ESTÁGIO
+                    ###############################################################################################
+                    elif acao == "Ranking":
+
+                        st.write('')
+
+                        # Linhas pré-calculadas (atualizadas a cada avaliação enviada)
+                        ranking = ler_ranking(db, codigo_edital, id_estagio)
+
+                        if st.button(
+                            "Recalcular ranking",
+                            icon=":material/refresh:",
+                            help="Refaz o ranking inteiro do estágio. Isso já é feito ao alterar as perguntas numéricas ou seus pesos.",
+                            key=f"recalcular_ranking_{codigo_edital}_{id_estagio}"
+                        ):
+                            recalcular_ranking_estagio(db, codigo_edital, id_estagio, perguntas)
+                            ranking = ler_ranking(db, codigo_edital, id_estagio)
+
+                        if not ranking:
+                            st.caption("Nenhuma avaliação com nota enviada neste estágio.")
+                        else:
+                            df_ranking = pd.DataFrame(ranking)
+                            df_ranking.insert(0, "posicao", range(1, len(df_ranking) + 1))
+
+                            st.dataframe(
+                                df_ranking[[
+                                    "posicao", "codigo_recebimento", "media", "mediana",
+                                    "desvio", "minimo", "maximo", "avaliadores"
+                                ]],
+                                column_config={
+                                    "posicao": st.column_config.NumberColumn("Posição"),
+                                    "codigo_recebimento": "Projeto",
+                                    "media": st.column_config.NumberColumn("Média", format="%.2f"),
+                                    "mediana": st.column_config.NumberColumn("Mediana", format="%.2f"),
+                                    "desvio": st.column_config.NumberColumn("Desvio", format="%.2f"),
+                                    "minimo": st.column_config.NumberColumn("Mínimo", format="%.2f"),
+                                    "maximo": st.column_config.NumberColumn("Máximo", format="%.2f"),
+                                    "avaliadores": st.column_config.NumberColumn("Avaliadores(as)"),
+                                },
+                                hide_index=True
+                            )
+
+                            ###########################################################################################
+                            # CALIBRAÇÃO (sob demanda)
+                            ###########################################################################################
+                            if st.toggle(
+                                "Calibrar por avaliador(a) (z-score) e medir a concordância",
+                                key=f"calibrar_{codigo_edital}_{id_estagio}"
+                            ):
+                                projetos_cal, avaliadores_cal, matriz = carregar_matriz_notas(
+                                    db, codigo_edital, id_estagio, perguntas
+                                )
+
+                                media_bruta, media_z, n_avaliacoes, ordem = ranking_normalizado(matriz)
+                                media_av, desvio_av, n_notas = estatisticas_avaliadores(matriz)
+
+                                st.metric(
+                                    "Concordância entre avaliadores(as) (alfa de Krippendorff)",
+                                    f"{alfa_krippendorff(matriz):.2f}",
+                                    help="1 = concordância total; 0 = concordância ao acaso."
+                                )
+
+                                st.write("**Ranking normalizado**")
+                                st.dataframe(
+                                    pd.DataFrame({
+                                        "Posição": range(1, len(ordem) + 1),
+                                        "Projeto": projetos_cal[ordem],
+                                        "Média z": media_z[ordem],
+                                        "Média bruta": media_bruta[ordem],
+                                        "Avaliações": n_avaliacoes[ordem],
+                                    }),
+                                    column_config={
+                                        "Média z": st.column_config.NumberColumn(format="%.2f"),
+                                        "Média bruta": st.column_config.NumberColumn(format="%.2f"),
+                                    },
+                                    hide_index=True
                                 )
 
-                                for nome, total in placar_ordenado:
+                                # Nomes dos avaliadores da matriz (uma consulta)
+                                nomes = {
+                                    str(p["_id"]): p.get("nome_completo", "")
+                                    for p in db.pessoas.find(
+                                        {"_id": {"$in": [ObjectId(a) for a in avaliadores_cal]}},
+                                        {"nome_completo": 1}
+                                    )
+                                }
+
+                                st.write("**Tendência de cada avaliador(a)**")
+                                st.dataframe(
+                                    pd.DataFrame({
+                                        "Avaliador(a)": [nomes.get(a, a) for a in avaliadores_cal],
+                                        "Média das notas": media_av,
+                                        "Diferença da média geral": media_av - pd.Series(matriz.ravel()).mean(),
+                                        "Desvio": desvio_av,
+                                        "Notas": n_notas,
+                                    }).sort_values("Diferença da média geral"),
+                                    column_config={
+                                        "Média das notas": st.column_config.NumberColumn(format="%.2f"),
+                                        "Diferença da média geral": st.column_config.NumberColumn(format="%+.2f"),
+                                        "Desvio": st.column_config.NumberColumn(format="%.2f"),
+                                    },
+                                    hide_index=True
+                                )
 
-                                    # Sempre cria 2 subcolunas por linha
-                                    sub1, sub2 = st.columns([3, 1])
 
-                                    # Nome da pessoa
-                                    sub1.write(nome)
+                    ###############################################################################################
+                    # PROMOVER PROJETOS PARA O PRÓXIMO ESTÁGIO
+                    ###############################################################################################
+                    elif acao == "Promover projetos":
+
+                        st.write('')
+
+                        proximo = proximo_estagio(edital, id_estagio)
+                        ranking = ler_ranking(db, codigo_edital, id_estagio)
+
+                        if proximo is None:
+                            st.caption("Este é o último estágio do edital.")
+                        elif not ranking:
+                            st.caption("O ranking deste estágio ainda não tem projetos.")
+                        else:
+                            base_key = f"promover_{codigo_edital}_{id_estagio}"
+
+                            if f"{base_key}_mensagem" in st.session_state:
+                                st.success(st.session_state.pop(f"{base_key}_mensagem"), icon=":material/check:")
+
+                            st.write(f"Promover para **{proximo['ordem_estagio']} - {proximo['nome_estagio']}**:")
+
+                            criterio = st.radio(
+                                "Critério",
+                                ["Os N primeiros do ranking", "Média mínima"],
+                                horizontal=True,
+                                key=f"{base_key}_criterio"
+                            )
+
+                            if criterio == "Os N primeiros do ranking":
+                                top_n = st.number_input(
+                                    "Quantidade de projetos",
+                                    min_value=1,
+                                    max_value=len(ranking),
+                                    value=min(10, len(ranking)),
+                                    step=1,
+                                    key=f"{base_key}_top_n"
+                                )
+                                codigos = selecionar_para_promocao(ranking, top_n=int(top_n))
+                            else:
+                                media_minima = st.number_input(
+                                    "Média mínima",
+                                    value=float(ranking[len(ranking) // 2]["media"]),
+                                    key=f"{base_key}_media_minima"
+                                )
+                                codigos = selecionar_para_promocao(ranking, media_minima=media_minima)
+
+                            levar_avaliadores = st.checkbox(
+                                "Manter os(as) mesmos(as) avaliadores(as) dos projetos no próximo estágio",
+                                key=f"{base_key}_levar"
+                            )
 
-                                    # Total de projetos atribuídos
-                                    sub2.write(str(total))
+                            # Pré-visualização: planeja sem gravar nada
+                            plano = planejar_promocao(
+                                db, codigo_edital, id_estagio, proximo, codigos, levar_avaliadores
+                            )
+                            resumo = plano["resumo"]
 
+                            with st.container(border=True):
+                                st.write(
+                                    f"**{resumo['selecionados']}** projetos selecionados: "
+                                    f"**{len(resumo['novos'])}** serão habilitados e "
+                                    f"{len(resumo['ja_habilitados'])} já estavam habilitados."
+                                )
+                                if levar_avaliadores:
+                                    st.write(
+                                        f"{resumo['atribuicoes']} atribuições serão copiadas para "
+                                        f"{resumo['avaliadores']} avaliadores(as)."
+                                    )
+                                if resumo["avaliadores_inativos"]:
+                                    nomes_inativos = {
+                                        p["_id"]: p.get("nome_completo", "")
+                                        for p in db.pessoas.find(
+                                            {"_id": {"$in": resumo["avaliadores_inativos"]}},
+                                            {"nome_completo": 1}
+                                        )
+                                    }
+                                    st.caption(
+                                        "Inativos(as), não serão levados(as) ao próximo estágio: "
+                                        + ", ".join(nomes_inativos.get(i, str(i)) for i in resumo["avaliadores_inativos"])
+                                    )
+                                if resumo["novos"]:
+                                    st.caption("Projetos: " + ", ".join(resumo["novos"]))
 
+                            if st.button(
+                                "Confirmar promoção",
+                                type="primary",
+                                icon=":material/upgrade:",
+                                disabled=not (plano["projetos"] or plano["atribuicoes"]),
+                                key=f"{base_key}_confirmar"
+                            ):
+                                resultado = executar_promocao(db, plano)
 
+                                # Mostrada depois do rerun, que já lista os projetos no estado novo
+                                st.session_state[f"{base_key}_mensagem"] = (
+                                    f"{resultado['projetos']} projetos promovidos para "
+                                    f"{proximo['nome_estagio']}."
+                                )
+                                st.rerun()
 
 
 
@@ -1060,13 +1758,10 @@ with tabs[1]:
 ###########################################################################################################
 with tabs[2]:
 
-    if edital_selecionado_label == "":
+    if edital_selecionado is None:
         st.caption("Selecione um edital para carregar os dados.")
     else:
-        edital = next(
-            e for e in editais
-            if f"{e['codigo_edital']} - {e['nome_edital']}" == edital_selecionado_label
-        )
+        edital = edital_selecionado
 
         codigo_edital = edital["codigo_edital"]
 
@@ -1140,3 +1835,45 @@ with tabs[2]:
             )
 
 
+
+###########################################################################################################
+# ABA EXPORTAR
+###########################################################################################################
+with tabs[3]:
+
+    st.write("**Pessoas**")
+
+    botao_exportacao(
+        "exportar_pessoas",
+        "Todas as pessoas cadastradas",
+        "pessoas",
+        lambda: cursor_pessoas(db),
+        COLUNAS_PESSOAS
+    )
+
+    if edital_selecionado is None:
+        st.caption("Selecione um edital para exportar as atribuições e os projetos.")
+    else:
+        edital = edital_selecionado
+
+        codigo_edital = edital["codigo_edital"]
+
+        st.write("**Atribuições**")
+
+        botao_exportacao(
+            f"exportar_atribuicoes_{codigo_edital}",
+            "Uma linha por avaliador, estágio e projeto",
+            f"atribuicoes_{codigo_edital}",
+            lambda: cursor_atribuicoes(db, codigo_edital),
+            COLUNAS_ATRIBUICOES
+        )
+
+        st.write("**Projetos**")
+
+        botao_exportacao(
+            f"exportar_projetos_{codigo_edital}",
+            "Projetos cadastrados neste edital",
+            f"projetos_{codigo_edital}",
+            lambda: cursor_projetos(db, codigo_edital),
+            COLUNAS_PROJETOS
+        )
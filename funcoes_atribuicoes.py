@@ -0,0 +1,175 @@
+import datetime
+from pymongo import UpdateOne, DeleteMany
+
+
+###########################################################################################################
+# ATRIBUIÇÕES DE PROJETOS AOS AVALIADORES
+###########################################################################################################
+
+# Cada projeto atribuído a um avaliador num estágio é um documento da coleção "atribuicoes":
+#
+#   {codigo_edital, id_estagio, id_avaliador, codigo_recebimento, concluida, criada_em, concluida_em}
+#
+# garantido único por (edital, estágio, avaliador, projeto). As consultas de atribuição (projetos de um
+# avaliador, avaliadores de um projeto, pendências do estágio) viram varreduras de índice, e os documentos
+# de pessoas guardam só o vínculo com os estágios (pessoas.editais.estagios, sem a lista de projetos).
+#
+# "concluida" passa a True quando o avaliador envia a avaliação do projeto.
+
+
+
+def chave_atribuicao(codigo_edital: str, id_estagio: str, id_avaliador, codigo_recebimento: str) -> dict:
+    """Filtro que identifica uma atribuição (mesmos campos do índice único)."""
+
+    return {
+        "codigo_edital": codigo_edital,
+        "id_estagio": id_estagio,
+        "id_avaliador": id_avaliador,
+        "codigo_recebimento": codigo_recebimento,
+    }
+
+
+
+def operacao_atribuir(codigo_edital: str, id_estagio: str, id_avaliador, codigo_recebimento: str) -> UpdateOne:
+    """Upsert da atribuição: não faz nada se ela já existir."""
+
+    return UpdateOne(
+        chave_atribuicao(codigo_edital, id_estagio, id_avaliador, codigo_recebimento),
+        {"$setOnInsert": {"concluida": False, "criada_em": datetime.datetime.now()}},
+        upsert=True
+    )
+
+
+
+def operacao_desatribuir(codigo_edital: str, id_estagio: str, id_avaliador, codigos: list) -> DeleteMany:
+    """Remove as atribuições do avaliador no estágio para os projetos informados."""
+
+    return DeleteMany({
+        "codigo_edital": codigo_edital,
+        "id_estagio": id_estagio,
+        "id_avaliador": id_avaliador,
+        "codigo_recebimento": {"$in": list(codigos)},
+    })
+
+
+
+def projetos_por_avaliador(db, codigo_edital: str, id_estagio: str) -> dict:
+    """Projetos atribuídos no estágio, numa única consulta: {id_avaliador: [codigo_recebimento, ...]}."""
+
+    distribuicao = {}
+
+    for a in db["atribuicoes"].find(
+        {"codigo_edital": codigo_edital, "id_estagio": id_estagio},
+        {"_id": 0, "id_avaliador": 1, "codigo_recebimento": 1}
+    ).sort([("id_avaliador", 1), ("codigo_recebimento", 1)]):
+        distribuicao.setdefault(a["id_avaliador"], []).append(a["codigo_recebimento"])
+
+    return distribuicao
+
+
+
+def atribuicoes_do_avaliador(db, id_avaliador) -> list:
+    """Atribuições de um avaliador em todos os editais e estágios."""
+
+    return list(db["atribuicoes"].find(
+        {"id_avaliador": id_avaliador},
+        {"_id": 0, "codigo_edital": 1, "id_estagio": 1, "codigo_recebimento": 1, "concluida": 1}
+    ).sort([("codigo_edital", 1), ("id_estagio", 1), ("codigo_recebimento", 1)]))
+
+
+
+def operacoes_distribuicao(codigo_edital: str, id_estagio: str, atual: dict, nova: dict) -> list:
+    """
+    Operações que levam a distribuição atual à nova ({id_avaliador: [códigos]}), só com as diferenças:
+    um upsert por projeto acrescentado e um DeleteMany por avaliador com projetos retirados.
+    """
+
+    operacoes = []
+
+    for id_avaliador in set(atual) | set(nova):
+        antes = set(atual.get(id_avaliador, []))
+        depois = set(nova.get(id_avaliador, []))
+
+        operacoes += [
+            operacao_atribuir(codigo_edital, id_estagio, id_avaliador, codigo)
+            for codigo in sorted(depois - antes)
+        ]
+
+        if antes - depois:
+            operacoes.append(operacao_desatribuir(codigo_edital, id_estagio, id_avaliador, antes - depois))
+
+    return operacoes
+
+
+
+def marcar_atribuicao_concluida(db, codigo_edital: str, id_estagio: str, id_avaliador, codigo_recebimento: str):
+    """Marca a atribuição como concluída (chamada quando a avaliação é enviada)."""
+
+    db["atribuicoes"].update_one(
+        {**chave_atribuicao(codigo_edital, id_estagio, id_avaliador, codigo_recebimento), "concluida": False},
+        {"$set": {"concluida": True, "concluida_em": datetime.datetime.now()}}
+    )
+
+
+
+###########################################################################################################
+# VÍNCULO DOS AVALIADORES AOS ESTÁGIOS
+###########################################################################################################
+
+# O vínculo da pessoa com o estágio (quem pode receber projetos) continua em pessoas.editais.estagios.
+# Cada operação abaixo é independente das outras, e por isso pode ir num bulk_write não ordenado:
+# a inclusão é uma atualização por pipeline que cria a entrada do edital se ela ainda não existir
+# e acrescenta o estágio se ele ainda não estiver lá.
+
+
+def operacao_adicionar_estagio(pessoa_id, codigo_edital: str, estagio: dict) -> UpdateOne:
+    """UpdateOne que vincula a pessoa ao estágio (cria a entrada do edital se precisar)."""
+
+    editais_atuais = {"$ifNull": ["$editais", []]}
+    novo_estagio = {"id_estagio": estagio["id_estagio"], "nome_estagio": estagio["nome_estagio"]}
+
+    tem_edital = {"$in": [
+        {"$literal": codigo_edital},
+        {"$map": {"input": editais_atuais, "as": "e", "in": "$$e.codigo_edital"}}
+    ]}
+
+    # No edital certo e sem o estágio ainda: acrescenta o estágio; nos demais, mantém como está
+    editais_com_estagio = {"$map": {
+        "input": editais_atuais,
+        "as": "e",
+        "in": {"$cond": [
+            {"$and": [
+                {"$eq": ["$$e.codigo_edital", {"$literal": codigo_edital}]},
+                {"$not": [{"$in": [
+                    {"$literal": estagio["id_estagio"]},
+                    {"$ifNull": ["$$e.estagios.id_estagio", []]}
+                ]}]}
+            ]},
+            {"$mergeObjects": ["$$e", {"estagios": {"$concatArrays": [
+                {"$ifNull": ["$$e.estagios", []]}, [{"$literal": novo_estagio}]
+            ]}}]},
+            "$$e"
+        ]}
+    }}
+
+    novo_edital = {"$literal": {"codigo_edital": codigo_edital, "estagios": [novo_estagio]}}
+
+    return UpdateOne(
+        {"_id": pessoa_id},
+        [{"$set": {"editais": {"$cond": [
+            tem_edital,
+            editais_com_estagio,
+            {"$concatArrays": [editais_atuais, [novo_edital]]}
+        ]}}}]
+    )
+
+
+
+def operacao_remover_estagio(pessoa_id, codigo_edital: str, id_estagio: str) -> UpdateOne:
+    """UpdateOne que desvincula a pessoa do estágio."""
+
+    return UpdateOne(
+        {"_id": pessoa_id},
+        {"$pull": {"editais.$[e].estagios": {"id_estagio": id_estagio}}},
+        array_filters=[{"e.codigo_edital": codigo_edital}]
+    )
@@ -1,19 +1,20 @@
 import streamlit as st
+import random
+import unicodedata
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
 # import datetime
 # import pandas as pd
 # import io
-from email.utils import formataddr
 
 # Google Drive API
 # from google.oauth2.service_account import Credentials
 # from googleapiclient.discovery import build
 # from googleapiclient.http import MediaIoBaseUpload
 
-# Envio de e-mail
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+# Índices e migrações do banco
+from funcoes_indices import criar_indices
+from migracoes import aplicar_migracoes
 
 
 
@@ -26,6 +27,11 @@ def conectar_mongo_ieb_selecao():
     # CONEXÃO LOCAL
     cliente = MongoClient(st.secrets["senhas"]["senha_mongo_ieb_selecao"])
     db_ieb_selecao = cliente["ieb_selecao"] 
+
+    # Aplica migrações pendentes e garante os índices uma vez por processo (a conexão fica em cache)
+    aplicar_migracoes(db_ieb_selecao)
+    criar_indices(db_ieb_selecao)
+
     return db_ieb_selecao
 
 
@@ -36,35 +42,83 @@ def conectar_mongo_ieb_selecao():
 
 # ###########################################################################################
 
-def enviar_email(
-    corpo_html: str,
-    destinatarios: list[str],
-    assunto: str,
-    nome_remetente: str = "IEB - Seleção de Projetos"
-):
+def ler_configuracao(chave: str, padrao=None):
     """
-    Envia e-mail em HTML usando configurações do st.secrets
+    Lê um parâmetro opcional da seção [configuracoes] do secrets.toml.
+    Retorna o valor padrão se a seção ou a chave não existirem.
     """
+    try:
+        return st.secrets["configuracoes"][chave]
+    except Exception:
+        return padrao
+
+
 
-    smtp_server = st.secrets["senhas"]["smtp_server"]
-    port = st.secrets["senhas"]["port"]
-    endereco_email = st.secrets["senhas"]["endereco_email"]
-    senha_email = st.secrets["senhas"]["senha_email"]
+# ###########################################################################################
+
+def normalizar_email(email) -> str:
+    """
+    Chave usada nas buscas por e-mail (campo e_mail_normalizado): sem espaços e em minúsculas.
+    """
+    return str(email or "").strip().lower()
 
-    msg = MIMEMultipart()
-    msg["From"] = formataddr((nome_remetente, endereco_email))
-    msg["To"] = ", ".join(destinatarios)
-    msg["Subject"] = assunto
 
-    msg.attach(MIMEText(corpo_html, "html"))
 
+# ###########################################################################################
+
+def normalizar_texto(texto) -> str:
+    """Texto em minúsculas e sem acentos, para busca por prefixo ("João" -> "joao")."""
+    decomposto = unicodedata.normalize("NFKD", str(texto or ""))
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).strip().lower()
+
+
+
+def termos_busca_pessoa(nome, email) -> list[str]:
+    """
+    Termos indexados para a busca de pessoas (campo termos_busca):
+    cada palavra do nome normalizada e o e-mail normalizado.
+    """
+    termos = set(normalizar_texto(nome).split())
+    email_normalizado = normalizar_email(email)
+    if email_normalizado:
+        termos.add(email_normalizado)
+    return sorted(termos)
+
+
+
+def campos_busca_pessoa(nome, email) -> dict:
+    """Campos derivados de nome e e-mail que precisam ser gravados junto com eles."""
+    return {
+        "e_mail_normalizado": normalizar_email(email),
+        "termos_busca": termos_busca_pessoa(nome, email),
+    }
+
+
+
+# ###########################################################################################
+
+def gerar_codigo_aleatorio():
+    """Gera um código numérico aleatório de 6 dígitos como string."""
+    return f"{random.randint(0, 999999):06d}"
+
+
+
+# ###########################################################################################
+
+# Código de erro do MongoDB quando o servidor não aceita transações (instância isolada, sem replica set)
+ERRO_SEM_TRANSACOES = 20
+
+
+def executar_em_transacao(db, funcao):
+    """
+    Executa funcao(sessao) dentro de uma transação, repetindo em caso de erro transitório.
+    Se o servidor não suportar transações, executa funcao(None) sem transação.
+    As operações dentro de funcao devem repassar session=sessao.
+    """
     try:
-        with smtplib.SMTP(smtp_server, port) as server:
-            server.starttls()
-            server.login(endereco_email, senha_email)
-            server.send_message(msg)
-        return True
-
-    except Exception as e:
-        print(f"Erro ao enviar e-mail: {e}")
-        return False
+        with db.client.start_session() as sessao:
+            return sessao.with_transaction(funcao)
+    except OperationFailure as e:
+        if e.code != ERRO_SEM_TRANSACOES:
+            raise
+        return funcao(None)
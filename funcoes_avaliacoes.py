@@ -0,0 +1,118 @@
+import datetime
+from pymongo.errors import DuplicateKeyError
+
+
+###########################################################################################################
+# AVALIAÇÕES
+###########################################################################################################
+
+# Respostas dos avaliadores aos questionários dos estágios, na coleção "avaliacoes".
+# Um documento por (codigo_edital, id_estagio, id_avaliador, codigo_recebimento), garantido por índice único:
+#
+#   {codigo_edital, id_estagio, id_avaliador, codigo_recebimento,
+#    respostas: {id_pergunta: valor}, status: "rascunho" | "enviada",
+#    criada_em, atualizada_em, enviada_em}
+#
+# O rascunho é gravado com upsert e só com as respostas que mudaram ($set em respostas.<id_pergunta>),
+# nunca reescrevendo o documento inteiro. Avaliações enviadas não aceitam mais gravações: o filtro
+# exige status != "enviada" e, se o documento já foi enviado, o upsert esbarra no índice único.
+
+STATUS_RASCUNHO = "rascunho"
+STATUS_ENVIADA = "enviada"
+
+
+
+def chave_avaliacao(codigo_edital: str, id_estagio: str, id_avaliador, codigo_recebimento: str) -> dict:
+    """Filtro que identifica uma avaliação (mesmos campos do índice único)."""
+
+    return {
+        "codigo_edital": codigo_edital,
+        "id_estagio": id_estagio,
+        "id_avaliador": id_avaliador,
+        "codigo_recebimento": codigo_recebimento,
+    }
+
+
+
+def respostas_alteradas(atuais: dict, salvas: dict) -> dict:
+    """Respostas que diferem da última versão gravada: {id_pergunta: valor}."""
+
+    return {
+        id_pergunta: valor
+        for id_pergunta, valor in atuais.items()
+        if salvas.get(id_pergunta) != valor
+    }
+
+
+
+def salvar_rascunho(colecao, chave: dict, alteradas: dict) -> bool:
+    """
+    Grava só as respostas alteradas no rascunho (cria o documento na primeira gravação).
+    Retorna False se a avaliação já foi enviada e por isso não aceita mais alterações.
+    """
+
+    if not alteradas:
+        return True
+
+    agora = datetime.datetime.now()
+
+    try:
+        colecao.update_one(
+            {**chave, "status": {"$ne": STATUS_ENVIADA}},
+            {
+                "$set": {
+                    **{f"respostas.{id_pergunta}": valor for id_pergunta, valor in alteradas.items()},
+                    "atualizada_em": agora,
+                },
+                "$setOnInsert": {"status": STATUS_RASCUNHO, "criada_em": agora},
+            },
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # O documento existe e está enviado: o filtro não casou e o upsert tentou inserir de novo
+        return False
+
+    return True
+
+
+
+def enviar_avaliacao(colecao, chave: dict, alteradas: dict) -> bool:
+    """
+    Grava as últimas respostas alteradas e marca a avaliação como enviada, numa única operação.
+    Idempotente: enviar de novo (duplo clique, aba repetida) não altera nada.
+    Retorna True se a avaliação foi enviada agora, False se já estava enviada.
+    """
+
+    agora = datetime.datetime.now()
+
+    try:
+        resultado = colecao.update_one(
+            {**chave, "status": {"$ne": STATUS_ENVIADA}},
+            {
+                "$set": {
+                    **{f"respostas.{id_pergunta}": valor for id_pergunta, valor in alteradas.items()},
+                    "status": STATUS_ENVIADA,
+                    "atualizada_em": agora,
+                    "enviada_em": agora,
+                },
+                "$setOnInsert": {"criada_em": agora},
+            },
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+
+    return resultado.modified_count > 0 or resultado.upserted_id is not None
+
+
+
+def status_avaliacoes(colecao, codigo_edital: str, id_estagio: str, id_avaliador) -> dict:
+    """Status das avaliações do avaliador num estágio: {codigo_recebimento: status}."""
+
+    return {
+        a["codigo_recebimento"]: a.get("status", STATUS_RASCUNHO)
+        for a in colecao.find(
+            {"codigo_edital": codigo_edital, "id_estagio": id_estagio, "id_avaliador": id_avaliador},
+            {"_id": 0, "codigo_recebimento": 1, "status": 1}
+        )
+    }
@@ -0,0 +1,208 @@
+import numpy as np
+from funcoes_avaliacoes import STATUS_ENVIADA
+from funcoes_ranking import expressao_nota, pesos_estagio
+
+
+###########################################################################################################
+# CALIBRAÇÃO DOS AVALIADORES E CONCORDÂNCIA
+###########################################################################################################
+
+# Alguns avaliadores dão notas sistematicamente mais altas ou mais baixas. Aqui as notas de um estágio
+# viram uma matriz projetos x avaliadores (NaN onde o avaliador não avaliou o projeto), carregada numa
+# única consulta, e todos os cálculos são vetorizados com NumPy (sem laços por projeto ou avaliador):
+#
+#   - z-score por avaliador: (nota - média do avaliador) / desvio do avaliador
+#   - ranking normalizado: média dos z-scores de cada projeto
+#   - concordância entre avaliadores: alfa de Krippendorff com métrica intervalar
+#
+# Uso: python funcoes_calibracao.py [projetos] [avaliadores] [avaliacoes_por_projeto]
+# roda o benchmark com dados sintéticos.
+
+
+
+def carregar_matriz_notas(db, codigo_edital: str, id_estagio: str, perguntas: list):
+    """
+    Lê as notas das avaliações enviadas do estágio numa única agregação e monta a matriz.
+    Retorna (projetos, avaliadores, matriz), com matriz[i, j] = nota do avaliador j no projeto i ou NaN.
+    """
+
+    linhas = list(db["avaliacoes"].aggregate([
+        {"$match": {"codigo_edital": codigo_edital, "id_estagio": id_estagio, "status": STATUS_ENVIADA}},
+        {"$project": {
+            "_id": 0,
+            "codigo_recebimento": 1,
+            "id_avaliador": 1,
+            "nota": expressao_nota(pesos_estagio(perguntas)),
+        }},
+        {"$match": {"nota": {"$ne": None}}},
+    ]))
+
+    if not linhas:
+        return np.array([]), np.array([]), np.empty((0, 0))
+
+    codigos = np.array([l["codigo_recebimento"] for l in linhas])
+    avaliadores_linha = np.array([str(l["id_avaliador"]) for l in linhas])
+    notas = np.array([l["nota"] for l in linhas], dtype=float)
+
+    return montar_matriz(codigos, avaliadores_linha, notas)
+
+
+
+def montar_matriz(codigos: np.ndarray, avaliadores: np.ndarray, notas: np.ndarray):
+    """Monta a matriz projetos x avaliadores a partir de triplas (projeto, avaliador, nota)."""
+
+    projetos, i = np.unique(codigos, return_inverse=True)
+    avaliadores_unicos, j = np.unique(avaliadores, return_inverse=True)
+
+    matriz = np.full((len(projetos), len(avaliadores_unicos)), np.nan)
+    matriz[i, j] = notas
+
+    return projetos, avaliadores_unicos, matriz
+
+
+
+def estatisticas_avaliadores(matriz: np.ndarray):
+    """Média, desvio padrão e número de notas de cada avaliador (colunas da matriz)."""
+
+    avaliadas = ~np.isnan(matriz)
+    quantidade = avaliadas.sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.nansum(matriz, axis=0) / quantidade
+        desvio = np.sqrt(np.nansum((matriz - media) ** 2, axis=0) / quantidade)
+
+    return media, desvio, quantidade
+
+
+
+def zscores_por_avaliador(matriz: np.ndarray) -> np.ndarray:
+    """
+    Normaliza as notas de cada avaliador pelo z-score dentro das notas dele.
+    Avaliador com uma única nota ou notas todas iguais (desvio 0) fica com z = 0 nessas notas.
+    """
+
+    media, desvio, _ = estatisticas_avaliadores(matriz)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (matriz - media) / desvio
+
+    # Desvio 0: a nota não diz nada sobre a posição relativa do projeto
+    z[~np.isnan(matriz) & ~np.isfinite(z)] = 0.0
+
+    return z
+
+
+
+def ranking_normalizado(matriz: np.ndarray):
+    """
+    Média bruta e média dos z-scores de cada projeto, e a ordem do ranking normalizado.
+    Retorna (media_bruta, media_z, avaliacoes, ordem), com ordem = índices dos projetos do melhor para o pior.
+    """
+
+    avaliacoes = (~np.isnan(matriz)).sum(axis=1)
+    z = zscores_por_avaliador(matriz)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media_bruta = np.nansum(matriz, axis=1) / avaliacoes
+        media_z = np.nansum(z, axis=1) / avaliacoes
+
+    # Projetos sem avaliação ficam no fim
+    ordem = np.argsort(np.where(np.isnan(media_z), np.inf, -media_z), kind="stable")
+
+    return media_bruta, media_z, avaliacoes, ordem
+
+
+
+def alfa_krippendorff(matriz: np.ndarray) -> float:
+    """
+    Alfa de Krippendorff com métrica intervalar (1 = concordância total, 0 = ao acaso).
+    Só entram projetos com pelo menos duas notas. Retorna NaN se não houver dados suficientes.
+
+    Com m_u notas no projeto u, soma S_u e soma dos quadrados Q_u, a soma das diferenças ao quadrado
+    entre todos os pares ordenados do projeto é 2 (m_u Q_u - S_u^2); o mesmo vale para o conjunto
+    inteiro de n notas. Assim o cálculo não precisa montar os pares.
+    """
+
+    avaliadas = ~np.isnan(matriz)
+    m = avaliadas.sum(axis=1)
+    validos = m >= 2
+
+    if validos.sum() == 0:
+        return float("nan")
+
+    valores = np.where(avaliadas[validos], matriz[validos], 0.0)
+    m = m[validos]
+
+    soma = valores.sum(axis=1)
+    soma_quadrados = (valores ** 2).sum(axis=1)
+
+    n = m.sum()
+    if n < 2:
+        return float("nan")
+
+    discordancia_observada = (2 * (m * soma_quadrados - soma ** 2) / (m - 1)).sum() / n
+    discordancia_esperada = 2 * (n * soma_quadrados.sum() - soma.sum() ** 2) / (n * (n - 1))
+
+    if discordancia_esperada == 0:
+        # Todas as notas iguais: concordância total
+        return 1.0
+
+    return float(1 - discordancia_observada / discordancia_esperada)
+
+
+
+###########################################################################################################
+# BENCHMARK PELA LINHA DE COMANDO
+###########################################################################################################
+
+# Gera um estágio sintético (cada avaliador com um viés próprio) e mede o tempo da montagem da matriz,
+# do z-score, do ranking normalizado e do alfa. O total deve ficar bem abaixo de 1 segundo.
+if __name__ == "__main__":
+    import sys
+    import time
+
+    n_projetos = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_avaliadores = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    por_projeto = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    rng = np.random.default_rng(42)
+
+    qualidade = rng.normal(7, 1.5, n_projetos)
+    vies = rng.normal(0, 1, n_avaliadores)
+
+    # Cada projeto recebe "por_projeto" avaliadores distintos
+    avaliadores_projeto = np.argsort(rng.random((n_projetos, n_avaliadores)), axis=1)[:, :por_projeto]
+
+    codigos = np.repeat(np.arange(n_projetos), por_projeto).astype(str)
+    avaliadores = avaliadores_projeto.ravel().astype(str)
+    notas = (
+        np.repeat(qualidade, por_projeto)
+        + vies[avaliadores_projeto.ravel()]
+        + rng.normal(0, 0.5, n_projetos * por_projeto)
+    )
+
+    inicio = time.perf_counter()
+
+    projetos, avaliadores_unicos, matriz = montar_matriz(codigos, avaliadores, notas)
+    t_matriz = time.perf_counter()
+
+    media_bruta, media_z, avaliacoes, ordem = ranking_normalizado(matriz)
+    t_ranking = time.perf_counter()
+
+    alfa = alfa_krippendorff(matriz)
+    t_alfa = time.perf_counter()
+
+    # Quanto o ranking normalizado se aproxima da qualidade real, comparado à média bruta
+    qualidade_projetos = qualidade[projetos.astype(int)]
+    corr_bruta = np.corrcoef(media_bruta, qualidade_projetos)[0, 1]
+    corr_z = np.corrcoef(media_z, qualidade_projetos)[0, 1]
+
+    print(f"{n_projetos} projetos x {n_avaliadores} avaliadores, {por_projeto} avaliações por projeto")
+    print(f"  matriz:               {(t_matriz - inicio) * 1000:8.1f} ms")
+    print(f"  z-score + ranking:    {(t_ranking - t_matriz) * 1000:8.1f} ms")
+    print(f"  alfa de Krippendorff: {(t_alfa - t_ranking) * 1000:8.1f} ms  (alfa = {alfa:.3f})")
+    print(f"  total:                {(t_alfa - inicio) * 1000:8.1f} ms")
+    print(f"  correlação com a qualidade real: bruta {corr_bruta:.3f}, normalizada {corr_z:.3f}")
+
+    if t_alfa - inicio >= 1:
+        sys.exit(1)
@@ -0,0 +1,401 @@
+import datetime
+import heapq
+from collections import Counter
+import numpy as np
+from pymongo import UpdateOne, DeleteMany
+from funcoes_auxiliares import executar_em_transacao
+from funcoes_atribuicoes import projetos_por_avaliador, operacao_atribuir, operacao_desatribuir
+
+
+###########################################################################################################
+# DISTRIBUIÇÃO AUTOMÁTICA DE PROJETOS
+###########################################################################################################
+
+# Cada projeto do estágio deve ter "por_projeto" avaliadores. A distribuição é gulosa com um heap de
+# avaliadores ordenado pela carga (projetos já atribuídos no estágio): cada vaga vai para o avaliador
+# menos carregado que ainda não tem o projeto, não tem conflito de interesse com ele e não atingiu o
+# seu limite. Os projetos com mais conflitos são atendidos primeiro, enquanto há mais opções.
+#
+# As atribuições existentes são mantidas (rodar de novo só completa as vagas que faltam), exceto as
+# que passaram a ter conflito de interesse, que são retiradas e redistribuídas.
+#
+# Conflitos de interesse ficam na coleção "conflitos_interesse", por edital:
+#   {codigo_edital, id_avaliador, codigo_recebimento, registrado_em}
+# O limite de projetos de cada avaliador no estágio fica no vínculo da pessoa com o estágio
+# (pessoas.editais.estagios.limite_projetos; sem o campo, sem limite).
+#
+# Uso: python funcoes_distribuicao.py [projetos] [avaliadores] [por_projeto]
+# roda o benchmark com dados sintéticos.
+
+
+
+def distribuir_projetos(projetos: list, avaliadores: list, atual: dict, por_projeto,
+                        limites: dict | None = None, conflitos=frozenset()) -> tuple:
+    """
+    Completa a distribuição atual ({id_avaliador: [códigos]}) até cada projeto ter por_projeto avaliadores.
+    por_projeto: número igual para todos os projetos ou {codigo_recebimento: número}.
+    limites: {id_avaliador: máximo de projetos} (ausente ou None = sem limite).
+    conflitos: conjunto de pares (id_avaliador, codigo_recebimento) que não podem ser atribuídos.
+    Retorna (nova distribuição, {codigo_recebimento: vagas que não puderam ser preenchidas}).
+    """
+
+    limites = limites or {}
+    conflitos = set(conflitos)
+    alvo = por_projeto if isinstance(por_projeto, dict) else dict.fromkeys(projetos, por_projeto)
+
+    # Parte da distribuição atual, sem as atribuições em conflito
+    nova = {
+        id_avaliador: [codigo for codigo in codigos if (id_avaliador, codigo) not in conflitos]
+        for id_avaliador, codigos in atual.items()
+    }
+    for id_avaliador in avaliadores:
+        nova.setdefault(id_avaliador, [])
+
+    revisores = {codigo: set() for codigo in projetos}
+    for id_avaliador, codigos in nova.items():
+        for codigo in codigos:
+            if codigo in revisores:
+                revisores[codigo].add(id_avaliador)
+
+    def abaixo_do_limite(id_avaliador):
+        limite = limites.get(id_avaliador)
+        return limite is None or len(nova[id_avaliador]) < limite
+
+    # Heap de (carga, ordem de desempate, avaliador)
+    heap = [(len(nova[a]), i, a) for i, a in enumerate(avaliadores) if abaixo_do_limite(a)]
+    heapq.heapify(heap)
+
+    # Os projetos com mais conflitos primeiro
+    conflitos_por_projeto = Counter(codigo for _, codigo in conflitos)
+    pendentes = sorted(
+        (codigo for codigo in projetos if len(revisores[codigo]) < alvo[codigo]),
+        key=lambda codigo: (-conflitos_por_projeto[codigo], codigo)
+    )
+
+    faltantes = {}
+
+    for codigo in pendentes:
+        faltam = alvo[codigo] - len(revisores[codigo])
+        adiados = []
+
+        while faltam and heap:
+            carga, i, id_avaliador = heapq.heappop(heap)
+
+            # Já avalia o projeto ou tem conflito: volta para o heap depois deste projeto
+            if id_avaliador in revisores[codigo] or (id_avaliador, codigo) in conflitos:
+                adiados.append((carga, i, id_avaliador))
+                continue
+
+            nova[id_avaliador].append(codigo)
+            revisores[codigo].add(id_avaliador)
+            faltam -= 1
+
+            if abaixo_do_limite(id_avaliador):
+                adiados.append((carga + 1, i, id_avaliador))
+
+        for item in adiados:
+            heapq.heappush(heap, item)
+
+        if faltam:
+            faltantes[codigo] = faltam
+
+    return nova, faltantes
+
+
+
+###########################################################################################################
+# MATRIZ DE DISTRIBUIÇÃO
+###########################################################################################################
+
+# Na tela, a distribuição é uma matriz projetos x avaliadores de booleanos (um único editor em vez de um
+# seletor por avaliador). A matriz é montada a partir da lista esparsa de atribuições e convertida de volta
+# só para gravar as diferenças; os placares são somas das linhas e das colunas.
+
+
+def matriz_distribuicao(projetos: list, avaliadores: list, distribuicao: dict) -> np.ndarray:
+    """Matriz booleana projetos x avaliadores a partir de {id_avaliador: [códigos]}."""
+
+    linha = {codigo: i for i, codigo in enumerate(projetos)}
+    coluna = {id_avaliador: j for j, id_avaliador in enumerate(avaliadores)}
+
+    pares = [
+        (linha[codigo], coluna[id_avaliador])
+        for id_avaliador, codigos in distribuicao.items() if id_avaliador in coluna
+        for codigo in codigos if codigo in linha
+    ]
+
+    matriz = np.zeros((len(projetos), len(avaliadores)), dtype=bool)
+    if pares:
+        i, j = np.array(pares).T
+        matriz[i, j] = True
+
+    return matriz
+
+
+
+def distribuicao_da_matriz(matriz: np.ndarray, projetos: list, avaliadores: list, atual: dict) -> dict:
+    """
+    Converte a matriz de volta em {id_avaliador: [códigos]}.
+    Atribuições fora da matriz (projetos ou avaliadores que não estão na tela) são mantidas como estão.
+    """
+
+    na_tela = set(projetos)
+    projetos = np.asarray(projetos, dtype=object)
+
+    nova = {
+        id_avaliador: [codigo for codigo in codigos if codigo not in na_tela]
+        for id_avaliador, codigos in atual.items()
+    }
+
+    for j, id_avaliador in enumerate(avaliadores):
+        nova.setdefault(id_avaliador, []).extend(projetos[matriz[:, j]].tolist())
+
+    return nova
+
+
+
+###########################################################################################################
+# CONFLITOS DE INTERESSE E LIMITES
+###########################################################################################################
+
+
+def conflitos_do_edital(db, codigo_edital: str) -> set:
+    """Pares (id_avaliador, codigo_recebimento) com conflito de interesse no edital."""
+
+    return {
+        (c["id_avaliador"], c["codigo_recebimento"])
+        for c in db["conflitos_interesse"].find(
+            {"codigo_edital": codigo_edital},
+            {"_id": 0, "id_avaliador": 1, "codigo_recebimento": 1}
+        )
+    }
+
+
+
+def operacoes_conflitos(codigo_edital: str, atuais: set, novos: set) -> list:
+    """Operações que levam os conflitos do edital de "atuais" para "novos" (só as diferenças)."""
+
+    agora = datetime.datetime.now()
+
+    operacoes = [
+        UpdateOne(
+            {"codigo_edital": codigo_edital, "id_avaliador": id_avaliador, "codigo_recebimento": codigo},
+            {"$setOnInsert": {"registrado_em": agora}},
+            upsert=True
+        )
+        for id_avaliador, codigo in novos - atuais
+    ]
+
+    operacoes += [
+        DeleteMany({"codigo_edital": codigo_edital, "id_avaliador": id_avaliador, "codigo_recebimento": codigo})
+        for id_avaliador, codigo in atuais - novos
+    ]
+
+    return operacoes
+
+
+
+def limite_no_estagio(pessoa: dict, codigo_edital: str, id_estagio: str):
+    """Limite de projetos da pessoa no estágio (None = sem limite)."""
+
+    return next(
+        (
+            s.get("limite_projetos")
+            for e in pessoa.get("editais", []) if e.get("codigo_edital") == codigo_edital
+            for s in e.get("estagios", []) if s.get("id_estagio") == id_estagio
+        ),
+        None
+    )
+
+
+
+def operacao_limite(pessoa_id, codigo_edital: str, id_estagio: str, limite) -> UpdateOne:
+    """UpdateOne que grava (ou remove, se None) o limite de projetos da pessoa no estágio."""
+
+    campo = "editais.$[e].estagios.$[s].limite_projetos"
+
+    return UpdateOne(
+        {"_id": pessoa_id},
+        {"$unset": {campo: ""}} if limite is None else {"$set": {campo: int(limite)}},
+        array_filters=[{"e.codigo_edital": codigo_edital}, {"s.id_estagio": id_estagio}]
+    )
+
+
+
+###########################################################################################################
+# REDISTRIBUIÇÃO AO INATIVAR AVALIADORES
+###########################################################################################################
+
+# Quando uma pessoa é inativada, as atribuições dela ainda não concluídas (consulta pelo índice
+# atribuicoes_avaliador_concluida_edital_estagio) passam para os avaliadores ativos menos carregados
+# do mesmo estágio, com a mesma distribuição gulosa (respeitando limites e conflitos de interesse).
+# Todas as mudanças vão num único bulk_write, dentro de uma transação. Atribuições que não encontram
+# avaliador disponível ficam onde estão e aparecem no resumo sem destino.
+
+
+def redistribuir_pendentes(db, ids_inativados: list) -> list:
+    """
+    Redistribui as atribuições pendentes das pessoas inativadas.
+    Retorna o resumo: [{codigo_edital, nome_estagio, codigo_recebimento, de, para}] com os nomes
+    das pessoas ("para" é None quando não houve avaliador disponível).
+    """
+
+    ids_inativados = list(ids_inativados)
+
+    pendentes = list(db["atribuicoes"].find(
+        {"id_avaliador": {"$in": ids_inativados}, "concluida": False},
+        {"_id": 0, "codigo_edital": 1, "id_estagio": 1, "id_avaliador": 1, "codigo_recebimento": 1}
+    ))
+
+    if not pendentes:
+        return []
+
+    por_estagio = {}
+    for a in pendentes:
+        por_estagio.setdefault((a["codigo_edital"], a["id_estagio"]), []).append(a)
+
+    operacoes = []
+    movimentos = []
+    conflitos_editais = {}
+
+    for (codigo_edital, id_estagio), atribuicoes in por_estagio.items():
+
+        # Avaliadores ativos do estágio, com o limite de cada um
+        candidatos = list(db["pessoas"].find(
+            {
+                "editais.codigo_edital": codigo_edital,
+                "editais.estagios.id_estagio": id_estagio,
+                "status": "ativo",
+                "_id": {"$nin": ids_inativados},
+            },
+            {"editais": {"$elemMatch": {"codigo_edital": codigo_edital}}}
+        ))
+        ids_candidatos = [p["_id"] for p in candidatos]
+        limites = {p["_id"]: limite_no_estagio(p, codigo_edital, id_estagio) for p in candidatos}
+
+        if codigo_edital not in conflitos_editais:
+            conflitos_editais[codigo_edital] = conflitos_do_edital(db, codigo_edital)
+
+        atual = {
+            id_avaliador: codigos
+            for id_avaliador, codigos in projetos_por_avaliador(db, codigo_edital, id_estagio).items()
+            if id_avaliador in limites
+        }
+
+        # Cada projeto precisa de um avaliador novo para cada atribuição pendente que sai. As atribuições
+        # em conflito de interesse não contam: distribuir_projetos as descarta da distribuição
+        conflitos = conflitos_editais[codigo_edital]
+        codigos = [a["codigo_recebimento"] for a in atribuicoes]
+        alvo = Counter(codigos)
+        for id_avaliador, codigos_avaliador in atual.items():
+            for codigo in codigos_avaliador:
+                if codigo in alvo and (id_avaliador, codigo) not in conflitos:
+                    alvo[codigo] += 1
+
+        nova, _ = distribuir_projetos(
+            list(alvo), ids_candidatos, atual, dict(alvo), limites, conflitos
+        )
+
+        # Destinos de cada projeto (atribuições que a distribuição acrescentou)
+        destinos = {}
+        for id_avaliador in ids_candidatos:
+            for codigo in set(nova[id_avaliador]) - set(atual.get(id_avaliador, [])):
+                destinos.setdefault(codigo, []).append(id_avaliador)
+                operacoes.append(operacao_atribuir(codigo_edital, id_estagio, id_avaliador, codigo))
+
+        # Só sai do avaliador inativado a atribuição que ganhou destino
+        saidas = {}
+        for a in atribuicoes:
+            fila = destinos.get(a["codigo_recebimento"], [])
+            para = fila.pop(0) if fila else None
+
+            if para is not None:
+                saidas.setdefault(a["id_avaliador"], []).append(a["codigo_recebimento"])
+
+            movimentos.append({**a, "para": para})
+
+        operacoes += [
+            operacao_desatribuir(codigo_edital, id_estagio, id_avaliador, codigos_saida)
+            for id_avaliador, codigos_saida in saidas.items()
+        ]
+
+    if operacoes:
+        executar_em_transacao(
+            db, lambda sessao: db["atribuicoes"].bulk_write(operacoes, ordered=False, session=sessao)
+        )
+
+    # Nomes das pessoas e dos estágios para o resumo (uma consulta por coleção)
+    ids_pessoas = {m["id_avaliador"] for m in movimentos} | {m["para"] for m in movimentos if m["para"]}
+    nomes = {
+        p["_id"]: p.get("nome_completo", "")
+        for p in db["pessoas"].find({"_id": {"$in": list(ids_pessoas)}}, {"nome_completo": 1})
+    }
+    nomes_estagios = {
+        (e["codigo_edital"], s.get("id_estagio")): s.get("nome_estagio", "")
+        for e in db["editais"].find(
+            {"codigo_edital": {"$in": list({m["codigo_edital"] for m in movimentos})}},
+            {"codigo_edital": 1, "estagios.id_estagio": 1, "estagios.nome_estagio": 1}
+        )
+        for s in e.get("estagios", [])
+    }
+
+    return [
+        {
+            "codigo_edital": m["codigo_edital"],
+            "nome_estagio": nomes_estagios.get((m["codigo_edital"], m["id_estagio"]), ""),
+            "codigo_recebimento": m["codigo_recebimento"],
+            "de": nomes.get(m["id_avaliador"], ""),
+            "para": nomes.get(m["para"]) if m["para"] else None,
+        }
+        for m in movimentos
+    ]
+
+
+
+###########################################################################################################
+# BENCHMARK PELA LINHA DE COMANDO
+###########################################################################################################
+
+# Distribui um estágio sintético (com limites, conflitos e parte já distribuída) e confere o resultado.
+# O tempo deve ficar bem abaixo de 1 segundo.
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    n_projetos = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_avaliadores = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    por_projeto = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    random.seed(42)
+
+    projetos = [f"P{i:05d}" for i in range(n_projetos)]
+    avaliadores = [f"A{j:04d}" for j in range(n_avaliadores)]
+
+    limites = {a: random.randint(20, 80) for a in random.sample(avaliadores, n_avaliadores // 10)}
+    conflitos = {(random.choice(avaliadores), random.choice(projetos)) for _ in range(n_projetos // 2)}
+
+    # Um décimo dos projetos já com um avaliador
+    atual = {}
+    for codigo in projetos[: n_projetos // 10]:
+        atual.setdefault(random.choice(avaliadores), []).append(codigo)
+
+    inicio = time.perf_counter()
+    nova, faltantes = distribuir_projetos(projetos, avaliadores, atual, por_projeto, limites, conflitos)
+    duracao = time.perf_counter() - inicio
+
+    cargas = [len(nova[a]) for a in avaliadores]
+    sem_limite = [len(nova[a]) for a in avaliadores if a not in limites]
+
+    assert all((a, c) not in conflitos for a, codigos in nova.items() for c in codigos)
+    assert all(len(nova[a]) <= limite for a, limite in limites.items())
+    assert all(len(set(codigos)) == len(codigos) for codigos in nova.values())
+
+    print(f"{n_projetos} projetos x {n_avaliadores} avaliadores, {por_projeto} por projeto")
+    print(f"  tempo:               {duracao * 1000:8.1f} ms")
+    print(f"  atribuições:         {sum(cargas)}")
+    print(f"  carga (sem limite):  mínimo {min(sem_limite)}, máximo {max(sem_limite)}")
+    print(f"  vagas sem avaliador: {sum(faltantes.values())}")
+
+    if duracao >= 1:
+        sys.exit(1)
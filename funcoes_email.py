@@ -0,0 +1,384 @@
+import time
+import socket
+import smtplib
+import datetime
+import threading
+from email.utils import formataddr
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import streamlit as st
+from pymongo import ReturnDocument
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+
+from funcoes_auxiliares import conectar_mongo_ieb_selecao, ler_configuracao
+
+
+###########################################################################################################
+# CAIXA DE SAÍDA DE E-MAILS
+###########################################################################################################
+
+# As páginas não falam mais com o servidor SMTP: só gravam a mensagem na coleção "email_saida"
+# (enfileirar_email) e seguem. Um worker em segundo plano, um por processo, drena a fila em lotes
+# usando uma única conexão SMTP autenticada, que fica aberta entre os envios.
+#
+# Estados de uma mensagem: pendente -> enviando -> enviado
+#                                                -> pendente (nova tentativa mais tarde)
+#                                                -> erro (falha permanente ou tentativas esgotadas)
+#
+# Parâmetros opcionais em [configuracoes] no secrets.toml:
+#   smtp_modo              -> "starttls", "ssl" ou "nenhum". Padrão: "ssl" na porta 465, senão "starttls".
+#   smtp_autenticar        -> faz login no servidor. Padrão true (use false num SMTP local de testes).
+#   email_lote             -> mensagens por lote. Padrão 20.
+#   email_intervalo        -> segundos entre verificações quando a fila está vazia. Padrão 5.
+#   email_max_tentativas   -> tentativas antes de marcar a mensagem como erro. Padrão 5.
+#   email_conexao_ociosa   -> segundos sem envio até fechar a conexão SMTP. Padrão 120.
+
+NOME_REMETENTE_PADRAO = "IEB - Seleção de Projetos"
+
+# Mensagens "enviando" há mais tempo que isso são consideradas abandonadas (processo caiu no meio)
+RESERVA_EXPIRADA = datetime.timedelta(minutes=10)
+
+
+
+def ler_config_smtp() -> dict:
+    """Reúne as credenciais de st.secrets e os parâmetros opcionais do worker."""
+
+    port = int(st.secrets["senhas"]["port"])
+
+    return {
+        "smtp_server": st.secrets["senhas"]["smtp_server"],
+        "port": port,
+        "endereco_email": st.secrets["senhas"]["endereco_email"],
+        "senha_email": st.secrets["senhas"]["senha_email"],
+        "modo": ler_configuracao("smtp_modo", "ssl" if port == 465 else "starttls"),
+        "autenticar": bool(ler_configuracao("smtp_autenticar", True)),
+        "lote": int(ler_configuracao("email_lote", 20)),
+        "intervalo": float(ler_configuracao("email_intervalo", 5)),
+        "max_tentativas": int(ler_configuracao("email_max_tentativas", 5)),
+        "conexao_ociosa": float(ler_configuracao("email_conexao_ociosa", 120)),
+    }
+
+
+
+###########################################################################################################
+# CONEXÃO SMTP PERSISTENTE
+###########################################################################################################
+
+
+class ConexaoSMTP:
+    """Mantém uma conexão SMTP autenticada aberta entre envios e reabre quando ela cai."""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.servidor = None
+        self.ultimo_uso = 0.0
+
+    def abrir(self):
+        config = self.config
+
+        if config["modo"] == "ssl":
+            servidor = smtplib.SMTP_SSL(config["smtp_server"], config["port"], timeout=30)
+        else:
+            servidor = smtplib.SMTP(config["smtp_server"], config["port"], timeout=30)
+            if config["modo"] == "starttls":
+                servidor.starttls()
+
+        if config["autenticar"]:
+            try:
+                servidor.login(config["endereco_email"], config["senha_email"])
+            except Exception:
+                servidor.close()
+                raise
+
+        self.servidor = servidor
+
+    def fechar(self):
+        if self.servidor is not None:
+            try:
+                self.servidor.quit()
+            except Exception:
+                pass
+            self.servidor = None
+
+    def fechar_se_ociosa(self):
+        if self.servidor is not None and time.monotonic() - self.ultimo_uso > self.config["conexao_ociosa"]:
+            self.fechar()
+
+    def enviar(self, msg):
+        if self.servidor is None:
+            self.abrir()
+        try:
+            self.servidor.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout):
+            # Conexão morta: descarta para a próxima tentativa abrir outra
+            self.servidor = None
+            raise
+        self.ultimo_uso = time.monotonic()
+
+
+
+def _erro_temporario(erro) -> bool:
+    """Falhas de rede e respostas 4xx valem nova tentativa; 5xx (endereço inválido etc.) não."""
+
+    if isinstance(erro, smtplib.SMTPResponseException):
+        return 400 <= erro.smtp_code < 500
+    if isinstance(erro, smtplib.SMTPRecipientsRefused):
+        return False
+    return isinstance(erro, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, socket.timeout))
+
+
+
+@retry(
+    retry=retry_if_exception(_erro_temporario),
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=1, max=10),
+    reraise=True
+)
+def _enviar_com_retentativa(conexao: ConexaoSMTP, msg):
+    conexao.enviar(msg)
+
+
+
+def montar_mensagem(doc: dict, remetente: str):
+    """Monta a mensagem MIME a partir de um documento da caixa de saída."""
+
+    msg = MIMEMultipart()
+    msg["From"] = formataddr((doc.get("nome_remetente") or NOME_REMETENTE_PADRAO, remetente))
+    msg["To"] = ", ".join(doc["destinatarios"])
+    msg["Subject"] = doc["assunto"]
+    msg.attach(MIMEText(doc["corpo_html"], "html", "utf-8"))
+    return msg
+
+
+
+###########################################################################################################
+# FILA
+###########################################################################################################
+
+
+def _documento_email(corpo_html, destinatarios, assunto, nome_remetente):
+    agora = datetime.datetime.now()
+
+    if isinstance(destinatarios, str):
+        destinatarios = [destinatarios]
+
+    return {
+        "destinatarios": list(destinatarios),
+        "assunto": assunto,
+        "corpo_html": corpo_html,
+        "nome_remetente": nome_remetente,
+        "status": "pendente",
+        "tentativas": 0,
+        "criado_em": agora,
+        "proxima_tentativa_em": agora,
+    }
+
+
+
+def enfileirar_email(
+    corpo_html: str,
+    destinatarios,
+    assunto: str,
+    nome_remetente: str = NOME_REMETENTE_PADRAO
+):
+    """
+    Grava um e-mail em HTML na caixa de saída e acorda o worker.
+    Retorna o _id da mensagem. O envio acontece em segundo plano.
+    """
+
+    db = conectar_mongo_ieb_selecao()
+    resultado = db["email_saida"].insert_one(
+        _documento_email(corpo_html, destinatarios, assunto, nome_remetente)
+    )
+
+    iniciar_worker_email()["acordar"].set()
+    return resultado.inserted_id
+
+
+
+def enfileirar_emails_em_lote(mensagens: list[dict]):
+    """
+    Grava vários e-mails de uma vez (um único insert_many).
+    Cada item: {"corpo_html", "destinatarios", "assunto"} e opcionalmente "nome_remetente".
+    Retorna a lista de _ids.
+    """
+
+    if not mensagens:
+        return []
+
+    db = conectar_mongo_ieb_selecao()
+    resultado = db["email_saida"].insert_many(
+        [
+            _documento_email(
+                m["corpo_html"], m["destinatarios"], m["assunto"],
+                m.get("nome_remetente", NOME_REMETENTE_PADRAO)
+            )
+            for m in mensagens
+        ],
+        ordered=False
+    )
+
+    iniciar_worker_email()["acordar"].set()
+    return resultado.inserted_ids
+
+
+
+def _reservar_proxima(colecao):
+    """Marca atomicamente a próxima mensagem pronta como 'enviando' e a devolve (ou None)."""
+
+    agora = datetime.datetime.now()
+
+    return colecao.find_one_and_update(
+        {"$or": [
+            {"status": "pendente", "proxima_tentativa_em": {"$lte": agora}},
+            {"status": "enviando", "reservado_em": {"$lte": agora - RESERVA_EXPIRADA}},
+        ]},
+        {"$set": {"status": "enviando", "reservado_em": agora}},
+        sort=[("proxima_tentativa_em", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+
+def processar_lote(colecao, conexao: ConexaoSMTP, config: dict) -> int:
+    """
+    Envia até config["lote"] mensagens pela mesma conexão.
+    Retorna quantas mensagens foram tratadas (enviadas ou com falha registrada).
+    """
+
+    tratadas = 0
+
+    for _ in range(config["lote"]):
+        doc = _reservar_proxima(colecao)
+        if doc is None:
+            break
+
+        tratadas += 1
+
+        try:
+            _enviar_com_retentativa(conexao, montar_mensagem(doc, config["endereco_email"]))
+
+        except Exception as e:
+            tentativas = doc.get("tentativas", 0) + 1
+
+            # Destinatário recusado ou resposta 5xx: não adianta tentar de novo.
+            # Falha de autenticação é problema de configuração e continua na fila.
+            definitivo = isinstance(e, smtplib.SMTPRecipientsRefused) or (
+                isinstance(e, smtplib.SMTPResponseException)
+                and e.smtp_code >= 500
+                and not isinstance(e, smtplib.SMTPAuthenticationError)
+            )
+
+            if definitivo or tentativas >= config["max_tentativas"]:
+                atualizacao = {"status": "erro"}
+            else:
+                # Backoff entre rodadas: 1, 2, 4, 8... minutos
+                espera = datetime.timedelta(minutes=2 ** (tentativas - 1))
+                atualizacao = {
+                    "status": "pendente",
+                    "proxima_tentativa_em": datetime.datetime.now() + espera
+                }
+
+            atualizacao.update({"tentativas": tentativas, "ultimo_erro": str(e)})
+            colecao.update_one({"_id": doc["_id"]}, {"$set": atualizacao})
+            print(f"Erro ao enviar e-mail {doc['_id']}: {e}")
+            continue
+
+        colecao.update_one(
+            {"_id": doc["_id"]},
+            {"$set": {"status": "enviado", "enviado_em": datetime.datetime.now()},
+             "$unset": {"ultimo_erro": ""}}
+        )
+
+    return tratadas
+
+
+
+###########################################################################################################
+# MODELOS DE MENSAGEM
+###########################################################################################################
+
+
+def corpo_email_convite(nome_completo, codigo):
+    """Monta o HTML do e-mail de convite com o código de 6 dígitos."""
+    return f"""
+        <p>Olá {nome_completo},</p>
+        <p>Você foi convidado para participar de um processo seletivo na <strong>Plataforma de Seleção de Projetos do IEB</strong>.</p>
+        <p>Para realizar seu cadastro, acesse o link abaixo e clique no botão <strong>"Primeiro acesso"</strong>:</p>
+        <p><a href="https://ieb-selecao.streamlit.app/">Acesse aqui a Plataforma</a></p>
+        <p>Insira o seu <strong>e-mail</strong> e o <strong>código</strong> que te enviamos abaixo:</p>
+        <h2>{codigo}</h2>
+        <p>Se tiver alguma dúvida, entre em contato com a equipe do CEPF.</p>
+        """
+
+
+ASSUNTO_CONVITE = "Convite para a Plataforma de Seleção de Projetos do IEB"
+
+
+
+###########################################################################################################
+# WORKER EM SEGUNDO PLANO
+###########################################################################################################
+
+
+def _laco_worker(colecao, config, acordar):
+    conexao = ConexaoSMTP(config)
+
+    while True:
+        try:
+            tratadas = processar_lote(colecao, conexao, config)
+        except Exception as e:
+            # Erro de banco, por exemplo. O worker não pode morrer.
+            print(f"Erro no worker de e-mail: {e}")
+            tratadas = 0
+
+        if tratadas == 0:
+            conexao.fechar_se_ociosa()
+            acordar.wait(config["intervalo"])
+            acordar.clear()
+
+
+
+@st.cache_resource
+def iniciar_worker_email():
+    """Inicia, uma vez por processo, a thread que drena a caixa de saída."""
+
+    config = ler_config_smtp()
+    colecao = conectar_mongo_ieb_selecao()["email_saida"]
+    acordar = threading.Event()
+
+    thread = threading.Thread(
+        target=_laco_worker,
+        args=(colecao, config, acordar),
+        name="worker_email",
+        daemon=True
+    )
+    thread.start()
+
+    return {"thread": thread, "acordar": acordar}
+
+
+
+###########################################################################################################
+# ENVIO PELA LINHA DE COMANDO
+###########################################################################################################
+
+# Uso: python funcoes_email.py
+# Drena a caixa de saída uma vez, em primeiro plano. Útil contra um SMTP local de testes, por exemplo
+# "python -m aiosmtpd -n -l localhost:1025" com smtp_server = "localhost", port = 1025,
+# smtp_modo = "nenhum" e smtp_autenticar = false.
+if __name__ == "__main__":
+    config = ler_config_smtp()
+    colecao = conectar_mongo_ieb_selecao()["email_saida"]
+    conexao = ConexaoSMTP(config)
+
+    total = 0
+    while True:
+        tratadas = processar_lote(colecao, conexao, config)
+        if tratadas == 0:
+            break
+        total += tratadas
+
+    conexao.fechar()
+    print(f"{total} mensagens processadas.")
@@ -0,0 +1,285 @@
+import csv
+import os
+import time
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+from funcoes_lista_pessoas import formatar_valor
+
+
+###########################################################################################################
+# EXPORTAÇÃO EM STREAMING
+###########################################################################################################
+
+# Os dados são lidos de um cursor do MongoDB em lotes de TAMANHO_LOTE documentos e gravados
+# incrementalmente num arquivo temporário (CSV linha a linha ou Parquet um row group por lote).
+# Em nenhum momento o resultado inteiro fica em memória como lista ou DataFrame.
+#
+# Os arquivos ficam numa pasta própria do app. Cada arquivo é apagado assim que é baixado ou quando a
+# mesma exportação é gerada de novo; os esquecidos (sessão fechada sem baixar) são apagados na
+# próxima exportação de qualquer pessoa, depois de VALIDADE_ARQUIVOS segundos.
+
+TAMANHO_LOTE = 2000
+
+PASTA_EXPORTACOES = os.path.join(tempfile.gettempdir(), "ieb_selecao_exportacoes")
+
+VALIDADE_ARQUIVOS = 60 * 60
+
+FORMATOS = {
+    "CSV": {"extensao": "csv", "mime": "text/csv"},
+    "Parquet": {"extensao": "parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+
+# Exportações disponíveis: colunas na ordem do arquivo
+COLUNAS_PESSOAS = ["nome_completo", "e_mail", "telefone", "tipo_usuario", "status", "data_convite"]
+
+COLUNAS_ATRIBUICOES = ["nome_completo", "e_mail", "codigo_edital", "nome_estagio", "codigo_recebimento", "concluida"]
+
+COLUNAS_PROJETOS = ["codigo_edital", "codigo_recebimento"]
+
+
+
+###########################################################################################################
+# CONSULTAS
+###########################################################################################################
+
+
+def cursor_pessoas(db):
+    """Todas as pessoas, só com os campos exportados (sem senha nem código de convite)."""
+
+    return db["pessoas"].find(
+        {},
+        {campo: 1 for campo in COLUNAS_PESSOAS} | {"_id": 0}
+    ).sort([("nome_completo", 1), ("_id", 1)]).batch_size(TAMANHO_LOTE)
+
+
+
+def cursor_atribuicoes(db, codigo_edital: str):
+    """
+    Uma linha por (pessoa, estágio, projeto) atribuído no edital, lida da coleção "atribuicoes".
+    Nome e e-mail da pessoa vêm de um $lookup por _id; o nome do estágio, do próprio edital.
+    """
+
+    edital = db["editais"].find_one({"codigo_edital": codigo_edital}, {"estagios": 1}) or {}
+    estagios = [
+        {"id_estagio": e.get("id_estagio"), "nome_estagio": e.get("nome_estagio")}
+        for e in edital.get("estagios", [])
+    ]
+
+    pipeline = [
+        # Usa o prefixo do índice atribuicoes_edital_estagio_avaliador_projeto
+        {"$match": {"codigo_edital": codigo_edital}},
+        {"$lookup": {
+            "from": "pessoas",
+            "localField": "id_avaliador",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"_id": 0, "nome_completo": 1, "e_mail": 1}}],
+            "as": "pessoa",
+        }},
+        {"$project": {
+            "_id": 0,
+            "nome_completo": {"$first": "$pessoa.nome_completo"},
+            "e_mail": {"$first": "$pessoa.e_mail"},
+            "codigo_edital": 1,
+            "nome_estagio": {"$first": {"$map": {
+                "input": {"$filter": {
+                    "input": {"$literal": estagios},
+                    "cond": {"$eq": ["$$this.id_estagio", "$id_estagio"]}
+                }},
+                "in": "$$this.nome_estagio"
+            }}},
+            "codigo_recebimento": 1,
+            "concluida": 1,
+        }},
+        {"$sort": {"nome_estagio": 1, "nome_completo": 1, "codigo_recebimento": 1}},
+    ]
+
+    return db["atribuicoes"].aggregate(pipeline, allowDiskUse=True, batchSize=TAMANHO_LOTE)
+
+
+
+def cursor_projetos(db, codigo_edital: str):
+    """Projetos de um edital, ordenados pelo código de recebimento."""
+
+    return db["projetos"].find(
+        {"codigo_edital": codigo_edital},
+        {campo: 1 for campo in COLUNAS_PROJETOS} | {"_id": 0}
+    ).sort("codigo_recebimento", 1).batch_size(TAMANHO_LOTE)
+
+
+
+###########################################################################################################
+# GRAVAÇÃO
+###########################################################################################################
+
+
+def _lotes(cursor, colunas: list, tamanho: int = TAMANHO_LOTE):
+    """Percorre o cursor devolvendo listas de até 'tamanho' linhas já convertidas para texto."""
+
+    lote = []
+
+    for doc in cursor:
+        lote.append({coluna: formatar_valor(doc.get(coluna)) for coluna in colunas})
+
+        if len(lote) == tamanho:
+            yield lote
+            lote = []
+
+    if lote:
+        yield lote
+
+
+
+def gravar_csv(cursor, colunas: list, caminho: str) -> int:
+    """Grava o cursor em CSV (UTF-8 com BOM, para abrir direto no Excel). Retorna o número de linhas."""
+
+    linhas = 0
+
+    with open(caminho, "w", newline="", encoding="utf-8-sig") as arquivo:
+        escritor = csv.DictWriter(arquivo, fieldnames=colunas)
+        escritor.writeheader()
+
+        for lote in _lotes(cursor, colunas):
+            escritor.writerows(lote)
+            linhas += len(lote)
+
+    return linhas
+
+
+
+def gravar_parquet(cursor, colunas: list, caminho: str) -> int:
+    """Grava o cursor em Parquet, um row group por lote. Retorna o número de linhas."""
+
+    esquema = pa.schema([(coluna, pa.string()) for coluna in colunas])
+    linhas = 0
+
+    with pq.ParquetWriter(caminho, esquema) as escritor:
+        for lote in _lotes(cursor, colunas):
+            escritor.write_table(pa.Table.from_pylist(lote, schema=esquema))
+            linhas += len(lote)
+
+        # Arquivo vazio ainda precisa das colunas
+        if linhas == 0:
+            escritor.write_table(esquema.empty_table())
+
+    return linhas
+
+
+
+def apagar_arquivo(caminho: str):
+    """Apaga o arquivo, se ele ainda existir."""
+
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+
+def limpar_exportacoes_antigas():
+    """Apaga os arquivos da pasta de exportações gerados há mais de VALIDADE_ARQUIVOS segundos."""
+
+    limite = time.time() - VALIDADE_ARQUIVOS
+
+    for entrada in os.scandir(PASTA_EXPORTACOES):
+        try:
+            if entrada.is_file() and entrada.stat().st_mtime < limite:
+                apagar_arquivo(entrada.path)
+        except FileNotFoundError:
+            pass
+
+
+
+def exportar(cursor, colunas: list, formato: str):
+    """
+    Grava o cursor num arquivo temporário no formato escolhido ("CSV" ou "Parquet").
+    Retorna (caminho, linhas). Quem chama é responsável por apagar o arquivo.
+    """
+
+    os.makedirs(PASTA_EXPORTACOES, exist_ok=True)
+    limpar_exportacoes_antigas()
+
+    extensao = FORMATOS[formato]["extensao"]
+    descritor, caminho = tempfile.mkstemp(suffix=f".{extensao}", prefix="exportacao_", dir=PASTA_EXPORTACOES)
+    os.close(descritor)
+
+    try:
+        if formato == "Parquet":
+            linhas = gravar_parquet(cursor, colunas, caminho)
+        else:
+            linhas = gravar_csv(cursor, colunas, caminho)
+    except Exception:
+        apagar_arquivo(caminho)
+        raise
+    finally:
+        cursor.close()
+
+    return caminho, linhas
+
+
+
+###########################################################################################################
+# COMPONENTE
+###########################################################################################################
+
+
+def descartar_arquivo(chave_arquivo: str):
+    """Apaga o arquivo gerado para a chave e o esquece na sessão (callback do botão de download)."""
+
+    arquivo = st.session_state.pop(chave_arquivo, None)
+
+    if arquivo:
+        apagar_arquivo(arquivo["caminho"])
+
+
+
+def botao_exportacao(chave: str, rotulo: str, nome_arquivo: str, gerar_cursor, colunas: list):
+    """
+    Seletor de formato + botão "Gerar arquivo" + botão de download.
+    O arquivo só é gerado quando o botão é clicado; o caminho fica em session_state.
+    O arquivo é apagado ao ser baixado ou ao gerar um novo com a mesma chave.
+    gerar_cursor -> função sem argumentos que devolve o cursor a exportar
+    """
+
+    chave_arquivo = f"{chave}_arquivo"
+
+    with st.container(horizontal=True, vertical_alignment="bottom"):
+
+        formato = st.segmented_control(
+            rotulo,
+            list(FORMATOS),
+            default="CSV",
+            key=f"{chave}_formato"
+        ) or "CSV"
+
+        if st.button("Gerar arquivo", icon=":material/table_view:", key=f"{chave}_gerar"):
+
+            descartar_arquivo(chave_arquivo)
+
+            with st.spinner("Gerando arquivo..."):
+                caminho, linhas = exportar(gerar_cursor(), colunas, formato)
+
+            st.session_state[chave_arquivo] = {"caminho": caminho, "linhas": linhas, "formato": formato}
+
+        arquivo = st.session_state.get(chave_arquivo)
+
+        if arquivo and os.path.exists(arquivo["caminho"]):
+            extensao = FORMATOS[arquivo["formato"]]["extensao"]
+
+            # Só os bytes do arquivo final vão para o Streamlit, nunca as linhas do resultado.
+            # O Streamlit copia os bytes ao criar o botão, então o arquivo pode ser apagado no clique
+            with open(arquivo["caminho"], "rb") as conteudo:
+                st.download_button(
+                    f"Baixar {extensao.upper()} ({arquivo['linhas']} linhas)",
+                    data=conteudo,
+                    file_name=f"{nome_arquivo}.{extensao}",
+                    mime=FORMATOS[arquivo["formato"]]["mime"],
+                    icon=":material/download:",
+                    key=f"{chave}_baixar",
+                    on_click=descartar_arquivo,
+                    args=(chave_arquivo,)
+                )
@@ -0,0 +1,320 @@
+import streamlit as st
+from jsonschema import Draft202012Validator
+
+
+###########################################################################################################
+# FORMULÁRIO DOS ESTÁGIOS
+###########################################################################################################
+
+# Renderiza as perguntas_estagio de um estágio para o avaliador e valida as respostas.
+#
+# Cada estágio é compilado uma única vez em dois validadores JSON Schema (rascunho e envio final),
+# guardados em cache por (codigo_edital, id_estagio, versao do edital). Como toda alteração no edital
+# incrementa "versao", uma pergunta editada gera um validador novo; nas demais execuções a validação
+# é só uma chamada ao validador em cache, sem percorrer a lista de perguntas de novo.
+#
+# Formulários longos são divididos em seções, uma por "titulo", e só a seção ativa é renderizada
+# (dentro de um fragmento). As respostas ficam num dicionário próprio na sessão, atualizado pelo
+# on_change de cada widget: o Streamlit descarta o estado dos widgets que deixam de ser renderizados,
+# e as respostas das outras seções não podem se perder com isso.
+
+# Tipos de pergunta que são só texto de apoio, sem resposta
+TIPOS_SEM_RESPOSTA = ["titulo", "subtitulo", "paragrafo"]
+
+# Limites de tamanho das respostas de texto
+MAX_TEXTO_CURTO = 500
+MAX_TEXTO_LONGO = 20000
+
+
+
+def valor_vazio(tipo: str):
+    """Valor de uma pergunta ainda sem resposta, conforme o tipo."""
+
+    if tipo == "multipla_escolha":
+        return []
+    if tipo in ["numero", "escolha_unica"]:
+        return None
+    return ""
+
+
+
+def key_resposta(chave_sessao: str, id_pergunta: str) -> str:
+    """Key do widget da resposta de uma pergunta."""
+    return f"resp_{chave_sessao}_{id_pergunta}"
+
+
+
+def iniciar_respostas(chave_sessao: str, respostas: dict):
+    """Guarda na sessão as respostas iniciais do formulário (só na primeira vez)."""
+    st.session_state.setdefault(f"respostas_{chave_sessao}", dict(respostas))
+
+
+
+def _guardar_resposta(chave_sessao: str, id_pergunta: str):
+    """on_change dos widgets: copia o valor do widget para o dicionário de respostas da sessão."""
+    st.session_state[f"respostas_{chave_sessao}"][id_pergunta] = st.session_state[key_resposta(chave_sessao, id_pergunta)]
+
+
+
+def respostas_da_tela(chave_sessao: str, perguntas: list) -> dict:
+    """Respostas atuais do formulário (de todas as seções): {id_pergunta: valor}."""
+
+    respostas = st.session_state.get(f"respostas_{chave_sessao}", {})
+
+    return {
+        p["id_pergunta"]: respostas.get(p["id_pergunta"], valor_vazio(p["tipo"]))
+        for p in perguntas
+        if p["tipo"] not in TIPOS_SEM_RESPOSTA
+    }
+
+
+
+def secoes_formulario(perguntas: list) -> list:
+    """
+    Divide as perguntas em seções, começando uma nova a cada "titulo".
+    Perguntas antes do primeiro título formam uma seção inicial.
+    Retorna [{"titulo": texto, "perguntas": [...]}].
+    """
+
+    secoes = []
+
+    for p in perguntas:
+        if p["tipo"] == "titulo" or not secoes:
+            titulo = p["pergunta"] if p["tipo"] == "titulo" else "Início"
+            secoes.append({"titulo": titulo, "perguntas": []})
+        secoes[-1]["perguntas"].append(p)
+
+    return secoes
+
+
+
+###########################################################################################################
+# ESQUEMAS DE VALIDAÇÃO
+###########################################################################################################
+
+
+def esquema_pergunta(pergunta: dict, final: bool) -> dict:
+    """
+    Esquema JSON da resposta de uma pergunta.
+    No rascunho, qualquer resposta vazia é aceita; no envio final, a resposta é obrigatória.
+    """
+
+    tipo = pergunta["tipo"]
+    opcoes = pergunta.get("opcoes", [])
+
+    if tipo in ["texto_curto", "texto_longo"]:
+        esquema = {
+            "type": "string",
+            "maxLength": MAX_TEXTO_CURTO if tipo == "texto_curto" else MAX_TEXTO_LONGO,
+        }
+        if final:
+            esquema["minLength"] = 1
+            esquema["pattern"] = r"\S"
+        return esquema
+
+    if tipo == "numero":
+        return {"type": "number"} if final else {"type": ["number", "null"]}
+
+    if tipo == "escolha_unica":
+        return {"enum": list(opcoes) if final else list(opcoes) + [None]}
+
+    if tipo == "multipla_escolha":
+        esquema = {"type": "array", "items": {"enum": list(opcoes)}, "uniqueItems": True}
+        if final:
+            esquema["minItems"] = 1
+        return esquema
+
+    # Tipo desconhecido: aceita qualquer valor
+    return {}
+
+
+
+def esquema_estagio(perguntas: list, final: bool) -> dict:
+    """Esquema JSON do objeto de respostas {id_pergunta: valor} de um estágio."""
+
+    respondiveis = [p for p in perguntas if p["tipo"] not in TIPOS_SEM_RESPOSTA]
+
+    return {
+        "type": "object",
+        "properties": {p["id_pergunta"]: esquema_pergunta(p, final) for p in respondiveis},
+        "required": [p["id_pergunta"] for p in respondiveis] if final else [],
+    }
+
+
+
+@st.cache_resource(max_entries=200, show_spinner=False)
+def validadores_estagio(codigo_edital: str, id_estagio: str, versao: int, _perguntas: list) -> dict:
+    """
+    Compila os validadores e as seções do estágio, uma vez por versão do edital.
+    As perguntas não entram na chave do cache (parâmetro com "_"): a versão já identifica o conteúdo.
+    Retorna {"rascunho": validador, "final": validador, "textos": {id_pergunta: texto},
+             "secoes": [...], "secao_da_pergunta": {id_pergunta: índice da seção}}.
+    """
+
+    secoes = secoes_formulario(_perguntas)
+
+    return {
+        "secoes": secoes,
+        "secao_da_pergunta": {
+            p["id_pergunta"]: i
+            for i, secao in enumerate(secoes)
+            for p in secao["perguntas"]
+            if p["tipo"] not in TIPOS_SEM_RESPOSTA
+        },
+        "rascunho": Draft202012Validator(esquema_estagio(_perguntas, final=False)),
+        "final": Draft202012Validator(esquema_estagio(_perguntas, final=True)),
+        "textos": {
+            p["id_pergunta"]: p["pergunta"]
+            for p in _perguntas
+            if p["tipo"] not in TIPOS_SEM_RESPOSTA
+        },
+    }
+
+
+
+def erros_respostas(validadores: dict, respostas: dict, final: bool) -> dict:
+    """
+    Valida as respostas com o validador em cache.
+    Retorna {id_pergunta: mensagem} (vazio se tudo estiver válido).
+    """
+
+    validador = validadores["final" if final else "rascunho"]
+    erros = {}
+
+    for erro in validador.iter_errors(respostas):
+
+        if erro.validator == "required":
+            for id_pergunta in set(erro.validator_value) - set(respostas):
+                erros.setdefault(id_pergunta, "Resposta obrigatória.")
+            continue
+
+        if not erro.absolute_path:
+            continue
+
+        id_pergunta = erro.absolute_path[0]
+
+        # No envio, resposta vazia (inclusive escolha única sem opção marcada, que falha no enum) é obrigatória
+        if final and (erro.instance is None or erro.validator in ["minLength", "minItems", "pattern", "type"]):
+            mensagem = "Resposta obrigatória."
+        elif erro.validator == "maxLength":
+            mensagem = f"Resposta muito longa (máximo de {erro.validator_value} caracteres)."
+        elif erro.validator == "enum":
+            mensagem = "Opção inválida. A pergunta pode ter sido alterada; recarregue a página."
+        else:
+            mensagem = "Resposta inválida."
+
+        erros.setdefault(id_pergunta, mensagem)
+
+    return erros
+
+
+
+###########################################################################################################
+# RENDERIZAÇÃO
+###########################################################################################################
+
+
+def campo_pergunta(p: dict, chave_sessao: str, desabilitado: bool, erro: str | None = None):
+    """Renderiza o texto de apoio ou o widget de resposta de uma pergunta (com o erro, se houver)."""
+
+    tipo = p["tipo"]
+
+    if tipo not in TIPOS_SEM_RESPOSTA:
+        id_pergunta = p["id_pergunta"]
+        key = key_resposta(chave_sessao, id_pergunta)
+
+        # Widget recriado ao voltar para a seção: parte da resposta guardada
+        if key not in st.session_state:
+            st.session_state[key] = st.session_state[f"respostas_{chave_sessao}"].get(id_pergunta, valor_vazio(tipo))
+
+        parametros = {
+            "key": key,
+            "disabled": desabilitado,
+            "on_change": _guardar_resposta,
+            "args": (chave_sessao, id_pergunta),
+        }
+
+    if tipo == "titulo":
+        st.markdown(f"### {p['pergunta']}")
+    elif tipo == "subtitulo":
+        st.markdown(f"#### {p['pergunta']}")
+    elif tipo == "paragrafo":
+        st.write(p["pergunta"])
+    elif tipo == "texto_curto":
+        st.text_input(p["pergunta"], max_chars=MAX_TEXTO_CURTO, **parametros)
+    elif tipo == "texto_longo":
+        st.text_area(p["pergunta"], max_chars=MAX_TEXTO_LONGO, **parametros)
+    elif tipo == "numero":
+        st.number_input(p["pergunta"], **parametros)
+    elif tipo == "escolha_unica":
+        st.radio(p["pergunta"], p.get("opcoes", []), **parametros)
+    elif tipo == "multipla_escolha":
+        st.multiselect(p["pergunta"], p.get("opcoes", []), **parametros)
+
+    if erro:
+        st.caption(f":red[{erro}]")
+
+
+
+def _mudar_secao(key_secao: str, passo: int):
+    """on_click de "Anterior"/"Próxima"."""
+    st.session_state[key_secao] += passo
+
+
+
+@st.fragment
+def formulario_por_secoes(chave_sessao: str, validadores: dict, desabilitado: bool, erros: dict):
+    """
+    Formulário paginado por seção. Só a seção ativa é renderizada e, como fragmento,
+    uma alteração num campo ou a troca de seção reexecuta só o formulário.
+    """
+
+    secoes = validadores["secoes"]
+    key_secao = f"secao_{chave_sessao}"
+
+    # Seção pedida de fora do fragmento (ex.: primeira seção com pendências após tentar enviar)
+    if f"ir_para_secao_{chave_sessao}" in st.session_state:
+        st.session_state[key_secao] = st.session_state.pop(f"ir_para_secao_{chave_sessao}")
+
+    if st.session_state.get(key_secao, 0) >= len(secoes):
+        st.session_state[key_secao] = 0
+
+    if len(secoes) > 1:
+
+        # Seções com erro de envio ficam marcadas no seletor
+        erros_por_secao = {}
+        for id_pergunta in erros:
+            indice = validadores["secao_da_pergunta"].get(id_pergunta)
+            erros_por_secao[indice] = erros_por_secao.get(indice, 0) + 1
+
+        def rotulo_secao(i):
+            marca = f" ({erros_por_secao[i]} pendente(s))" if i in erros_por_secao else ""
+            return f"{i + 1}/{len(secoes)} — {secoes[i]['titulo']}{marca}"
+
+        st.selectbox("Seção", range(len(secoes)), format_func=rotulo_secao, key=key_secao)
+
+    indice = st.session_state.get(key_secao, 0)
+
+    for p in secoes[indice]["perguntas"]:
+        campo_pergunta(p, chave_sessao, desabilitado, erros.get(p.get("id_pergunta")))
+
+    if len(secoes) > 1:
+        st.write("")
+
+        with st.container(horizontal=True, horizontal_alignment="distribute"):
+            st.button(
+                "Anterior",
+                icon=":material/arrow_back:",
+                key=f"{key_secao}_anterior",
+                disabled=indice == 0,
+                on_click=_mudar_secao,
+                args=(key_secao, -1)
+            )
+            st.button(
+                "Próxima",
+                icon=":material/arrow_forward:",
+                key=f"{key_secao}_proxima",
+                disabled=indice == len(secoes) - 1,
+                on_click=_mudar_secao,
+                args=(key_secao, 1)
+            )
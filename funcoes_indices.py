@@ -0,0 +1,304 @@
+import sys
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+
+###########################################################################################################
+# ÍNDICES DO BANCO ieb_selecao
+###########################################################################################################
+
+# Índices por coleção. Cada índice corresponde a uma forma de consulta usada pelas páginas.
+# Os nomes são fixos para que a criação seja idempotente (create_indexes não recria um índice igual).
+INDICES = {
+    "pessoas": [
+        # Busca por e-mail normalizado (login, primeiro acesso, recuperação de senha, duplicidade).
+        # Parcial para não conflitar entre documentos antigos ainda sem o campo.
+        IndexModel(
+            [("e_mail_normalizado", ASCENDING)],
+            name="pessoas_e_mail_normalizado",
+            unique=True,
+            partialFilterExpression={"e_mail_normalizado": {"$type": "string"}}
+        ),
+
+        # Listas paginadas de pessoas filtradas por tipo de usuário e ordenadas por (nome, _id)
+        IndexModel(
+            [("tipo_usuario", ASCENDING), ("nome_completo", ASCENDING), ("_id", ASCENDING)],
+            name="pessoas_tipo_usuario_nome_id"
+        ),
+
+        # Listas paginadas filtradas por status (convites pendentes, pessoas ativas)
+        IndexModel(
+            [("status", ASCENDING), ("nome_completo", ASCENDING), ("_id", ASCENDING)],
+            name="pessoas_status_nome_id"
+        ),
+
+        # Busca por prefixo de nome ou e-mail (multikey sobre as palavras normalizadas)
+        IndexModel([("termos_busca", ASCENDING)], name="pessoas_termos_busca"),
+
+        # Avaliadores vinculados a um estágio de um edital (pelo id estável do estágio)
+        IndexModel(
+            [("editais.codigo_edital", ASCENDING), ("editais.estagios.id_estagio", ASCENDING)],
+            name="pessoas_edital_id_estagio"
+        ),
+    ],
+
+    "editais": [
+        IndexModel([("codigo_edital", ASCENDING)], name="editais_codigo_edital", unique=True),
+    ],
+
+    "avaliacoes": [
+        # Uma avaliação por edital, estágio, avaliador e projeto. O prefixo (edital, estágio, avaliador)
+        # atende a lista de projetos do avaliador.
+        IndexModel(
+            [
+                ("codigo_edital", ASCENDING),
+                ("id_estagio", ASCENDING),
+                ("id_avaliador", ASCENDING),
+                ("codigo_recebimento", ASCENDING),
+            ],
+            name="avaliacoes_edital_estagio_avaliador_projeto",
+            unique=True
+        ),
+
+        # Agregação do ranking por projeto (avaliações enviadas de um projeto no estágio)
+        IndexModel(
+            [
+                ("codigo_edital", ASCENDING),
+                ("id_estagio", ASCENDING),
+                ("codigo_recebimento", ASCENDING),
+                ("status", ASCENDING),
+            ],
+            name="avaliacoes_edital_estagio_projeto_status"
+        ),
+    ],
+
+    "atribuicoes": [
+        # Uma atribuição por edital, estágio, avaliador e projeto. O prefixo (edital, estágio)
+        # atende a distribuição do estágio e a exportação.
+        IndexModel(
+            [
+                ("codigo_edital", ASCENDING),
+                ("id_estagio", ASCENDING),
+                ("id_avaliador", ASCENDING),
+                ("codigo_recebimento", ASCENDING),
+            ],
+            name="atribuicoes_edital_estagio_avaliador_projeto",
+            unique=True
+        ),
+
+        # Avaliadores de um projeto no estágio
+        IndexModel(
+            [("codigo_edital", ASCENDING), ("id_estagio", ASCENDING), ("codigo_recebimento", ASCENDING)],
+            name="atribuicoes_edital_estagio_projeto"
+        ),
+
+        # Pendências do estágio (atribuições ainda não concluídas)
+        IndexModel(
+            [("codigo_edital", ASCENDING), ("id_estagio", ASCENDING), ("concluida", ASCENDING)],
+            name="atribuicoes_edital_estagio_concluida"
+        ),
+
+        # Projetos do avaliador (página do avaliador) e suas pendências
+        IndexModel(
+            [("id_avaliador", ASCENDING), ("concluida", ASCENDING), ("codigo_edital", ASCENDING), ("id_estagio", ASCENDING)],
+            name="atribuicoes_avaliador_concluida_edital_estagio"
+        ),
+    ],
+
+    "conflitos_interesse": [
+        # Um registro por edital, avaliador e projeto; o prefixo atende a leitura dos conflitos do edital
+        IndexModel(
+            [("codigo_edital", ASCENDING), ("id_avaliador", ASCENDING), ("codigo_recebimento", ASCENDING)],
+            name="conflitos_interesse_edital_avaliador_projeto",
+            unique=True
+        ),
+    ],
+
+    "rankings": [
+        # Chave do $merge do ranking (exige índice único) e leitura do ranking do estágio
+        IndexModel(
+            [("codigo_edital", ASCENDING), ("id_estagio", ASCENDING), ("codigo_recebimento", ASCENDING)],
+            name="rankings_edital_estagio_projeto",
+            unique=True
+        ),
+    ],
+
+    "email_saida": [
+        # Worker de e-mail: próxima mensagem pendente por data da próxima tentativa
+        IndexModel(
+            [("status", ASCENDING), ("proxima_tentativa_em", ASCENDING)],
+            name="email_saida_status_proxima_tentativa"
+        ),
+    ],
+
+    "projetos": [
+        # Um projeto por código de recebimento no edital: torna a carga da planilha idempotente
+        IndexModel(
+            [("codigo_edital", ASCENDING), ("codigo_recebimento", ASCENDING)],
+            name="projetos_edital_recebimento",
+            unique=True
+        ),
+
+        # Projetos habilitados (promovidos) para um estágio
+        IndexModel(
+            [("codigo_edital", ASCENDING), ("estagios_habilitados", ASCENDING)],
+            name="projetos_edital_estagios_habilitados"
+        ),
+    ],
+}
+
+
+# Índices que não correspondem mais a nenhuma consulta e são removidos: {coleção: [nomes]}
+INDICES_OBSOLETOS = {
+    "pessoas": [
+        "pessoas_e_mail", "pessoas_tipo_usuario_nome", "pessoas_status_nome",
+        "pessoas_edital_estagio",
+    ],
+}
+
+
+# Ordenação das listas paginadas de pessoas
+ORDEM_NOME = [("nome_completo", ASCENDING), ("_id", ASCENDING)]
+
+
+# Formas de consulta verificadas com explain(): (descrição, coleção, filtro, ordenação)
+CONSULTAS_VERIFICADAS = [
+    ("login / primeiro acesso por e-mail", "pessoas", {"e_mail_normalizado": "teste@exemplo.org"}, None),
+    ("equipe ordenada por nome", "pessoas", {"tipo_usuario": {"$in": ["admin", "equipe"]}}, ORDEM_NOME),
+    ("avaliadores ordenados por nome", "pessoas", {"tipo_usuario": "avaliador"}, ORDEM_NOME),
+    ("visitantes ordenados por nome", "pessoas", {"tipo_usuario": "visitante"}, ORDEM_NOME),
+    ("convites pendentes ordenados por nome", "pessoas", {"status": "convidado"}, ORDEM_NOME),
+    ("pessoas ativas", "pessoas", {"status": "ativo"}, None),
+    ("busca de pessoas por prefixo", "pessoas", {"termos_busca": {"$regex": "^mar"}}, None),
+    (
+        "avaliadores do estágio",
+        "pessoas",
+        {"editais.codigo_edital": "EDITAL", "editais.estagios.id_estagio": "ID_ESTAGIO"},
+        None
+    ),
+    ("edital por código", "editais", {"codigo_edital": "EDITAL"}, None),
+    ("projetos do edital", "projetos", {"codigo_edital": "EDITAL"}, None),
+    ("projetos habilitados no estágio", "projetos", {"codigo_edital": "EDITAL", "estagios_habilitados": "ID_ESTAGIO"}, None),
+    ("projeto por código de recebimento", "projetos", {"codigo_edital": "EDITAL", "codigo_recebimento": "0001"}, None),
+    (
+        "avaliações do avaliador no estágio",
+        "avaliacoes",
+        {"codigo_edital": "EDITAL", "id_estagio": "ID_ESTAGIO", "id_avaliador": "ID_AVALIADOR"},
+        None
+    ),
+    (
+        "avaliações enviadas do projeto (ranking)",
+        "avaliacoes",
+        {"codigo_edital": "EDITAL", "id_estagio": "ID_ESTAGIO", "codigo_recebimento": "0001", "status": "enviada"},
+        None
+    ),
+    ("distribuição do estágio", "atribuicoes", {"codigo_edital": "EDITAL", "id_estagio": "ID_ESTAGIO"}, None),
+    (
+        "avaliadores do projeto no estágio",
+        "atribuicoes",
+        {"codigo_edital": "EDITAL", "id_estagio": "ID_ESTAGIO", "codigo_recebimento": "0001"},
+        None
+    ),
+    (
+        "pendências do estágio",
+        "atribuicoes",
+        {"codigo_edital": "EDITAL", "id_estagio": "ID_ESTAGIO", "concluida": False},
+        None
+    ),
+    ("projetos do avaliador", "atribuicoes", {"id_avaliador": "ID_AVALIADOR"}, None),
+    ("pendências do avaliador", "atribuicoes", {"id_avaliador": "ID_AVALIADOR", "concluida": False}, None),
+    ("conflitos de interesse do edital", "conflitos_interesse", {"codigo_edital": "EDITAL"}, None),
+    ("ranking do estágio", "rankings", {"codigo_edital": "EDITAL", "id_estagio": "ID_ESTAGIO"}, None),
+    ("próximo e-mail da fila", "email_saida", {"status": "pendente"}, [("proxima_tentativa_em", ASCENDING)]),
+]
+
+
+
+###########################################################################################################
+# FUNÇÕES
+###########################################################################################################
+
+
+def criar_indices(db):
+    """
+    Cria (se ainda não existirem) todos os índices definidos em INDICES
+    e remove os listados em INDICES_OBSOLETOS.
+    Pode ser chamada várias vezes: índices já existentes são mantidos.
+    """
+
+    for nome_colecao, nomes in INDICES_OBSOLETOS.items():
+        existentes = db[nome_colecao].index_information()
+        for nome in nomes:
+            if nome in existentes:
+                db[nome_colecao].drop_index(nome)
+
+    # Um índice por vez: a falha de um (ex.: dados duplicados impedem um índice único)
+    # não impede a criação dos demais. O app continua funcionando sem o que falhou.
+    for nome_colecao, indices in INDICES.items():
+        for indice in indices:
+            try:
+                db[nome_colecao].create_indexes([indice])
+            except OperationFailure as e:
+                print(f"Erro ao criar o índice {indice.document['name']} da coleção {nome_colecao}: {e}")
+
+
+
+def _estagios_do_plano(plano):
+    """Percorre recursivamente um plano de execução e devolve todos os nomes de estágio."""
+
+    if isinstance(plano, dict):
+        if "stage" in plano:
+            yield plano["stage"]
+        for valor in plano.values():
+            yield from _estagios_do_plano(valor)
+    elif isinstance(plano, list):
+        for item in plano:
+            yield from _estagios_do_plano(item)
+
+
+
+def verificar_indices(db):
+    """
+    Roda explain() em cada consulta de CONSULTAS_VERIFICADAS.
+    Retorna a lista de consultas cujo plano vencedor usa COLLSCAN.
+    """
+
+    falhas = []
+
+    for descricao, nome_colecao, filtro, ordenacao in CONSULTAS_VERIFICADAS:
+        cursor = db[nome_colecao].find(filtro)
+        if ordenacao:
+            cursor = cursor.sort(ordenacao)
+
+        plano = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        estagios = set(_estagios_do_plano(plano))
+
+        if "COLLSCAN" in estagios:
+            falhas.append(descricao)
+            print(f"COLLSCAN   {descricao}")
+        else:
+            print(f"ok         {descricao} ({', '.join(sorted(estagios))})")
+
+    return falhas
+
+
+
+###########################################################################################################
+# VERIFICAÇÃO PELA LINHA DE COMANDO
+###########################################################################################################
+
+# Uso: python funcoes_indices.py
+# Cria os índices e falha (código de saída 1) se alguma consulta cair em COLLSCAN.
+if __name__ == "__main__":
+    from funcoes_auxiliares import conectar_mongo_ieb_selecao
+
+    db = conectar_mongo_ieb_selecao()
+    criar_indices(db)
+
+    falhas = verificar_indices(db)
+
+    if falhas:
+        print(f"\n{len(falhas)} consulta(s) sem índice.")
+        sys.exit(1)
+
+    print("\nTodas as consultas usam índices.")
@@ -0,0 +1,552 @@
+import re
+import streamlit as st
+import pandas as pd
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from funcoes_auxiliares import normalizar_texto, normalizar_email, termos_busca_pessoa, gerar_codigo_aleatorio
+from funcoes_email import enfileirar_emails_em_lote, corpo_email_convite, ASSUNTO_CONVITE
+from funcoes_distribuicao import redistribuir_pendentes
+
+
+###########################################################################################################
+# LISTA PAGINADA DE PESSOAS
+###########################################################################################################
+
+# Componente compartilhado pelas páginas pessoas_*.py. O filtro, a ordenação por nome e a paginação
+# ficam no MongoDB: cada página busca só "tamanho_pagina" documentos, com a projeção dos campos exibidos.
+# A página inteira é exibida num único st.data_editor (em vez de uma linha de st.columns por pessoa);
+# edições feitas direto na grade são gravadas juntas num único bulk_write.
+#
+# A busca usa o campo termos_busca (palavras do nome sem acento + e-mail), com índice multikey:
+# cada palavra digitada vira um regex ancorado "^palavra", que o MongoDB resolve como faixa do índice.
+#
+# A paginação é por chave (keyset): a página seguinte começa depois do último (nome_completo, _id)
+# da página atual, o que usa os índices {tipo_usuario|status, nome_completo, _id} sem skip().
+
+TAMANHO_PAGINA = 200
+
+ORDENACAO_PESSOAS = [("nome_completo", 1), ("_id", 1)]
+
+
+
+def filtro_apos(filtro: dict, apos) -> dict:
+    """
+    Acrescenta ao filtro a condição 'vem depois de (nome, _id)' da paginação por chave.
+    Pessoas sem nome (campo nulo ou ausente) vêm antes de todas na ordenação do MongoDB; como as
+    comparações $gt são restritas ao tipo do valor, a página que termina numa delas tem um filtro próprio.
+    """
+
+    if apos is None:
+        return filtro
+
+    nome, _id = apos
+
+    if nome is None:
+        depois = [
+            {"nome_completo": {"$ne": None}},
+            {"nome_completo": None, "_id": {"$gt": _id}},
+        ]
+    else:
+        depois = [
+            {"nome_completo": {"$gt": nome}},
+            {"nome_completo": nome, "_id": {"$gt": _id}},
+        ]
+
+    return {"$and": [filtro, {"$or": depois}]}
+
+
+
+def buscar_pagina_pessoas(colecao, filtro: dict, campos: list, tamanho: int = TAMANHO_PAGINA, apos=None):
+    """
+    Busca uma página de pessoas ordenada por nome.
+    Retorna (documentos, chave_da_proxima_pagina); a chave é None quando não há próxima página.
+    """
+
+    projecao = {campo: 1 for campo in campos}
+    projecao["nome_completo"] = 1
+
+    # Busca um a mais só para saber se existe próxima página
+    documentos = list(
+        colecao.find(filtro_apos(filtro, apos), projecao)
+        .sort(ORDENACAO_PESSOAS)
+        .limit(tamanho + 1)
+    )
+
+    if len(documentos) <= tamanho:
+        return documentos, None
+
+    documentos = documentos[:tamanho]
+    ultimo = documentos[-1]
+    return documentos, (ultimo.get("nome_completo"), ultimo["_id"])
+
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def contar_pessoas(_colecao, chave: str, filtro: dict) -> int:
+    """
+    Total de pessoas do filtro, em cache (compartilhado entre as sessões) para não contar a cada rerun.
+    "chave" separa as páginas do app. Toda gravação do app em pessoas chama limpar_contagens_pessoas;
+    o prazo de um minuto cobre as alterações feitas fora do app.
+    """
+
+    return _colecao.count_documents(filtro)
+
+
+
+def limpar_contagens_pessoas():
+    """Descarta os totais em cache depois de incluir, alterar ou inativar pessoas."""
+    contar_pessoas.clear()
+
+
+
+def filtro_busca(filtro: dict, termo: str) -> dict:
+    """Acrescenta ao filtro uma condição de prefixo em termos_busca para cada palavra buscada."""
+
+    palavras = normalizar_texto(termo).split()
+
+    if not palavras:
+        return filtro
+
+    return {"$and": [filtro] + [
+        {"termos_busca": {"$regex": f"^{re.escape(palavra)}"}}
+        for palavra in palavras
+    ]}
+
+
+
+def buscar_pessoas(colecao, termo: str, filtro: dict, campos: list, limite: int = 20):
+    """Retorna as primeiras pessoas (ordem alfabética) cujo nome ou e-mail começam com as palavras buscadas."""
+
+    projecao = {campo: 1 for campo in campos}
+    projecao["nome_completo"] = 1
+
+    return list(
+        colecao.find(filtro_busca(filtro, termo), projecao)
+        .sort(ORDENACAO_PESSOAS)
+        .limit(limite)
+    )
+
+
+
+def formatar_valor(valor) -> str:
+    """Converte o valor de um campo em texto para exibição (listas viram texto separado por vírgula)."""
+
+    if valor is None:
+        return ""
+    if isinstance(valor, list):
+        return ", ".join(str(v) for v in valor)
+    return str(valor).strip()
+
+
+
+def montar_grade(documentos: list, colunas: list):
+    """Monta o dataframe exibido na grade: índice = _id (texto), coluna "Selecionar" e os campos exibidos."""
+
+    grade = pd.DataFrame(
+        [{campo: formatar_valor(doc.get(campo)) for campo, _, _ in colunas} for doc in documentos],
+        columns=[c[0] for c in colunas],
+        index=[str(doc["_id"]) for doc in documentos],
+    )
+    grade.insert(0, "Selecionar", False)
+
+    return grade
+
+
+
+def alteracoes_da_grade(grade_editada: pd.DataFrame, grade_inicial: pd.DataFrame, editaveis: dict) -> dict:
+    """Compara a grade editada com a inicial e retorna {_id: {campo: novo_valor}} só com o que mudou."""
+
+    campos = [c for c in editaveis if c in grade_inicial.columns]
+
+    mudou = grade_editada[campos].ne(grade_inicial[campos])
+    linhas = mudou.any(axis=1)
+
+    return {
+        _id: {campo: grade_editada.at[_id, campo] for campo in campos if mudou.at[_id, campo]}
+        for _id in grade_editada.index[linhas]
+    }
+
+
+
+def salvar_alteracoes_grade(colecao, alteracoes: dict, grade: pd.DataFrame) -> list:
+    """
+    Grava todas as edições da grade num único bulk_write não ordenado.
+    Se o nome mudou, regrava também os termos de busca (o e-mail vem da própria grade).
+    Quem passou a "inativo" tem as atribuições pendentes redistribuídas; retorna o resumo da redistribuição.
+    """
+
+    operacoes = []
+
+    for _id, campos in alteracoes.items():
+        campos = dict(campos)
+        if "nome_completo" in campos and "e_mail" in grade.columns:
+            campos["termos_busca"] = termos_busca_pessoa(campos["nome_completo"], grade.at[_id, "e_mail"])
+
+        operacoes.append(UpdateOne({"_id": ObjectId(_id)}, {"$set": campos}))
+
+    if operacoes:
+        colecao.bulk_write(operacoes, ordered=False)
+        limpar_contagens_pessoas()
+
+    inativadas = [ObjectId(_id) for _id, campos in alteracoes.items() if campos.get("status") == "inativo"]
+
+    return redistribuir_pendentes(colecao.database, inativadas) if inativadas else []
+
+
+
+def aviso_email_duplicado(pessoa: dict):
+    """Avisa, no diálogo de edição, que o cadastro foi separado do login pela migração de e-mails duplicados."""
+
+    if pessoa.get("e_mail_duplicado_de"):
+        st.warning(
+            "O e-mail deste cadastro repete o de outra pessoa e por isso não é usado no login. "
+            "Informe um e-mail próprio para esta pessoa voltar a entrar no app.",
+            icon=":material/warning:"
+        )
+
+
+
+def atualizar_pessoa(colecao, pessoa: dict, campos: dict) -> str | None:
+    """
+    Grava a edição feita no diálogo de uma pessoa. Retorna a mensagem de erro, ou None se gravou.
+    Cadastro marcado como duplicado (e_mail_duplicado_de) continua sem e_mail_normalizado enquanto o
+    e-mail não mudar, para não esbarrar no índice único; com um e-mail novo, a marcação é retirada.
+    """
+
+    atualizacao = {"$set": dict(campos)}
+
+    if pessoa.get("e_mail_duplicado_de"):
+        if campos["e_mail_normalizado"] == normalizar_email(pessoa.get("e_mail", "")):
+            atualizacao["$set"].pop("e_mail_normalizado")
+        else:
+            atualizacao["$unset"] = {"e_mail_duplicado_de": ""}
+
+    try:
+        colecao.update_one({"_id": pessoa["_id"]}, atualizacao)
+    except DuplicateKeyError:
+        return "Já existe outra pessoa cadastrada com esse e-mail."
+
+    limpar_contagens_pessoas()
+    return None
+
+
+
+def registrar_redistribuicao(chave: str, resumo: list) -> str:
+    """
+    Guarda o resumo da redistribuição para a lista exibir depois do rerun.
+    Retorna o texto a acrescentar à mensagem de sucesso (vazio se nada foi redistribuído).
+    """
+
+    if not resumo:
+        return ""
+
+    st.session_state[f"{chave}_redistribuicao"] = resumo
+
+    movidas = sum(1 for linha in resumo if linha["para"])
+    mensagem = f" {movidas} atribuição(ões) pendente(s) redistribuída(s)"
+    if movidas < len(resumo):
+        mensagem += f"; {len(resumo) - movidas} sem avaliador(a) disponível"
+
+    return mensagem + "."
+
+
+
+###########################################################################################################
+# AÇÕES EM MASSA
+###########################################################################################################
+
+# Cada ação sobre as pessoas selecionadas é uma única operação no banco (update_many com $in
+# ou um bulk_write), seguida de um único rerun.
+
+
+def inativar_pessoas(colecao, ids: list) -> tuple:
+    """
+    Marca as pessoas como inativas e redistribui as atribuições pendentes de quem foi inativado agora.
+    Retorna (quantas foram alteradas, resumo da redistribuição).
+    """
+
+    inativadas = [
+        p["_id"]
+        for p in colecao.find(
+            {"_id": {"$in": [ObjectId(i) for i in ids]}, "status": {"$ne": "inativo"}},
+            {"_id": 1}
+        )
+    ]
+
+    if not inativadas:
+        return 0, []
+
+    resultado = colecao.update_many(
+        {"_id": {"$in": inativadas}},
+        {"$set": {"status": "inativo"}}
+    )
+    limpar_contagens_pessoas()
+    return resultado.modified_count, redistribuir_pendentes(colecao.database, inativadas)
+
+
+
+def alterar_tipo_pessoas(colecao, ids: list, tipo_usuario: str) -> int:
+    """Altera o tipo de usuário das pessoas. Retorna quantas foram alteradas."""
+
+    resultado = colecao.update_many(
+        {"_id": {"$in": [ObjectId(i) for i in ids]}},
+        {"$set": {"tipo_usuario": tipo_usuario}}
+    )
+    limpar_contagens_pessoas()
+    return resultado.modified_count
+
+
+
+def reenviar_convites(colecao, ids: list) -> int:
+    """
+    Gera um código novo para cada pessoa selecionada que ainda está como 'convidado'
+    (um bulk_write) e enfileira os e-mails de convite num único lote. Retorna quantos convites foram reenviados.
+    """
+
+    convidados = list(colecao.find(
+        {"_id": {"$in": [ObjectId(i) for i in ids]}, "status": "convidado"},
+        {"nome_completo": 1, "e_mail": 1}
+    ))
+
+    if not convidados:
+        return 0
+
+    codigos = [gerar_codigo_aleatorio() for _ in convidados]
+
+    colecao.bulk_write(
+        [
+            UpdateOne({"_id": pessoa["_id"], "status": "convidado"}, {"$set": {"codigo_convite": codigo}})
+            for pessoa, codigo in zip(convidados, codigos)
+        ],
+        ordered=False
+    )
+
+    enfileirar_emails_em_lote([
+        {
+            "corpo_html": corpo_email_convite(pessoa.get("nome_completo", ""), codigo),
+            "destinatarios": [pessoa["e_mail"]],
+            "assunto": ASSUNTO_CONVITE,
+        }
+        for pessoa, codigo in zip(convidados, codigos)
+    ])
+
+    return len(convidados)
+
+
+
+def acoes_em_massa(chave: str, colecao, selecionados: list, acoes: list, tipos_usuario: list):
+    """
+    Botões das ações em massa sobre as linhas selecionadas.
+    acoes -> subconjunto de ["inativar", "alterar_tipo", "reenviar_convite"]
+    Retorna a mensagem de resultado se alguma ação foi executada, senão None.
+    """
+
+    qtd = len(selecionados)
+
+    if "inativar" in acoes:
+        if st.button(
+            f"Inativar ({qtd})",
+            icon=":material/person_off:",
+            key=f"{chave}_inativar",
+            disabled=qtd == 0
+        ):
+            quantidade, resumo = inativar_pessoas(colecao, selecionados)
+            return f"{quantidade} pessoas inativadas." + registrar_redistribuicao(chave, resumo)
+
+    if "alterar_tipo" in acoes:
+        with st.popover(f"Alterar tipo ({qtd})", icon=":material/manage_accounts:", disabled=qtd == 0):
+            novo_tipo = st.selectbox("Novo tipo de usuário", tipos_usuario, key=f"{chave}_novo_tipo")
+
+            if st.button("Aplicar", type="primary", key=f"{chave}_aplicar_tipo"):
+                return f"{alterar_tipo_pessoas(colecao, selecionados, novo_tipo)} pessoas alteradas para '{novo_tipo}'."
+
+    if "reenviar_convite" in acoes:
+        if st.button(
+            f"Reenviar convite ({qtd})",
+            icon=":material/forward_to_inbox:",
+            key=f"{chave}_reenviar",
+            disabled=qtd == 0
+        ):
+            return f"{reenviar_convites(colecao, selecionados)} convites reenviados."
+
+    return None
+
+
+
+###########################################################################################################
+# COMPONENTE
+###########################################################################################################
+
+
+def lista_pessoas(
+    chave: str,
+    colecao,
+    filtro: dict,
+    colunas: list,
+    ao_editar,
+    editaveis: dict | None = None,
+    acoes: list | None = None,
+    tamanho_pagina: int = TAMANHO_PAGINA
+):
+    """
+    Renderiza uma página da lista de pessoas numa única grade (st.data_editor) com navegação.
+
+    chave      -> prefixo das chaves de session_state (uma por página do app)
+    filtro     -> filtro do MongoDB (ex.: {"tipo_usuario": "avaliador"})
+    colunas    -> lista de (campo, rótulo, largura) exibidos
+    ao_editar  -> diálogo de edição, chamado com o _id (str) da linha selecionada
+    editaveis  -> {campo: opções} editáveis direto na grade; opções None = texto livre
+    acoes      -> ações em massa disponíveis (ver acoes_em_massa)
+    """
+
+    editaveis = editaveis or {}
+    acoes = acoes or []
+
+    # Resultado da última ação em massa (exibido depois do rerun)
+    chave_mensagem = f"{chave}_mensagem"
+    if chave_mensagem in st.session_state:
+        st.success(st.session_state.pop(chave_mensagem), icon=":material/check:")
+
+    # Atribuições movidas ao inativar avaliadores(as) (exibidas uma vez, depois do rerun)
+    chave_redistribuicao = f"{chave}_redistribuicao"
+    if chave_redistribuicao in st.session_state:
+        with st.expander("Atribuições redistribuídas", expanded=True, icon=":material/swap_horiz:"):
+            st.dataframe(
+                pd.DataFrame(st.session_state.pop(chave_redistribuicao))
+                .fillna({"para": "sem avaliador(a) disponível"})
+                .rename(columns={
+                    "codigo_edital": "Edital",
+                    "nome_estagio": "Estágio",
+                    "codigo_recebimento": "Projeto",
+                    "de": "De",
+                    "para": "Para",
+                }),
+                hide_index=True
+            )
+
+    # Pilha com a chave de início de cada página visitada (None = primeira página)
+    chave_paginas = f"{chave}_paginas"
+    if chave_paginas not in st.session_state:
+        st.session_state[chave_paginas] = [None]
+
+    # Versão da grade: muda depois de salvar para descartar as edições já gravadas
+    chave_versao = f"{chave}_versao"
+    st.session_state.setdefault(chave_versao, 0)
+
+    paginas = st.session_state[chave_paginas]
+
+    termo = st.text_input(
+        "Buscar por nome ou e-mail",
+        key=f"{chave}_busca",
+        icon=":material/search:",
+        width=400
+    ).strip()
+
+    if termo:
+        # Busca: só os primeiros resultados, sem paginação
+        documentos = buscar_pessoas(colecao, termo, filtro, [c[0] for c in colunas], limite=tamanho_pagina)
+        proxima = None
+        st.caption(f"{len(documentos)} resultados")
+    else:
+        documentos, proxima = buscar_pagina_pessoas(
+            colecao, filtro, [c[0] for c in colunas], tamanho_pagina, apos=paginas[-1]
+        )
+        st.caption(f"{contar_pessoas(colecao, chave, filtro)} pessoas")
+
+    grade = montar_grade(documentos, colunas)
+
+    # Configuração das colunas: só os campos de "editaveis" podem ser alterados
+    config_colunas = {"Selecionar": st.column_config.CheckboxColumn("", width="small")}
+
+    for campo, rotulo, largura in colunas:
+        largura_coluna = "large" if largura >= 4 else "medium"
+
+        if campo in editaveis and editaveis[campo] is not None:
+            # Inclui valores atuais fora da lista de opções para não apagá-los na exibição
+            opcoes = list(dict.fromkeys(list(editaveis[campo]) + grade[campo].unique().tolist()))
+            config_colunas[campo] = st.column_config.SelectboxColumn(rotulo, options=opcoes, width=largura_coluna)
+        else:
+            config_colunas[campo] = st.column_config.TextColumn(
+                rotulo, width=largura_coluna, disabled=campo not in editaveis
+            )
+
+    grade_editada = st.data_editor(
+        grade,
+        column_config=config_colunas,
+        hide_index=True,
+        width="stretch",
+        num_rows="fixed",
+        key=f"{chave}_grade_{len(paginas)}_{st.session_state[chave_versao]}_{termo}"
+    )
+
+    selecionados = grade_editada.index[grade_editada["Selecionar"]].tolist()
+    alteracoes = alteracoes_da_grade(grade_editada, grade, editaveis)
+
+    # AÇÕES -----------------
+    with st.container(horizontal=True):
+
+        if st.button(
+            "Editar selecionado(a)",
+            icon=":material/edit:",
+            key=f"{chave}_editar",
+            disabled=len(selecionados) != 1
+        ):
+            ao_editar(selecionados[0])
+
+        if st.button(
+            f"Salvar alterações ({len(alteracoes)})",
+            icon=":material/save:",
+            type="primary",
+            key=f"{chave}_salvar",
+            disabled=not alteracoes
+        ):
+            if any("nome_completo" in campos and not str(campos["nome_completo"]).strip() for campos in alteracoes.values()):
+                st.error("O nome não pode ficar vazio.")
+            else:
+                resumo = salvar_alteracoes_grade(colecao, alteracoes, grade)
+                st.session_state[chave_versao] += 1
+                st.session_state[chave_mensagem] = (
+                    f"{len(alteracoes)} pessoas atualizadas." + registrar_redistribuicao(chave, resumo)
+                )
+                st.rerun()
+
+        if acoes:
+            mensagem = acoes_em_massa(
+                chave, colecao, selecionados, acoes,
+                editaveis.get("tipo_usuario") or ["admin", "equipe", "avaliador", "visitante"]
+            )
+
+            if mensagem:
+                # Limpa a seleção e recarrega uma única vez
+                st.session_state[chave_versao] += 1
+                st.session_state[chave_mensagem] = mensagem
+                st.rerun()
+
+    # NAVEGAÇÃO -----------------
+    if termo:
+        return
+
+    st.write('')
+
+    with st.container(horizontal=True, horizontal_alignment="center"):
+
+        if st.button(
+            "Anterior",
+            icon=":material/chevron_left:",
+            key=f"{chave}_anterior",
+            disabled=len(paginas) == 1
+        ):
+            paginas.pop()
+            st.rerun()
+
+        st.write(f"Página {len(paginas)}")
+
+        if st.button(
+            "Próxima",
+            icon=":material/chevron_right:",
+            key=f"{chave}_proxima",
+            disabled=proxima is None
+        ):
+            paginas.append(proxima)
+            st.rerun()
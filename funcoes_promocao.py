@@ -0,0 +1,137 @@
+from pymongo import UpdateOne
+from funcoes_auxiliares import executar_em_transacao
+from funcoes_atribuicoes import operacao_adicionar_estagio, operacao_atribuir
+
+
+###########################################################################################################
+# PROMOÇÃO DE PROJETOS PARA O PRÓXIMO ESTÁGIO
+###########################################################################################################
+
+# Os projetos selecionados no ranking de um estágio (os N primeiros ou os com média mínima) passam a ser
+# habilitados no estágio seguinte: o id_estagio seguinte entra em projetos.estagios_habilitados.
+# Opcionalmente, os avaliadores que tinham esses projetos recebem as mesmas atribuições no estágio seguinte
+# (só os que continuam ativos; os inativos aparecem no resumo).
+#
+# A operação é planejada primeiro (pré-visualização, sem gravar nada) e depois executada com um bulk_write
+# por coleção, dentro de uma transação quando o servidor permite.
+
+
+
+def proximo_estagio(edital: dict, id_estagio: str):
+    """Estágio com a menor ordem_estagio maior que a do estágio informado (None se for o último)."""
+
+    estagios = sorted(edital.get("estagios", []), key=lambda e: e.get("ordem_estagio", 999))
+    atual = next(e for e in estagios if e["id_estagio"] == id_estagio)
+
+    return next((e for e in estagios if e["ordem_estagio"] > atual["ordem_estagio"]), None)
+
+
+
+def selecionar_para_promocao(ranking: list, top_n: int | None = None, media_minima: float | None = None) -> list:
+    """
+    Códigos dos projetos do ranking (já ordenado pela média) que serão promovidos:
+    os top_n primeiros ou os com média maior ou igual a media_minima.
+    """
+
+    if top_n is not None:
+        return [linha["codigo_recebimento"] for linha in ranking[:top_n]]
+
+    return [linha["codigo_recebimento"] for linha in ranking if linha["media"] >= media_minima]
+
+
+
+def planejar_promocao(db, codigo_edital: str, id_estagio: str, proximo: dict, codigos: list, levar_avaliadores: bool) -> dict:
+    """
+    Monta as operações da promoção sem gravar nada (pré-visualização).
+    Retorna {"projetos": [operações], "pessoas": [operações], "atribuicoes": [operações], "resumo": {...}}.
+    """
+
+    id_proximo = proximo["id_estagio"]
+
+    ja_habilitados = {
+        p["codigo_recebimento"]
+        for p in db["projetos"].find(
+            {"codigo_edital": codigo_edital, "codigo_recebimento": {"$in": codigos}, "estagios_habilitados": id_proximo},
+            {"codigo_recebimento": 1}
+        )
+    }
+    novos = [c for c in codigos if c not in ja_habilitados]
+
+    operacoes_projetos = [
+        UpdateOne(
+            {"codigo_edital": codigo_edital, "codigo_recebimento": codigo},
+            {"$addToSet": {"estagios_habilitados": id_proximo}}
+        )
+        for codigo in novos
+    ]
+
+    operacoes_pessoas = []
+    operacoes_atribuicoes = []
+    inativos = []
+
+    if levar_avaliadores:
+        # Atribuições dos projetos promovidos no estágio atual (consulta indexada)
+        avaliadores = {}
+        for a in db["atribuicoes"].find(
+            {"codigo_edital": codigo_edital, "id_estagio": id_estagio, "codigo_recebimento": {"$in": codigos}},
+            {"_id": 0, "id_avaliador": 1, "codigo_recebimento": 1}
+        ):
+            avaliadores.setdefault(a["id_avaliador"], []).append(a["codigo_recebimento"])
+
+        # Só quem continua ativo vai para o estágio seguinte (uma consulta para todos)
+        ativos = {
+            p["_id"]
+            for p in db["pessoas"].find(
+                {"_id": {"$in": list(avaliadores)}, "status": "ativo"},
+                {"_id": 1}
+            )
+        }
+        inativos = [id_avaliador for id_avaliador in avaliadores if id_avaliador not in ativos]
+
+        for id_avaliador, projetos in avaliadores.items():
+            if id_avaliador not in ativos:
+                continue
+
+            # Garante o vínculo da pessoa com o estágio seguinte e repete as atribuições nele
+            operacoes_pessoas.append(operacao_adicionar_estagio(id_avaliador, codigo_edital, proximo))
+            operacoes_atribuicoes += [
+                operacao_atribuir(codigo_edital, id_proximo, id_avaliador, codigo)
+                for codigo in projetos
+            ]
+
+    return {
+        "projetos": operacoes_projetos,
+        "pessoas": operacoes_pessoas,
+        "atribuicoes": operacoes_atribuicoes,
+        "resumo": {
+            "selecionados": len(codigos),
+            "novos": novos,
+            "ja_habilitados": sorted(ja_habilitados),
+            "avaliadores": len(operacoes_pessoas),
+            "atribuicoes": len(operacoes_atribuicoes),
+            "avaliadores_inativos": inativos,
+        },
+    }
+
+
+
+def executar_promocao(db, plano: dict) -> dict:
+    """Executa as operações planejadas (um bulk_write por coleção, numa transação quando possível)."""
+
+    def gravar(sessao):
+        projetos = pessoas = atribuicoes = 0
+
+        if plano["projetos"]:
+            projetos = db["projetos"].bulk_write(plano["projetos"], ordered=False, session=sessao).modified_count
+
+        if plano["pessoas"]:
+            pessoas = db["pessoas"].bulk_write(plano["pessoas"], ordered=False, session=sessao).modified_count
+
+        if plano["atribuicoes"]:
+            atribuicoes = db["atribuicoes"].bulk_write(
+                plano["atribuicoes"], ordered=False, session=sessao
+            ).upserted_count
+
+        return {"projetos": projetos, "pessoas": pessoas, "atribuicoes": atribuicoes}
+
+    return executar_em_transacao(db, gravar)
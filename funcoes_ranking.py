@@ -0,0 +1,178 @@
+import datetime
+from pymongo.errors import OperationFailure
+from funcoes_avaliacoes import STATUS_ENVIADA
+
+
+###########################################################################################################
+# RANKING DOS ESTÁGIOS
+###########################################################################################################
+
+# Nota de cada avaliação = média ponderada das respostas às perguntas "numero" do estágio
+# (peso definido no editor do estágio; padrão 1). As notas das avaliações enviadas são agregadas
+# por projeto (média, mediana, desvio, mínimo, máximo e número de avaliadores) num pipeline do
+# MongoDB e gravadas com $merge na coleção "rankings", uma linha por (edital, estágio, projeto).
+#
+# A cada avaliação enviada só a linha do projeto é recalculada. A página de ranking lê as linhas
+# prontas. O recálculo completo do estágio fica para quando os pesos ou as perguntas mudam.
+#
+# A mediana usa o acumulador $median (MongoDB 7.0 ou superior). Em servidores mais antigos o pipeline
+# é refeito sem ela (mediana nula) e o servidor fica marcado como sem $median até o app reiniciar.
+
+# Passa a False na primeira vez que o servidor recusar o $median
+_mediana_disponivel = True
+
+
+
+def _agora() -> datetime.datetime:
+    """Data e hora atuais na precisão do BSON (milissegundos), para comparar com o que foi gravado."""
+
+    agora = datetime.datetime.now()
+    return agora.replace(microsecond=agora.microsecond // 1000 * 1000)
+
+
+
+def pesos_estagio(perguntas: list) -> dict:
+    """Pesos das perguntas numéricas do estágio: {id_pergunta: peso}."""
+
+    return {
+        p["id_pergunta"]: float(p.get("peso", 1))
+        for p in perguntas
+        if p["tipo"] == "numero" and float(p.get("peso", 1)) > 0
+    }
+
+
+
+def expressao_nota(pesos: dict) -> dict:
+    """
+    Expressão de agregação da nota ponderada de uma avaliação.
+    Perguntas sem resposta numérica ficam fora da soma e do total de pesos.
+    """
+
+    termos = []
+    pesos_respondidos = []
+
+    for id_pergunta, peso in pesos.items():
+        resposta = f"$respostas.{id_pergunta}"
+        respondida = {"$isNumber": resposta}
+        termos.append({"$cond": [respondida, {"$multiply": [resposta, peso]}, 0]})
+        pesos_respondidos.append({"$cond": [respondida, peso, 0]})
+
+    if not termos:
+        return {"$literal": None}
+
+    return {"$let": {
+        "vars": {"soma": {"$add": termos}, "total_pesos": {"$add": pesos_respondidos}},
+        "in": {"$cond": [
+            {"$gt": ["$$total_pesos", 0]},
+            {"$divide": ["$$soma", "$$total_pesos"]},
+            None
+        ]}
+    }}
+
+
+
+def _pipeline_ranking(filtro: dict, pesos: dict, atualizado_em, com_mediana: bool = True) -> list:
+    """Pipeline que agrega as avaliações enviadas do filtro e grava as linhas em "rankings"."""
+
+    mediana = {"$median": {"input": "$nota", "method": "approximate"}} if com_mediana else {"$max": None}
+
+    return [
+        {"$match": {**filtro, "status": STATUS_ENVIADA}},
+        {"$project": {
+            "codigo_edital": 1,
+            "id_estagio": 1,
+            "codigo_recebimento": 1,
+            "nota": expressao_nota(pesos),
+        }},
+        # Avaliação sem nenhuma resposta numérica não entra no ranking
+        {"$match": {"nota": {"$ne": None}}},
+        {"$group": {
+            "_id": {
+                "codigo_edital": "$codigo_edital",
+                "id_estagio": "$id_estagio",
+                "codigo_recebimento": "$codigo_recebimento",
+            },
+            "media": {"$avg": "$nota"},
+            "mediana": mediana,
+            "desvio": {"$stdDevPop": "$nota"},
+            "minimo": {"$min": "$nota"},
+            "maximo": {"$max": "$nota"},
+            "avaliadores": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": 0,
+            "codigo_edital": "$_id.codigo_edital",
+            "id_estagio": "$_id.id_estagio",
+            "codigo_recebimento": "$_id.codigo_recebimento",
+            "media": 1,
+            "mediana": 1,
+            "desvio": 1,
+            "minimo": 1,
+            "maximo": 1,
+            "avaliadores": 1,
+            "atualizado_em": {"$literal": atualizado_em},
+        }},
+        {"$merge": {
+            "into": "rankings",
+            "on": ["codigo_edital", "id_estagio", "codigo_recebimento"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+
+
+def _agregar_ranking(db, filtro: dict, pesos: dict, atualizado_em, **opcoes):
+    """Roda o pipeline do ranking; sem suporte a $median no servidor, roda de novo sem a mediana."""
+
+    global _mediana_disponivel
+
+    if _mediana_disponivel:
+        try:
+            db["avaliacoes"].aggregate(_pipeline_ranking(filtro, pesos, atualizado_em), **opcoes)
+            return
+        except OperationFailure as e:
+            if "$median" not in str(e):
+                raise
+            print(f"Servidor sem $median, ranking calculado sem a mediana: {e}")
+            _mediana_disponivel = False
+
+    db["avaliacoes"].aggregate(_pipeline_ranking(filtro, pesos, atualizado_em, com_mediana=False), **opcoes)
+
+
+
+def atualizar_ranking_projeto(db, codigo_edital: str, id_estagio: str, perguntas: list, codigo_recebimento: str):
+    """Recalcula só a linha do ranking de um projeto (chamada a cada avaliação enviada)."""
+
+    filtro = {"codigo_edital": codigo_edital, "id_estagio": id_estagio, "codigo_recebimento": codigo_recebimento}
+    inicio = _agora()
+
+    _agregar_ranking(db, filtro, pesos_estagio(perguntas), inicio)
+
+    # Projeto sem nenhuma nota válida: a linha antiga (se houver) sai do ranking
+    db["rankings"].delete_one({**filtro, "atualizado_em": {"$lt": inicio}})
+
+
+
+def recalcular_ranking_estagio(db, codigo_edital: str, id_estagio: str, perguntas: list):
+    """
+    Recalcula o ranking inteiro do estágio (ex.: depois de mudar pesos ou perguntas).
+    As linhas são substituídas no lugar; as que não foram regravadas são removidas no final.
+    """
+
+    filtro = {"codigo_edital": codigo_edital, "id_estagio": id_estagio}
+    inicio = _agora()
+
+    _agregar_ranking(db, filtro, pesos_estagio(perguntas), inicio, allowDiskUse=True)
+
+    db["rankings"].delete_many({**filtro, "atualizado_em": {"$lt": inicio}})
+
+
+
+def ler_ranking(db, codigo_edital: str, id_estagio: str) -> list:
+    """Linhas do ranking do estágio, da maior para a menor média."""
+
+    return list(db["rankings"].find(
+        {"codigo_edital": codigo_edital, "id_estagio": id_estagio},
+        {"_id": 0}
+    ).sort([("media", -1), ("codigo_recebimento", 1)]))
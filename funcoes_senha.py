@@ -0,0 +1,253 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import streamlit as st
+
+from funcoes_auxiliares import ler_configuracao
+
+
+###########################################################################################################
+# POOL DE HASH DE SENHAS
+###########################################################################################################
+
+# O bcrypt é caro de propósito e libera o GIL enquanto calcula. Rodando num pool de threads limitado,
+# uma rajada de logins ocupa no máximo "bcrypt_max_paralelo" núcleos e o resto fica numa fila curta,
+# em vez de cada sessão do Streamlit disputar CPU com todas as outras.
+#
+# Parâmetros opcionais em [configuracoes] no secrets.toml:
+#   bcrypt_custo         -> custo (log2 de rodadas) dos hashes novos. Padrão 12.
+#   bcrypt_max_paralelo  -> hashes calculados ao mesmo tempo. Padrão: número de CPUs.
+#   bcrypt_max_fila      -> pedidos aguardando além dos que estão em execução. Padrão 64.
+#   bcrypt_timeout       -> segundos que um pedido espera por vaga antes de desistir. Padrão 10.
+#   bcrypt_alerta_espera -> segundos de espera (por vaga + na fila) a partir dos quais o pool é
+#                           considerado saturado. Padrão 2.
+#
+# Saturação em produção: quando um pedido espera mais que bcrypt_alerta_espera ou é recusado, as
+# métricas do pool (fila, execução, recusados, p50/p95) vão para o log do app, no máximo uma vez a
+# cada INTERVALO_ALERTA segundos, para uma rajada não inundar o log.
+
+INTERVALO_ALERTA = 60
+
+
+class PoolSenhasOcupado(RuntimeError):
+    """Levantada quando a fila do pool de senhas está cheia por mais tempo que o timeout."""
+
+
+
+@st.cache_resource
+def _pool_senhas():
+    """Cria, uma vez por processo, o executor e os contadores do pool de senhas."""
+
+    max_paralelo = int(ler_configuracao("bcrypt_max_paralelo", os.cpu_count() or 2))
+    max_fila = int(ler_configuracao("bcrypt_max_fila", 64))
+
+    return {
+        "executor": ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix="bcrypt"),
+        "vagas": threading.BoundedSemaphore(max_paralelo + max_fila),
+        "trava": threading.Lock(),
+        "max_paralelo": max_paralelo,
+        "max_fila": max_fila,
+        "em_fila": 0,
+        "em_execucao": 0,
+        "concluidos": 0,
+        "recusados": 0,
+        "latencias": deque(maxlen=1000),
+        "ultimo_alerta": 0.0,
+    }
+
+
+
+def _alertar_saturacao(pool: dict, motivo: str):
+    """
+    Registra no log as métricas do pool, respeitando o intervalo mínimo entre alertas.
+    Recebe o pool pronto porque também roda nas threads do executor.
+    """
+
+    agora = time.monotonic()
+
+    with pool["trava"]:
+        if agora - pool["ultimo_alerta"] < INTERVALO_ALERTA:
+            return
+        pool["ultimo_alerta"] = agora
+
+    print(f"Pool de senhas saturado ({motivo}): {_metricas(pool)}")
+
+
+
+def _enviar_ao_pool(funcao, *args, esperar=True):
+    """
+    Coloca uma tarefa no pool respeitando o limite de fila e devolve o Future.
+    Com esperar=False, desiste na hora se não houver vaga.
+    Atualiza os contadores de fila, execução e latência.
+    """
+
+    pool = _pool_senhas()
+    chegada = time.perf_counter()
+    limite_espera = float(ler_configuracao("bcrypt_alerta_espera", 2))
+
+    if esperar:
+        conseguiu_vaga = pool["vagas"].acquire(timeout=float(ler_configuracao("bcrypt_timeout", 10)))
+    else:
+        conseguiu_vaga = pool["vagas"].acquire(blocking=False)
+
+    if not conseguiu_vaga:
+        with pool["trava"]:
+            pool["recusados"] += 1
+        if esperar:
+            _alertar_saturacao(pool, "pedido recusado depois do timeout")
+        raise PoolSenhasOcupado("Muitos pedidos de senha simultâneos.")
+
+    inicio = time.perf_counter()
+
+    with pool["trava"]:
+        pool["em_fila"] += 1
+
+    def tarefa():
+        with pool["trava"]:
+            pool["em_fila"] -= 1
+            pool["em_execucao"] += 1
+
+        espera = time.perf_counter() - chegada
+        if espera > limite_espera:
+            _alertar_saturacao(pool, f"espera de {espera:.1f}s")
+
+        try:
+            return funcao(*args)
+        finally:
+            with pool["trava"]:
+                pool["em_execucao"] -= 1
+                pool["concluidos"] += 1
+                pool["latencias"].append(time.perf_counter() - inicio)
+            pool["vagas"].release()
+
+    return pool["executor"].submit(tarefa)
+
+
+
+def metricas_pool_senhas() -> dict:
+    """Retorna um retrato dos contadores do pool (fila, execução, p50/p95 de latência em ms)."""
+    return _metricas(_pool_senhas())
+
+
+
+def _metricas(pool: dict) -> dict:
+    """Contadores e latências do pool informado (ver metricas_pool_senhas)."""
+
+    with pool["trava"]:
+        latencias = sorted(pool["latencias"])
+        metricas = {
+            "max_paralelo": pool["max_paralelo"],
+            "max_fila": pool["max_fila"],
+            "em_fila": pool["em_fila"],
+            "em_execucao": pool["em_execucao"],
+            "concluidos": pool["concluidos"],
+            "recusados": pool["recusados"],
+        }
+
+    if latencias:
+        metricas["p50_ms"] = round(latencias[len(latencias) // 2] * 1000, 1)
+        metricas["p95_ms"] = round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000, 1)
+
+    return metricas
+
+
+
+###########################################################################################################
+# FUNÇÕES DE SENHA
+###########################################################################################################
+
+
+def custo_configurado() -> int:
+    """Custo bcrypt usado nos hashes novos."""
+    return int(ler_configuracao("bcrypt_custo", 12))
+
+
+
+def gerar_hash_senha(senha: str) -> bytes:
+    """Gera o hash bcrypt da senha no pool, com o custo configurado."""
+
+    custo = custo_configurado()
+    futuro = _enviar_ao_pool(
+        lambda: bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt(rounds=custo))
+    )
+    return futuro.result()
+
+
+
+def verificar_senha(senha: str, senha_hash) -> bool:
+    """
+    Confere a senha contra o hash no pool.
+    Só aceita hashes válidos (bytes); qualquer outro valor é tratado como senha inválida.
+    """
+
+    if not isinstance(senha_hash, bytes):
+        return False
+
+    futuro = _enviar_ao_pool(bcrypt.checkpw, senha.encode("utf-8"), senha_hash)
+
+    try:
+        return futuro.result()
+    except ValueError:
+        # Hash corrompido ou em formato desconhecido
+        return False
+
+
+
+def precisa_rehash(senha_hash: bytes) -> bool:
+    """Indica se o hash foi gerado com um custo diferente do configurado (formato $2b$<custo>$...)."""
+
+    try:
+        return int(senha_hash.split(b"$")[2]) != custo_configurado()
+    except (IndexError, ValueError):
+        return False
+
+
+
+def rehash_em_segundo_plano(colecao_pessoas, id_pessoa, senha: str, hash_antigo: bytes):
+    """
+    Recalcula o hash com o custo atual sem bloquear o login.
+    Só grava se o hash no banco ainda for o antigo (não sobrescreve uma troca de senha feita nesse meio-tempo).
+    """
+
+    custo = custo_configurado()
+
+    def regravar():
+        novo_hash = bcrypt.hashpw(senha.encode("utf-8"), bcrypt.gensalt(rounds=custo))
+        colecao_pessoas.update_one(
+            {"_id": id_pessoa, "senha": hash_antigo},
+            {"$set": {"senha": novo_hash}}
+        )
+
+    try:
+        _enviar_ao_pool(regravar, esperar=False)
+    except PoolSenhasOcupado:
+        # Sem vaga agora: o rehash fica para o próximo login
+        pass
+
+
+
+###########################################################################################################
+# TESTE DE CARGA PELA LINHA DE COMANDO
+###########################################################################################################
+
+# Uso: python funcoes_senha.py [logins_simultaneos] [total_de_logins]
+# Simula uma rajada de logins e mostra as métricas do pool (p50/p95 devem ficar estáveis com a carga).
+if __name__ == "__main__":
+    import sys
+
+    simultaneos = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    hash_teste = bcrypt.hashpw(b"senha123", bcrypt.gensalt(rounds=custo_configurado()))
+
+    with ThreadPoolExecutor(max_workers=simultaneos) as sessoes:
+        inicio = time.perf_counter()
+        resultados = list(sessoes.map(lambda _: verificar_senha("senha123", hash_teste), range(total)))
+        duracao = time.perf_counter() - inicio
+
+    print(f"{total} logins ({simultaneos} simultâneos) em {duracao:.2f}s, todos válidos: {all(resultados)}")
+    print(metricas_pool_senhas())
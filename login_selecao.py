@@ -2,10 +2,12 @@ import streamlit as st
 # from pymongo import MongoClient  
 import time 
 import random  
-import smtplib  
-from email.mime.text import MIMEText  
-from funcoes_auxiliares import conectar_mongo_ieb_selecao  # Função personalizada para conectar ao MongoDB
-import bcrypt
+from funcoes_auxiliares import conectar_mongo_ieb_selecao, normalizar_email  # Funções personalizadas
+from funcoes_email import enfileirar_email, iniciar_worker_email
+from funcoes_lista_pessoas import limpar_contagens_pessoas
+from funcoes_senha import (
+    gerar_hash_senha, verificar_senha, precisa_rehash, rehash_em_segundo_plano, PoolSenhasOcupado
+)
 
 
 # Configurar o streamlit para tela wide
@@ -23,6 +25,9 @@ db = conectar_mongo_ieb_selecao()
 # Define a coleção a ser utilizada
 col_pessoas = db["pessoas"]
 
+# Garante o worker que envia os e-mails da caixa de saída (um por processo)
+iniciar_worker_email()
+
 
 ##############################################################################################################
 # FUNÇÕES AUXILIARES
@@ -39,7 +44,8 @@ def validar_senha(senha: str) -> bool:
 
 
 def encontrar_usuario_por_email(pessoas, email_busca):
-    usuario = pessoas.find_one({"e_mail": email_busca})
+    # Busca pontual no índice de e-mail normalizado
+    usuario = pessoas.find_one({"e_mail_normalizado": normalizar_email(email_busca)})
     if usuario:
         return usuario.get("nome_completo"), usuario  # Retorna o nome e os dados do usuário
     return None, None  # Caso não encontre
@@ -47,9 +53,7 @@ def encontrar_usuario_por_email(pessoas, email_busca):
 
 # Função para enviar um e_mail com código de verificação
 def enviar_email(destinatario, codigo):
-    # Dados de autenticação, retirados do arquivo secrets.toml
-    remetente = st.secrets["senhas"]["endereco_email"]
-    senha = st.secrets["senhas"]["senha_email"]
+    """Coloca o e-mail com o código na caixa de saída. O envio é feito em segundo plano."""
 
     # Conteúdo do e_mail
     assunto = f"Código de Verificação - IEB Seleção: {codigo}"
@@ -63,17 +67,8 @@ def enviar_email(destinatario, codigo):
     </html>
     """
 
-    # Cria o e_mail formatado com HTML
-    msg = MIMEText(corpo, "html", "utf-8")
-    msg["Subject"] = assunto
-    msg["From"] = remetente
-    msg["To"] = destinatario
-
-    # Tenta enviar o e_mail via SMTP seguro (SSL)
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(remetente, senha)
-            server.sendmail(remetente, destinatario, msg.as_string())
+        enfileirar_email(corpo, [destinatario], assunto)
         return True
     except Exception as e:
         st.error(f"Erro ao enviar e-mail: {e}")
@@ -102,7 +97,7 @@ def primeiro_acesso_dialog():
             enviar_codigo = st.form_submit_button("Confirmar")
 
             if enviar_codigo:
-                usuario = col_pessoas.find_one({"e_mail": email_input})
+                usuario = col_pessoas.find_one({"e_mail_normalizado": normalizar_email(email_input)})
                 if not usuario:
                     st.error("Usuário não encontrado. Entre em contato com o administrador.")
                 elif usuario.get("codigo_convite") != codigo_input:
@@ -134,8 +129,12 @@ def primeiro_acesso_dialog():
                 elif not validar_senha(nova_senha):
                     st.error("Senha deve ter pelo menos 8 caracteres e conter letras e números.")
                 else:
-                    # Hash da senha
-                    hash_senha = bcrypt.hashpw(nova_senha.encode("utf-8"), bcrypt.gensalt())
+                    # Hash da senha (calculado no pool de senhas)
+                    try:
+                        hash_senha = gerar_hash_senha(nova_senha)
+                    except PoolSenhasOcupado:
+                        st.error("Muitos acessos neste momento. Tente novamente em alguns segundos.")
+                        st.stop()
 
                     # Atualiza banco
                     col_pessoas.update_one(
@@ -144,6 +143,9 @@ def primeiro_acesso_dialog():
                         "$unset": {"codigo_convite": ""}}
                     )
 
+                    # Saiu da lista de convites pendentes
+                    limpar_contagens_pessoas()
+
                     # Limpa sessão
                     for key in ["usuario_validado", "usuario_id"]:
                         st.session_state.pop(key, None)
@@ -233,16 +235,16 @@ def recuperar_senha_dialog():
                 if nova_senha == confirmar_senha and nova_senha.strip():
                     email = st.session_state.email_verificado
 
-                    usuario = col_pessoas.find_one({"e_mail": email})
+                    usuario = col_pessoas.find_one({"e_mail_normalizado": normalizar_email(email)})
 
                     if usuario:
                         try:
-                            # Gera hash seguro da senha
-                            hash_senha = bcrypt.hashpw(nova_senha.encode("utf-8"), bcrypt.gensalt())
+                            # Gera hash seguro da senha (calculado no pool de senhas)
+                            hash_senha = gerar_hash_senha(nova_senha)
 
                             # Atualiza no banco o hash, não a senha em texto puro
                             result = col_pessoas.update_one(
-                                {"e_mail": email},
+                                {"_id": usuario["_id"]},
                                 {"$set": {"senha": hash_senha}}
                             )
 
@@ -263,6 +265,8 @@ def recuperar_senha_dialog():
                                 st.rerun()
                             else:
                                 st.error("Erro ao redefinir a senha. Tente novamente.")
+                        except PoolSenhasOcupado:
+                            st.error("Muitos acessos neste momento. Tente novamente em alguns segundos.")
                         except Exception as e:
                             st.error(f"Erro ao atualizar a senha: {e}")
                     else:
@@ -318,9 +322,9 @@ def login():
         password = st.text_input("Senha", type="password", width="stretch")
 
         if st.form_submit_button("Entrar", type="primary", width=100):
-            # Busca apenas pelo e-mail
+            # Busca apenas pelo e-mail (normalizado, usa o índice único)
             usuario_encontrado = col_pessoas.find_one({
-                "e_mail": {"$regex": f"^{email_input.strip()}$", "$options": "i"}
+                "e_mail_normalizado": normalizar_email(email_input)
             })
 
             # Salva o email para possível recuperação de senha
@@ -329,8 +333,14 @@ def login():
             if usuario_encontrado:
                 senha_hash = usuario_encontrado.get("senha")
 
-                # Forma segura: só aceita hashes válidos (bytes)
-                if isinstance(senha_hash, bytes) and bcrypt.checkpw(password.encode("utf-8"), senha_hash):
+                # Forma segura: só aceita hashes válidos (bytes). A conferência roda no pool de senhas.
+                try:
+                    senha_ok = verificar_senha(password, senha_hash)
+                except PoolSenhasOcupado:
+                    st.error("Muitos acessos neste momento. Tente novamente em alguns segundos.", width=300)
+                    st.stop()
+
+                if senha_ok:
                     if usuario_encontrado.get("status", "").lower() != "ativo":
                         with st.container(width=300):
                             st.error("Usuário inativo. Entre em contato com o a equipe do CEPF.")
@@ -340,6 +350,9 @@ def login():
                     # tipo_usuario = usuario_encontrado.get("tipo_usuario", [])
                     tipo_usuario = usuario_encontrado.get("tipo_usuario", "")
 
+                    # Se o custo do bcrypt mudou, regrava o hash sem atrasar o login
+                    if precisa_rehash(senha_hash):
+                        rehash_em_segundo_plano(col_pessoas, usuario_encontrado["_id"], password, senha_hash)
 
                     # Autentica
                     st.session_state["logged_in"] = True
@@ -458,6 +471,12 @@ else:
             ],
         },
 
+        "home_avaliador": {
+            "Avaliações": [
+                st.Page("avaliador_projetos.py", title="Meus projetos", icon=":material/rate_review:"),
+            ],
+        },
+
         # "ver_projeto": [
         #     st.Page("projeto_visao_geral.py", title="Visão geral", icon=":material/home:"),
         #     st.Page("projeto_atividades.py", title="Atividades", icon=":material/assignment:"),
@@ -542,6 +561,14 @@ else:
 
 
 
+    # ROTEAMENTO DO AVALIADOR ---------------------------------
+    elif tipo_usuario == "avaliador":
+
+        st.session_state.pagina_atual = "home_avaliador"
+        pages = pags_por_tipo["home_avaliador"]
+
+
+
     # # ROTEAMENTO DO BENEFICIÁRIO ---------------------------------
     # elif tipo_usuario == "beneficiario":
 
@@ -0,0 +1,398 @@
+import sys
+import copy
+import datetime
+from bson import ObjectId
+from pymongo import UpdateOne, DeleteMany
+
+
+###########################################################################################################
+# MIGRAÇÕES DE DADOS
+###########################################################################################################
+
+# Cada migração roda uma única vez por banco. As já aplicadas ficam registradas na coleção "migracoes".
+# Todas devem ser idempotentes: se duas instâncias do app subirem juntas, rodar duas vezes não causa dano.
+
+
+
+def migrar_email_normalizado(db):
+    """
+    Preenche o campo e_mail_normalizado (e-mail sem espaços e em minúsculas) em todas as pessoas.
+    Roda no servidor com um único update_many de pipeline, sem trazer documentos para o Python.
+    """
+
+    resultado = db["pessoas"].update_many(
+        {"e_mail": {"$type": "string"}},
+        [{"$set": {
+            "e_mail_normalizado": {"$toLower": {"$trim": {"input": "$e_mail"}}}
+        }}]
+    )
+
+    return resultado.modified_count
+
+
+
+def ordenar_duplicadas(pessoas: list) -> list:
+    """
+    Ordena as pessoas de um grupo de e-mail duplicado: a primeira é a que fica com o e-mail normalizado.
+    Preferência para a ativa, depois para a que tem senha (hash bcrypt, gravado como binData;
+    senha None ou ausente não conta) e, no empate, para o cadastro mais antigo.
+    """
+
+    return sorted(pessoas, key=lambda p: (not p["ativo"], p["tipo_senha"] != "binData", p["_id"]))
+
+
+
+def migrar_emails_duplicados(db):
+    """
+    Resolve os e-mails que só diferem em maiúsculas/espaços (ex.: "Ana@x.org" e "ana@x.org"),
+    que impediriam o índice único de e_mail_normalizado. Em cada grupo fica com o e-mail
+    normalizado a pessoa escolhida por ordenar_duplicadas; nas demais o campo é removido (o índice é
+    parcial) e e_mail_duplicado_de aponta para a pessoa mantida. Os grupos são listados para revisão da
+    equipe: os cadastros sem e-mail normalizado não entram no login até receberem um e-mail próprio.
+    """
+
+    grupos = db["pessoas"].aggregate([
+        {"$match": {"e_mail_normalizado": {"$type": "string"}}},
+        {"$group": {
+            "_id": "$e_mail_normalizado",
+            "pessoas": {"$push": {
+                "_id": "$_id",
+                "ativo": {"$eq": ["$status", "ativo"]},
+                "tipo_senha": {"$type": "$senha"},
+            }},
+            "total": {"$sum": 1},
+        }},
+        {"$match": {"total": {"$gt": 1}}},
+    ], allowDiskUse=True)
+
+    operacoes = []
+
+    for grupo in grupos:
+        pessoas = ordenar_duplicadas(grupo["pessoas"])
+        mantida, duplicadas = pessoas[0]["_id"], [p["_id"] for p in pessoas[1:]]
+
+        print(
+            f"E-mail duplicado {grupo['_id']}: mantida a pessoa {mantida}; "
+            f"sem e-mail normalizado: {', '.join(str(d) for d in duplicadas)}. "
+            "AÇÃO MANUAL: dar um e-mail próprio a esses cadastros ou inativá-los "
+            "(enquanto isso eles não conseguem entrar no app)"
+        )
+
+        operacoes += [
+            UpdateOne(
+                {"_id": d},
+                {"$unset": {"e_mail_normalizado": ""}, "$set": {"e_mail_duplicado_de": mantida}}
+            )
+            for d in duplicadas
+        ]
+
+    if not operacoes:
+        return 0
+
+    return db["pessoas"].bulk_write(operacoes, ordered=False).modified_count
+
+
+
+def migrar_termos_busca(db, tamanho_lote=1000):
+    """
+    Preenche o campo termos_busca (palavras do nome sem acento + e-mail normalizado) das pessoas.
+    A remoção de acentos é feita no Python; as gravações vão em lotes de bulk_write.
+    """
+
+    # Import local: funcoes_auxiliares importa este módulo
+    from funcoes_auxiliares import termos_busca_pessoa
+
+    alterados = 0
+    operacoes = []
+
+    cursor = db["pessoas"].find(
+        {"termos_busca": {"$exists": False}},
+        {"nome_completo": 1, "e_mail": 1}
+    ).batch_size(tamanho_lote)
+
+    for pessoa in cursor:
+        operacoes.append(UpdateOne(
+            {"_id": pessoa["_id"]},
+            {"$set": {"termos_busca": termos_busca_pessoa(pessoa.get("nome_completo"), pessoa.get("e_mail"))}}
+        ))
+
+        if len(operacoes) == tamanho_lote:
+            alterados += db["pessoas"].bulk_write(operacoes, ordered=False).modified_count
+            operacoes = []
+
+    if operacoes:
+        alterados += db["pessoas"].bulk_write(operacoes, ordered=False).modified_count
+
+    return alterados
+
+
+
+def migrar_ids_estagios_perguntas(db):
+    """
+    Gera id_estagio e id_pergunta (ObjectId em texto) para estágios e perguntas que ainda não têm,
+    e copia o id_estagio para os vínculos em pessoas.editais.estagios (casados por edital + nome do estágio).
+    """
+
+    alterados = 0
+
+    for edital in db["editais"].find({"estagios": {"$exists": True}}, {"codigo_edital": 1, "estagios": 1}):
+
+        originais = edital.get("estagios", [])
+        estagios = copy.deepcopy(originais)
+
+        for estagio in estagios:
+            estagio.setdefault("id_estagio", str(ObjectId()))
+
+            for pergunta in estagio.get("perguntas_estagio", []):
+                pergunta.setdefault("id_pergunta", str(ObjectId()))
+
+        if estagios != originais:
+            # Só grava se os estágios não mudaram desde a leitura (outra instância pode ter migrado antes)
+            alterados += db["editais"].update_one(
+                {"_id": edital["_id"], "estagios": originais},
+                {"$set": {"estagios": estagios}}
+            ).modified_count
+
+        # Relê os ids efetivamente gravados e propaga para os vínculos dos avaliadores
+        gravados = db["editais"].find_one({"_id": edital["_id"]}, {"estagios": 1}).get("estagios", [])
+
+        for estagio in gravados:
+            if "id_estagio" not in estagio:
+                continue
+
+            alterados += db["pessoas"].update_many(
+                {
+                    "editais.codigo_edital": edital["codigo_edital"],
+                    "editais.estagios.nome_estagio": estagio["nome_estagio"]
+                },
+                {"$set": {"editais.$[e].estagios.$[s].id_estagio": estagio["id_estagio"]}},
+                array_filters=[
+                    {"e.codigo_edital": edital["codigo_edital"]},
+                    {"s.nome_estagio": estagio["nome_estagio"], "s.id_estagio": {"$exists": False}}
+                ]
+            ).modified_count
+
+    return alterados
+
+
+
+def migrar_versao_editais(db):
+    """Inicia o contador de versão (controle de concorrência otimista) dos editais que ainda não têm."""
+
+    return db["editais"].update_many(
+        {"versao": {"$exists": False}},
+        {"$set": {"versao": 0}}
+    ).modified_count
+
+
+
+def migrar_projetos_duplicados(db):
+    """
+    Junta os projetos repetidos de um mesmo edital (mesmo codigo_recebimento, de cargas antigas da
+    planilha), que impediriam o índice único (codigo_edital, codigo_recebimento). Em cada grupo fica o
+    documento mais antigo, que recebe os estágios habilitados de todos; os demais são excluídos.
+    Os grupos são listados para revisão da equipe.
+    """
+
+    grupos = db["projetos"].aggregate([
+        {"$group": {
+            "_id": {"codigo_edital": "$codigo_edital", "codigo_recebimento": "$codigo_recebimento"},
+            "ids": {"$push": "$_id"},
+            "estagios": {"$push": {"$ifNull": ["$estagios_habilitados", []]}},
+            "total": {"$sum": 1},
+        }},
+        {"$match": {"total": {"$gt": 1}}},
+    ], allowDiskUse=True)
+
+    operacoes = []
+
+    for grupo in grupos:
+        mantido, duplicados = min(grupo["ids"]), sorted(grupo["ids"])[1:]
+        estagios = sorted({e for lista in grupo["estagios"] for e in lista})
+
+        print(
+            f"Projeto duplicado {grupo['_id']['codigo_recebimento']} no edital {grupo['_id']['codigo_edital']}: "
+            f"mantido {mantido}; excluídos: {', '.join(str(d) for d in duplicados)}"
+        )
+
+        if estagios:
+            operacoes.append(UpdateOne(
+                {"_id": mantido},
+                {"$addToSet": {"estagios_habilitados": {"$each": estagios}}}
+            ))
+        operacoes.append(DeleteMany({"_id": {"$in": duplicados}}))
+
+    if not operacoes:
+        return 0
+
+    resultado = db["projetos"].bulk_write(operacoes, ordered=False)
+
+    return resultado.modified_count + resultado.deleted_count
+
+
+
+def migrar_atribuicoes(db, tamanho_lote=1000):
+    """
+    Move os projetos atribuídos de pessoas.editais.estagios.projetos para a coleção "atribuicoes"
+    (um documento por edital, estágio, avaliador e projeto), marca como concluídas as que já têm
+    avaliação enviada e, por último, remove as listas de projetos dos documentos de pessoas.
+    Vínculos com estágios sem id_estagio não podem ser copiados: são listados e mantidos como estão.
+    """
+
+    # Imports locais: funcoes_auxiliares importa este módulo
+    from funcoes_atribuicoes import operacao_atribuir
+    from funcoes_avaliacoes import STATUS_ENVIADA
+
+    alterados = 0
+    operacoes = []
+
+    def gravar(colecao, operacoes):
+        resultado = db[colecao].bulk_write(operacoes, ordered=False)
+        return resultado.upserted_count + resultado.modified_count
+
+    cursor = db["pessoas"].find(
+        {"editais.estagios.projetos": {"$exists": True}},
+        {"editais": 1}
+    ).batch_size(tamanho_lote)
+
+    orfaos = 0
+
+    for pessoa in cursor:
+        for edital in pessoa.get("editais", []):
+            for estagio in edital.get("estagios", []):
+                if "id_estagio" not in estagio:
+                    # Vínculo sem id (estágio renomeado antes dos ids): os projetos ficam na pessoa
+                    if estagio.get("projetos"):
+                        orfaos += len(estagio["projetos"])
+                        print(
+                            f"Atribuições não migradas: pessoa {pessoa['_id']}, "
+                            f"edital {edital.get('codigo_edital')}, "
+                            f"estágio sem id '{estagio.get('nome_estagio')}': "
+                            f"{', '.join(map(str, estagio['projetos']))}"
+                        )
+                    continue
+
+                for codigo in estagio.get("projetos", []):
+                    operacoes.append(
+                        operacao_atribuir(edital["codigo_edital"], estagio["id_estagio"], pessoa["_id"], codigo)
+                    )
+
+                    if len(operacoes) == tamanho_lote:
+                        alterados += gravar("atribuicoes", operacoes)
+                        operacoes = []
+
+    if operacoes:
+        alterados += gravar("atribuicoes", operacoes)
+        operacoes = []
+
+    # Avaliações já enviadas concluem a atribuição correspondente
+    cursor = db["avaliacoes"].find(
+        {"status": STATUS_ENVIADA},
+        {"_id": 0, "codigo_edital": 1, "id_estagio": 1, "id_avaliador": 1, "codigo_recebimento": 1, "enviada_em": 1}
+    ).batch_size(tamanho_lote)
+
+    for avaliacao in cursor:
+        enviada_em = avaliacao.pop("enviada_em", None)
+        operacoes.append(UpdateOne(
+            {**avaliacao, "concluida": False},
+            {"$set": {"concluida": True, "concluida_em": enviada_em}}
+        ))
+
+        if len(operacoes) == tamanho_lote:
+            alterados += gravar("atribuicoes", operacoes)
+            operacoes = []
+
+    if operacoes:
+        alterados += gravar("atribuicoes", operacoes)
+
+    if orfaos:
+        print(f"{orfaos} atribuição(ões) de estágios sem id continuam em pessoas.editais.estagios.projetos.")
+
+    # Só depois de tudo copiado: os documentos de pessoas ficam só com o vínculo aos estágios.
+    # Só os estágios com id (os copiados) perdem a lista; os sem id a mantêm para revisão.
+    # (pipeline com $map: entradas de edital sem "estagios" não interrompem a atualização)
+    alterados += db["pessoas"].update_many(
+        {"editais.estagios.projetos": {"$exists": True}},
+        [{"$set": {"editais": {"$map": {
+            "input": "$editais",
+            "as": "e",
+            "in": {"$mergeObjects": ["$$e", {"estagios": {"$map": {
+                "input": {"$ifNull": ["$$e.estagios", []]},
+                "as": "s",
+                "in": {"$cond": [
+                    {"$eq": [{"$type": "$$s.id_estagio"}, "missing"]},
+                    "$$s",
+                    {"$unsetField": {"field": "projetos", "input": "$$s"}}
+                ]}
+            }}}]}
+        }}}}]
+    ).modified_count
+
+    return alterados
+
+
+
+# Lista ordenada de migrações: (nome, função)
+MIGRACOES = [
+    ("email_normalizado", migrar_email_normalizado),
+    ("emails_duplicados", migrar_emails_duplicados),
+    ("termos_busca", migrar_termos_busca),
+    ("ids_estagios_perguntas", migrar_ids_estagios_perguntas),
+    ("versao_editais", migrar_versao_editais),
+    ("atribuicoes", migrar_atribuicoes),
+    ("projetos_duplicados", migrar_projetos_duplicados),
+]
+
+
+
+def aplicar_migracoes(db):
+    """Aplica, em ordem, as migrações ainda não registradas na coleção 'migracoes'."""
+
+    aplicadas = {m["_id"] for m in db["migracoes"].find({}, {"_id": 1})}
+
+    for nome, funcao in MIGRACOES:
+        if nome in aplicadas:
+            continue
+
+        try:
+            alterados = funcao(db)
+        except Exception as e:
+            # Não registra: a migração será tentada de novo no próximo processo
+            print(f"Erro ao aplicar a migração {nome}: {e}")
+            continue
+
+        db["migracoes"].update_one(
+            {"_id": nome},
+            {"$set": {
+                "aplicada_em": datetime.datetime.now(),
+                "documentos_alterados": alterados
+            }},
+            upsert=True
+        )
+
+        print(f"Migração {nome} aplicada ({alterados} documentos alterados).")
+
+
+
+###########################################################################################################
+# EXECUÇÃO PELA LINHA DE COMANDO
+###########################################################################################################
+
+# Uso: python migracoes.py            -> aplica as migrações pendentes
+#      python migracoes.py <nome>     -> roda de novo uma migração específica
+if __name__ == "__main__":
+    from funcoes_auxiliares import conectar_mongo_ieb_selecao
+
+    db = conectar_mongo_ieb_selecao()
+
+    if len(sys.argv) > 1:
+        funcoes = dict(MIGRACOES)
+        nome = sys.argv[1]
+
+        if nome not in funcoes:
+            print(f"Migração desconhecida: {nome}. Opções: {', '.join(funcoes)}")
+            sys.exit(1)
+
+        print(f"{nome}: {funcoes[nome](db)} documentos alterados.")
+    else:
+        aplicar_migracoes(db)
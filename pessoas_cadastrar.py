@@ -1,14 +1,16 @@
 import streamlit as st
-from funcoes_auxiliares import conectar_mongo_ieb_selecao # Funções personalizadas
+from funcoes_auxiliares import conectar_mongo_ieb_selecao, normalizar_email, termos_busca_pessoa, gerar_codigo_aleatorio # Funções personalizadas
+from funcoes_email import enfileirar_email, enfileirar_emails_em_lote, corpo_email_convite, ASSUNTO_CONVITE
+from funcoes_lista_pessoas import limpar_contagens_pessoas
 import pandas as pd
 import re
 import time
 import uuid
 import datetime
-import smtplib
-import random
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+import numpy as np
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+from pymongo.errors import DuplicateKeyError
 
 ###########################################################################################################
 # CONEXÃO COM O BANCO DE DADOS MONGODB
@@ -17,9 +19,8 @@ from email.mime.text import MIMEText
 # Conecta-se ao banco de dados MongoDB (usa cache automático para melhorar performance)
 db = conectar_mongo_ieb_selecao()
 
-# Importa coleções e cria dataframes
+# Importa coleções
 col_pessoas = db["pessoas"]
-df_pessoas = pd.DataFrame(list(col_pessoas.find()))
 
 # col_projetos = db["projetos"]
 # df_projetos = pd.DataFrame(list(col_projetos.find()))
@@ -31,45 +32,13 @@ df_pessoas = pd.DataFrame(list(col_pessoas.find()))
 # FUNÇÕES
 ###########################################################################################################
 
-def gerar_codigo_aleatorio():
-    """Gera um código numérico aleatório de 6 dígitos como string."""
-    return f"{random.randint(0, 999999):06d}"
-
-
 def enviar_email_convite(nome_completo, email_destino, codigo):
     """
-    Envia um e-mail de convite com código de 6 dígitos usando credenciais do st.secrets.
-    Retorna True se enviado, False se falhou.
+    Coloca o e-mail de convite na caixa de saída (o envio é feito em segundo plano).
+    Retorna True se a mensagem foi enfileirada, False se falhou.
     """
     try:
-        smtp_server = st.secrets["senhas"]["smtp_server"]
-        port = st.secrets["senhas"]["port"]
-        endereco_email = st.secrets["senhas"]["endereco_email"]
-        senha_email = st.secrets["senhas"]["senha_email"]
-
-        msg = MIMEMultipart()
-        msg['From'] = endereco_email
-        msg['To'] = email_destino
-        msg['Subject'] = "Convite para a Plataforma de Seleção de Projetos do IEB"
-
-        corpo_html = f"""
-        <p>Olá {nome_completo},</p>
-        <p>Você foi convidado para participar de um processo seletivo na <strong>Plataforma de Seleção de Projetos do IEB</strong>.</p>
-        <p>Para realizar seu cadastro, acesse o link abaixo e clique no botão <strong>"Primeiro acesso"</strong>:</p>
-        <p><a href="https://ieb-selecao.streamlit.app/">Acesse aqui a Plataforma</a></p>
-        <p>Insira o seu <strong>e-mail</strong> e o <strong>código</strong> que te enviamos abaixo:</p>
-        <h2>{codigo}</h2>
-        <p>Se tiver alguma dúvida, entre em contato com a equipe do CEPF.</p>
-        """
-        msg.attach(MIMEText(corpo_html, 'html'))
-
-        server = smtplib.SMTP(smtp_server, port)
-        server.starttls()
-        server.login(endereco_email, senha_email)
-        server.send_message(msg)
-        server.quit()
-
-        # st.success(f":material/mail: E-mail de convite enviado para {email_destino}.")
+        enfileirar_email(corpo_email_convite(nome_completo, codigo), [email_destino], ASSUNTO_CONVITE)
         return True
     except Exception as e:
         st.error(f"Erro ao enviar e-mail para {email_destino}: {e}")
@@ -94,6 +63,198 @@ def validar_email(email):
 
 
 
+# Tipos de usuário que cada perfil pode convidar
+TIPOS_CONVIDAVEIS = {
+    "equipe": ["avaliador", "visitante"],
+    "admin": ["admin", "equipe", "avaliador", "visitante"],
+}
+
+# Colunas esperadas na planilha de convite em massa
+COLUNAS_PLANILHA = ["nome_completo", "e_mail", "telefone", "tipo_usuario"]
+
+# Outros nomes de coluna aceitos na planilha
+APELIDOS_COLUNAS = {
+    "nome": "nome_completo",
+    "nome completo": "nome_completo",
+    "email": "e_mail",
+    "e-mail": "e_mail",
+    "tipo": "tipo_usuario",
+    "tipo de usuário": "tipo_usuario",
+    "tipo de usuario": "tipo_usuario",
+}
+
+
+def ler_planilha_convites(arquivo) -> pd.DataFrame:
+    """Lê o CSV/XLSX enviado, com todas as colunas como texto e nomes de coluna padronizados."""
+
+    if arquivo.name.lower().endswith(".csv"):
+        # sep=None detecta vírgula ou ponto e vírgula
+        df = pd.read_csv(arquivo, dtype=str, sep=None, engine="python")
+    else:
+        df = pd.read_excel(arquivo, dtype=str)
+
+    colunas = df.columns.astype(str).str.strip().str.lower()
+    df.columns = [APELIDOS_COLUNAS.get(c, c) for c in colunas]
+    return df
+
+
+def validar_planilha_convites(df: pd.DataFrame, tipos_permitidos: list) -> pd.DataFrame:
+    """
+    Valida e deduplica a planilha de uma vez (operações vetorizadas do pandas).
+    Os e-mails já cadastrados são conferidos numa única consulta $in.
+    Retorna o dataframe com a coluna "resultado" ("ok" para as linhas que podem ser convidadas).
+    """
+
+    df = df.reindex(columns=COLUNAS_PLANILHA).fillna("").astype(str)
+    df = df.apply(lambda coluna: coluna.str.strip())
+    df["tipo_usuario"] = df["tipo_usuario"].str.lower()
+    df["e_mail_normalizado"] = df["e_mail"].str.lower()
+
+    # Número da linha na planilha (cabeçalho é a linha 1)
+    df.insert(0, "linha", np.arange(2, len(df) + 2))
+
+    existentes = {
+        p["e_mail_normalizado"]
+        for p in col_pessoas.find(
+            {"e_mail_normalizado": {"$in": df["e_mail_normalizado"].unique().tolist()}},
+            {"e_mail_normalizado": 1}
+        )
+    }
+
+    # A primeira condição verdadeira define o resultado da linha
+    condicoes = [
+        (df[COLUNAS_PLANILHA] == "").any(axis=1),
+        ~df["e_mail"].str.match(EMAIL_REGEX),
+        ~df["tipo_usuario"].isin(tipos_permitidos),
+        df["e_mail_normalizado"].duplicated(keep="first"),
+        df["e_mail_normalizado"].isin(existentes),
+    ]
+    mensagens = [
+        "campos obrigatórios vazios",
+        "e-mail inválido",
+        "tipo de usuário inválido",
+        "e-mail repetido na planilha",
+        "e-mail já cadastrado",
+    ]
+    df["resultado"] = np.select(condicoes, mensagens, default="ok")
+
+    return df
+
+
+def convidar_em_massa(df_validos: pd.DataFrame) -> pd.Series:
+    """
+    Insere as pessoas válidas com um único bulk_write não ordenado e enfileira os convites num único lote.
+    Retorna uma série (mesmo índice de df_validos) com o resultado de cada linha.
+    """
+
+    resultado = pd.Series("convidado(a)", index=df_validos.index, dtype=object)
+
+    if df_validos.empty:
+        return resultado
+
+    data_convite = datetime.datetime.now().strftime("%d/%m/%Y")
+    codigos = [gerar_codigo_aleatorio() for _ in range(len(df_validos))]
+
+    documentos = [
+        {
+            "nome_completo": linha.nome_completo,
+            "tipo_usuario": linha.tipo_usuario,
+            "e_mail": linha.e_mail,
+            "e_mail_normalizado": linha.e_mail_normalizado,
+            "termos_busca": termos_busca_pessoa(linha.nome_completo, linha.e_mail),
+            "telefone": linha.telefone,
+            "status": "convidado",
+            "data_convite": data_convite,
+            "senha": None,
+            "codigo_convite": codigo,
+        }
+        for linha, codigo in zip(df_validos.itertuples(index=False), codigos)
+    ]
+
+    try:
+        col_pessoas.bulk_write([InsertOne(doc) for doc in documentos], ordered=False)
+    except BulkWriteError as e:
+        # Ex.: o mesmo e-mail foi convidado por outra pessoa entre a validação e a gravação
+        for erro in e.details.get("writeErrors", []):
+            resultado.iloc[erro["index"]] = (
+                "e-mail já cadastrado" if erro.get("code") == 11000 else f"erro: {erro.get('errmsg')}"
+            )
+
+    # Mesmo com erros em algumas linhas, as demais foram inseridas
+    limpar_contagens_pessoas()
+
+    inseridos = resultado == "convidado(a)"
+
+    enfileirar_emails_em_lote([
+        {
+            "corpo_html": corpo_email_convite(doc["nome_completo"], doc["codigo_convite"]),
+            "destinatarios": [doc["e_mail"]],
+            "assunto": ASSUNTO_CONVITE,
+        }
+        for doc, inserido in zip(documentos, inseridos)
+        if inserido
+    ])
+
+    return resultado
+
+
+def convite_em_massa():
+    """Interface do convite em massa: upload, prévia da validação, gravação e relatório por linha."""
+
+    tipos_permitidos = TIPOS_CONVIDAVEIS.get(tipo_usuario, [])
+
+    st.write(
+        "Envie uma planilha (CSV ou XLSX) com as colunas "
+        "**nome_completo**, **e_mail**, **telefone** e **tipo_usuario** "
+        f"({', '.join(tipos_permitidos)})."
+    )
+
+    arquivo = st.file_uploader("Planilha de convidados", type=["csv", "xlsx"], key="planilha_convites")
+
+    if arquivo is None:
+        return
+
+    try:
+        df_planilha = ler_planilha_convites(arquivo)
+    except Exception as e:
+        st.error(f":material/error: Não foi possível ler a planilha: {e}")
+        return
+
+    df_validado = validar_planilha_convites(df_planilha, tipos_permitidos)
+    validos = df_validado["resultado"] == "ok"
+
+    st.write(f"**{int(validos.sum())}** de {len(df_validado)} linhas prontas para convite.")
+
+    colunas_relatorio = ["linha", "nome_completo", "e_mail", "tipo_usuario", "resultado"]
+
+    if (~validos).any():
+        st.dataframe(df_validado.loc[~validos, colunas_relatorio], hide_index=True)
+
+    if st.button(
+        f"Convidar {int(validos.sum())} pessoas",
+        icon=":material/send:",
+        type="primary",
+        disabled=not validos.any()
+    ):
+        with st.spinner("Cadastrando pessoas..."):
+            df_validado.loc[validos, "resultado"] = convidar_em_massa(df_validado[validos])
+
+        convidados = int((df_validado["resultado"] == "convidado(a)").sum())
+        st.success(f"{convidados} pessoas convidadas. Os e-mails estão sendo enviados.", icon=":material/check:")
+
+        relatorio = df_validado[colunas_relatorio]
+        st.dataframe(relatorio, hide_index=True)
+
+        st.download_button(
+            "Baixar relatório",
+            data=relatorio.to_csv(index=False).encode("utf-8"),
+            file_name="relatorio_convites.csv",
+            mime="text/csv",
+            icon=":material/download:"
+        )
+
+
+
 
 
 
@@ -119,18 +280,25 @@ st.logo("images/logo_ieb.svg", size='large')
 st.header("Convidar pessoa")
 
 
-# opcao_cadastro = st.radio("", ["Convite individual", "Convite em massa"], key="opcao_cadastro", horizontal=True)
+opcao_cadastro = st.radio("", ["Convite individual", "Convite em massa"], key="opcao_cadastro", horizontal=True)
 
 st.divider()
 
 
+# --------------------------
+# CONVITE EM MASSA
+# --------------------------
+if opcao_cadastro == "Convite em massa":
+    convite_em_massa()
+    st.stop()
+
+
 
 
 
 # --------------------------
-# FORMULÁRIO DE CADASTRO
+# FORMULÁRIO DE CADASTRO (CONVITE INDIVIDUAL)
 # --------------------------
-# if opcao_cadastro == "Convite individual":
 
 # --- campos do formulário que vamos controlar ---
 CAMPOS_FORM_PESSOA = {
@@ -214,7 +382,7 @@ if submit_button:
         st.error(":material/error: E-mail inválido.")
         st.stop()
 
-    if col_pessoas.find_one({"e_mail": st.session_state["e_mail"]}):
+    if col_pessoas.find_one({"e_mail_normalizado": normalizar_email(st.session_state["e_mail"])}):
         st.error(f":material/error: O e-mail '{st.session_state['e_mail']}' já está cadastrado.")
         st.stop()
 
@@ -226,6 +394,8 @@ if submit_button:
         "nome_completo": st.session_state["nome_completo_novo"],
         "tipo_usuario": st.session_state["tipo_novo_usuario"],
         "e_mail": st.session_state["e_mail"],
+        "e_mail_normalizado": normalizar_email(st.session_state["e_mail"]),
+        "termos_busca": termos_busca_pessoa(st.session_state["nome_completo_novo"], st.session_state["e_mail"]),
         "telefone": st.session_state["telefone"],
         "status": "convidado",
         # "projetos": st.session_state.get("projetos_escolhidos", []),
@@ -237,28 +407,31 @@ if submit_button:
     # if st.session_state["tipo_novo_usuario"] == "beneficiario":
     #     novo_doc["tipo_beneficiario"] = st.session_state.get("tipo_beneficiario")
 
-    # 4) Inserir no banco
-    col_pessoas.insert_one(novo_doc)
-
-    with st.spinner("Cadastrando pessoa... aguarde..."):
-
-        time.sleep(2)
+    # 4) Inserir no banco (o índice único de e-mail barra cadastros simultâneos do mesmo e-mail)
+    try:
+        col_pessoas.insert_one(novo_doc)
+    except DuplicateKeyError:
+        st.error(f":material/error: O e-mail '{st.session_state['e_mail']}' já está cadastrado.")
+        st.stop()
 
-        st.success("Pessoa cadastrada com sucesso no banco de dados!", icon=":material/check:")
+    limpar_contagens_pessoas()
 
-        # 5) Envio do e-mail de convite
-        enviado = enviar_email_convite(
-            nome_completo=st.session_state["nome_completo_novo"],
-            email_destino=st.session_state["e_mail"],
-            codigo=codigo_6_digitos
-        )
+    # 5) E-mail de convite vai para a caixa de saída (enviado em segundo plano)
+    enviado = enviar_email_convite(
+        nome_completo=st.session_state["nome_completo_novo"],
+        email_destino=st.session_state["e_mail"],
+        codigo=codigo_6_digitos
+    )
 
+    st.success("Pessoa cadastrada com sucesso no banco de dados!", icon=":material/check:")
 
+    if enviado:
+        st.success(f"E-mail de convite enviado para {st.session_state['e_mail']}.", icon=":material/mail:")
 
-        # 6) Limpar campos do formulário e rerun
-        st.session_state["limpar_form_pessoa"] = True
-        time.sleep(6)
-        st.rerun()
+    # 6) Limpar campos do formulário e rerun
+    st.session_state["limpar_form_pessoa"] = True
+    time.sleep(3)
+    st.rerun()
 
 
 
@@ -1,8 +1,8 @@
 import streamlit as st
-from funcoes_auxiliares import conectar_mongo_ieb_selecao
+from funcoes_auxiliares import conectar_mongo_ieb_selecao, campos_busca_pessoa
 
-import pandas as pd
 from bson import ObjectId
+from funcoes_lista_pessoas import lista_pessoas, atualizar_pessoa, aviso_email_duplicado
 import time
 
 ###########################################################################################################
@@ -12,7 +12,7 @@ import time
 # Conecta-se ao banco de dados MongoDB (usa cache automático para melhorar performance)
 db = conectar_mongo_ieb_selecao()
 
-# Importa coleções e cria dataframes
+# Importa coleções
 
 # Pessoas
 col_pessoas = db["pessoas"]
@@ -22,45 +22,6 @@ col_pessoas = db["pessoas"]
 # col_projetos = db["projetos"]
 
 
-###########################################################################################################
-# TRATAMENTO DOS DADOS
-###########################################################################################################
-
-# # PROJETOS
-
-# df_projetos = pd.DataFrame(list(col_projetos.find()))
-# # Converte objectId para string
-# df_projetos['_id'] = df_projetos['_id'].astype(str)
-
-
-# PESSOAS
-
-# 1) Busca todos os documentos, mas já exclui a coluna 'senha'
-df_pessoas = pd.DataFrame(list(col_pessoas.find({}, {"senha": 0})))
-
-# 2) Filtra apenas os registros com status 'convidado'
-df_pendentes = df_pessoas[df_pessoas["status"] == "convidado"]
-
-
-# Renomeia as colunas
-df_pendentes = df_pendentes.rename(columns={
-    "nome_completo": "Nome",
-    "tipo_usuario": "Tipo de usuário",
-    # "tipo_beneficiario": "Tipo de beneficiário",
-    "e_mail": "E-mail",
-    "telefone": "Telefone",
-    "status": "Status",
-    # "projetos": "Projetos",
-    "data_convite": "Data do convite"
-})
-
-# Ordena por Nome
-df_pendentes = df_pendentes.sort_values(by="Nome")
-
-
-
-
-
 ###########################################################################################################
 # Funções
 ###########################################################################################################
@@ -79,6 +40,7 @@ def editar_pessoa(_id: str):
     # Inputs básicos
     nome = st.text_input("Nome", value=pessoa.get("nome_completo", ""))
     email = st.text_input("E-mail", value=pessoa.get("e_mail", ""))
+    aviso_email_duplicado(pessoa)
     telefone = st.text_input("Telefone", value=pessoa.get("telefone", ""))
 
     # Tipo de usuário
@@ -101,6 +63,7 @@ def editar_pessoa(_id: str):
         update_data = {
             "nome_completo": nome,
             "e_mail": email,
+            **campos_busca_pessoa(nome, email),
             "telefone": telefone,
             "tipo_usuario": tipo_usuario,
             # "status": status,
@@ -109,7 +72,10 @@ def editar_pessoa(_id: str):
 
 
         # Atualiza o registro
-        col_pessoas.update_one({"_id": ObjectId(_id)}, {"$set": update_data})
+        erro = atualizar_pessoa(col_pessoas, pessoa, update_data)
+        if erro:
+            st.error(erro)
+            return
 
         st.success("Pessoa atualizada com sucesso!", icon=":material/check:")
         time.sleep(2)
@@ -131,74 +97,23 @@ st.header('Convites pendentes')
 
 st.divider()
 
-
-dist_colunas = [3, 4, 3, 2, 3, 2, 1]
-
-# Colunas
-col1, col2, col3, col4, col5, col6, col7 = st.columns(dist_colunas)
-
-# Cabeçalho da lista
-col1.write('**Nome**')
-col2.write('**Projetos**')
-col3.write('**E-mail**')
-col4.write('**Telefone**')
-col5.write('**Tipo de usuário**')
-col6.write('**Data do convite**')
-col7.write('')
-
-st.write('')
-
-# Pra cada linha, criar colunas para os dados
-for _, row in df_pendentes.iterrows():
-    col1, col2, col3, col4, col5, col6, col7 = st.columns(dist_colunas)
-
-    # NOME -----------------
-    col1.write(row["Nome"])
-
-    # PROJETOS -----------------
-
-    # Tratando a coluna projetos, que pode ter múltiplos valores------
-    projetos = row.get("Projetos", [])
-    # Garante que 'projetos' seja uma lista
-    if isinstance(projetos, str):
-        projetos = [projetos]
-    elif not isinstance(projetos, list):
-        projetos = []
-    # Exibe de forma amigável
-    if len(projetos) == 0:
-        col2.write("")
-    elif len(projetos) == 1:
-        col2.write(projetos[0])
-    else:
-        col2.write(", ".join(projetos))
-    
-
-    # E-MAIL -----------------
-
-    col3.write(row["E-mail"])
-
-    # TELEFONE -----------------
-    col4.write(row["Telefone"])
-
-
-    # TIPO DE USUÁRIO -----------------
-    tipo_usuario = str(row.get("Tipo de usuário", "") or "").strip()
-
-    # Só tenta pegar tipo_beneficiario se for beneficiario
-    tipo_beneficiario = ""
-    if tipo_usuario.lower() == "beneficiario":
-        tipo_beneficiario = str(row.get("Tipo de beneficiário", "") or "").strip()
-
-    # Se for beneficiário, concatena o tipo_beneficiario
-    if tipo_usuario.lower() == "beneficiario" and tipo_beneficiario:
-        tipo_exibido = f"{tipo_usuario} ({tipo_beneficiario})"
-    else:
-        tipo_exibido = tipo_usuario
-
-    col5.write(tipo_exibido)
-
-    # STATUS -----------------       
-    col6.write(row["Data do convite"])
-
-    # BOTÃO DE EDITAR -----------------
-    col7.button(":material/edit:", key=row["_id"], on_click=editar_pessoa, args=(row["_id"],))
+# Lista paginada dos convites pendentes (filtro, ordenação e paginação no MongoDB)
+lista_pessoas(
+    chave="lista_convites",
+    colecao=col_pessoas,
+    filtro={"status": "convidado"},
+    colunas=[
+        ("nome_completo", "Nome", 3),
+        ("e_mail", "E-mail", 3),
+        ("telefone", "Telefone", 2),
+        ("tipo_usuario", "Tipo de usuário", 3),
+        ("data_convite", "Data do convite", 2),
+    ],
+    ao_editar=editar_pessoa,
+    editaveis={
+        "nome_completo": None,
+        "telefone": None,
+        "tipo_usuario": ["admin", "equipe", "avaliador", "visitante"],
+    },
+    acoes=["alterar_tipo", "reenviar_convite"],
+)
@@ -1,7 +1,8 @@
 import streamlit as st
-from funcoes_auxiliares import conectar_mongo_ieb_selecao
-import pandas as pd
+from funcoes_auxiliares import conectar_mongo_ieb_selecao, campos_busca_pessoa
 from bson import ObjectId
+from funcoes_lista_pessoas import lista_pessoas, atualizar_pessoa, aviso_email_duplicado, registrar_redistribuicao
+from funcoes_distribuicao import redistribuir_pendentes
 import time
 
 
@@ -12,7 +13,7 @@ import time
 # Conecta-se ao banco de dados MongoDB (usa cache automático para melhorar performance)
 db = conectar_mongo_ieb_selecao()
 
-# Importa coleções e cria dataframes
+# Importa coleções
 
 # Pessoas
 col_pessoas = db["pessoas"]
@@ -25,34 +26,6 @@ col_pessoas = db["pessoas"]
 
 
 
-###########################################################################################################
-# TRATAMENTO DOS DADOS
-###########################################################################################################
-
-# Busca todos os documentos, mas exclui o campo "senha"
-df_pessoas = pd.DataFrame(list(col_pessoas.find({}, {"senha": 0})))
-
-# Converte ObjectId para string
-df_pessoas["_id"] = df_pessoas["_id"].astype(str)
-
-# Renomeia as colunas
-df_pessoas = df_pessoas.rename(columns={
-    "nome_completo": "Nome",
-    "tipo_usuario": "Tipo de usuário",
-    "e_mail": "E-mail",
-    "telefone": "Telefone",
-    "status": "Status",
-    "projetos": "Projetos"
-})
-
-# Ordena por Nome
-df_pessoas = df_pessoas.sort_values(by="Nome")
-
-
-
-
-
-
 ###########################################################################################################
 # Funções
 ###########################################################################################################
@@ -74,6 +47,7 @@ def editar_pessoa(_id: str):
     # ===============================
     nome = st.text_input("Nome", value=pessoa.get("nome_completo", ""))
     email = st.text_input("E-mail", value=pessoa.get("e_mail", ""))
+    aviso_email_duplicado(pessoa)
     telefone = st.text_input("Telefone", value=pessoa.get("telefone", ""))
 
     # ===============================
@@ -156,6 +130,7 @@ def editar_pessoa(_id: str):
         update_data = {
             "nome_completo": nome,
             "e_mail": email,
+            **campos_busca_pessoa(nome, email),
             "telefone": telefone,
             "tipo_usuario": tipo_usuario,
             "status": status,
@@ -164,12 +139,20 @@ def editar_pessoa(_id: str):
 
 
         # Atualiza documento
-        col_pessoas.update_one(
-            {"_id": ObjectId(_id)},
-            {"$set": update_data},
-        )
+        erro = atualizar_pessoa(col_pessoas, pessoa, update_data)
+        if erro:
+            st.error(erro)
+            return
+
+        mensagem = "Pessoa atualizada com sucesso!"
 
-        st.success("Pessoa atualizada com sucesso!", icon=":material/check:")
+        # Inativada agora: as atribuições pendentes passam para outros(as) avaliadores(as)
+        if status == "inativo" and pessoa.get("status") != "inativo":
+            mensagem += registrar_redistribuicao(
+                "lista_equipe", redistribuir_pendentes(db, [ObjectId(_id)])
+            )
+
+        st.success(mensagem, icon=":material/check:")
         time.sleep(3)
         st.rerun()
 
@@ -196,71 +179,25 @@ st.header('Equipe')
 # st.write('')
 st.divider()
 
-
-# Separando só a equipe e administradores
-df_equipe = df_pessoas[
-    df_pessoas["Tipo de usuário"].isin(["admin", "equipe"])
-]
-
-
-st.write('')
-
-dist_colunas = [3, 4, 3, 2, 3, 2, 1]
-
-# Colunas
-col1, col2, col3, col4, col5, col6, col7 = st.columns(dist_colunas)
-
-# Cabeçalho da lista
-col1.write('**Nome**')
-col2.write('**Projetos**')
-col3.write('**E-mail**')
-col4.write('**Telefone**')
-col5.write('**Tipo de usuário**')
-col6.write('**Status**')
-col7.write('')
-
-st.write('')
-
-# Pra cada linha, criar colunas para os dados
-for _, row in df_equipe.iterrows():
-    col1, col2, col3, col4, col5, col6, col7 = st.columns(dist_colunas)
-
-    # NOME -----------------
-    col1.write(row["Nome"])
-
-    # PROJETOS -----------------
-
-    # Tratando a coluna projetos, que pode ter múltiplos valores------
-    projetos = row.get("Projetos", [])
-    # Garante que 'projetos' seja uma lista
-    if isinstance(projetos, str):
-        projetos = [projetos]
-    elif not isinstance(projetos, list):
-        projetos = []
-    # Exibe de forma amigável
-    if len(projetos) == 0:
-        col2.write("")
-    elif len(projetos) == 1:
-        col2.write(projetos[0])
-    else:
-        col2.write(", ".join(projetos))
-    
-
-    # E-MAIL -----------------
-
-    col3.write(row["E-mail"])
-
-    # TELEFONE -----------------
-    col4.write(row["Telefone"])
-
-    # TIPO DE USUÁRIO -----------------
-    tipo_usuario = row.get("Tipo de usuário", "").strip()
-
-    col5.write(tipo_usuario)
-
-    # STATUS -----------------       
-    col6.write(row["Status"])
-
-    # BOTÃO DE EDITAR -----------------
-    col7.button(":material/edit:", key=row["_id"], on_click=editar_pessoa, args=(row["_id"],))
-
+# Lista paginada da equipe e administradores (filtro, ordenação e paginação no MongoDB)
+lista_pessoas(
+    chave="lista_equipe",
+    colecao=col_pessoas,
+    filtro={"tipo_usuario": {"$in": ["admin", "equipe"]}},
+    colunas=[
+        ("nome_completo", "Nome", 3),
+        ("projetos", "Projetos", 4),
+        ("e_mail", "E-mail", 3),
+        ("telefone", "Telefone", 2),
+        ("tipo_usuario", "Tipo de usuário", 3),
+        ("status", "Status", 2),
+    ],
+    ao_editar=editar_pessoa,
+    editaveis={
+        "nome_completo": None,
+        "telefone": None,
+        "tipo_usuario": ["admin", "equipe", "avaliador", "visitante"],
+        "status": ["ativo", "inativo"],
+    },
+    acoes=["inativar", "alterar_tipo", "reenviar_convite"],
+)
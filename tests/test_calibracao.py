@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+
+from funcoes_calibracao import alfa_krippendorff, zscores_por_avaliador
+
+
+###########################################################################################################
+# Z-SCORE POR AVALIADOR
+###########################################################################################################
+
+
+def test_zscore_por_avaliador():
+    # Colunas: avaliador com notas 1 e 3, avaliador com notas iguais, avaliador com uma única nota
+    matriz = np.array([
+        [1.0, 5.0, 7.0],
+        [3.0, 5.0, np.nan],
+    ])
+
+    z = zscores_por_avaliador(matriz)
+
+    # Média 2 e desvio (populacional) 1
+    np.testing.assert_allclose(z[:, 0], [-1.0, 1.0])
+    # Desvio 0: z = 0 nas notas dadas, NaN onde não avaliou
+    np.testing.assert_array_equal(z[:, 1], [0.0, 0.0])
+    assert z[0, 2] == 0.0
+    assert np.isnan(z[1, 2])
+
+
+
+###########################################################################################################
+# ALFA DE KRIPPENDORFF
+###########################################################################################################
+
+
+def test_alfa_calculado_a_mao():
+    # P1: notas 1 e 2; P2: notas 3 e 3; P3 tem uma nota só e fica de fora.
+    # Discordância observada = (2 + 0) / 4 = 1/2
+    # Discordância esperada (valores 1, 2, 3, 3) = 22 / (4 * 3) = 11/6
+    # Alfa = 1 - (1/2) / (11/6) = 8/11
+    matriz = np.array([
+        [1.0, 2.0, np.nan],
+        [3.0, np.nan, 3.0],
+        [np.nan, 4.0, np.nan],
+    ])
+
+    assert math.isclose(alfa_krippendorff(matriz), 8 / 11)
+
+
+
+def test_alfa_notas_todas_iguais():
+    matriz = np.array([
+        [5.0, 5.0],
+        [5.0, 5.0],
+    ])
+
+    assert alfa_krippendorff(matriz) == 1.0
+
+
+
+def test_alfa_sem_projetos_com_duas_notas():
+    matriz = np.array([
+        [1.0, np.nan],
+        [np.nan, 2.0],
+    ])
+
+    assert math.isnan(alfa_krippendorff(matriz))
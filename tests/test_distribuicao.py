@@ -0,0 +1,84 @@
+from funcoes_distribuicao import distribuir_projetos
+
+
+###########################################################################################################
+# DISTRIBUIÇÃO AUTOMÁTICA: LIMITES E CONFLITOS
+###########################################################################################################
+
+
+def revisores_por_projeto(nova: dict) -> dict:
+    """{codigo_recebimento: [avaliadores]} a partir de {id_avaliador: [códigos]}."""
+
+    revisores = {}
+    for id_avaliador, codigos in nova.items():
+        for codigo in codigos:
+            revisores.setdefault(codigo, []).append(id_avaliador)
+    return revisores
+
+
+
+def test_distribui_por_projeto_sem_repetir_avaliador():
+    nova, faltantes = distribuir_projetos(["P1", "P2", "P3"], ["a", "b", "c"], {}, 2)
+
+    revisores = revisores_por_projeto(nova)
+
+    assert faltantes == {}
+    assert all(len(revisores[p]) == 2 and len(set(revisores[p])) == 2 for p in ["P1", "P2", "P3"])
+    # 6 vagas para 3 avaliadores: carga equilibrada
+    assert sorted(len(c) for c in nova.values()) == [2, 2, 2]
+
+
+
+def test_respeita_limite_do_avaliador():
+    nova, faltantes = distribuir_projetos(["P1", "P2", "P3", "P4"], ["a", "b", "c"], {}, 2, limites={"a": 1})
+
+    assert faltantes == {}
+    assert len(nova["a"]) == 1
+    # As 7 vagas restantes ficam com os outros dois
+    assert len(nova["b"]) + len(nova["c"]) == 7
+
+
+
+def test_vagas_sem_avaliador_disponivel_viram_faltantes():
+    nova, faltantes = distribuir_projetos(
+        ["P1", "P2"], ["a", "b", "c"], {}, 2, limites={"a": 1, "b": 1, "c": 1}
+    )
+
+    assert all(len(c) == 1 for c in nova.values())
+    assert sum(faltantes.values()) == 1
+
+
+
+def test_nao_atribui_em_conflito_de_interesse():
+    conflitos = {("a", "P1"), ("b", "P1")}
+
+    nova, faltantes = distribuir_projetos(["P1", "P2"], ["a", "b", "c"], {}, 2, conflitos=conflitos)
+
+    assert revisores_por_projeto(nova)["P1"] == ["c"]
+    assert faltantes == {"P1": 1}
+    assert not any((a, c) in conflitos for a, codigos in nova.items() for c in codigos)
+
+
+
+def test_mantem_atribuicoes_atuais_e_retira_as_em_conflito():
+    atual = {"a": ["P1"], "b": ["P2"]}
+
+    nova, faltantes = distribuir_projetos(["P1", "P2"], ["a", "b", "c"], atual, 2, conflitos={("a", "P1")})
+
+    revisores = revisores_por_projeto(nova)
+
+    assert faltantes == {}
+    assert "a" not in revisores["P1"]
+    assert "b" in revisores["P2"]
+    assert len(revisores["P1"]) == len(revisores["P2"]) == 2
+
+
+
+def test_numero_de_avaliadores_por_projeto():
+    nova, faltantes = distribuir_projetos(["P1", "P2"], ["a", "b", "c"], {}, {"P1": 3, "P2": 1})
+
+    revisores = revisores_por_projeto(nova)
+
+    assert faltantes == {}
+    assert len(revisores["P1"]) == 3
+    assert len(revisores["P2"]) == 1
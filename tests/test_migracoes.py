@@ -0,0 +1,45 @@
+from bson import ObjectId
+
+from migracoes import ordenar_duplicadas
+
+
+###########################################################################################################
+# E-MAILS DUPLICADOS
+###########################################################################################################
+
+# Os ids crescem com a ordem de criação: antigo < meio < novo
+antigo = ObjectId("000000000000000000000001")
+meio = ObjectId("000000000000000000000002")
+novo = ObjectId("000000000000000000000003")
+
+
+
+def test_mantem_quem_tem_hash_de_senha():
+    # O hash bcrypt é gravado como binData; senha None ou ausente não conta como senha
+    pessoas = [
+        {"_id": antigo, "ativo": True, "tipo_senha": "null"},
+        {"_id": meio, "ativo": True, "tipo_senha": "missing"},
+        {"_id": novo, "ativo": True, "tipo_senha": "binData"},
+    ]
+
+    assert ordenar_duplicadas(pessoas)[0]["_id"] == novo
+
+
+
+def test_ativa_tem_preferencia_sobre_senha():
+    pessoas = [
+        {"_id": antigo, "ativo": False, "tipo_senha": "binData"},
+        {"_id": novo, "ativo": True, "tipo_senha": "missing"},
+    ]
+
+    assert ordenar_duplicadas(pessoas)[0]["_id"] == novo
+
+
+
+def test_empate_fica_com_o_cadastro_mais_antigo():
+    pessoas = [
+        {"_id": novo, "ativo": True, "tipo_senha": "null"},
+        {"_id": antigo, "ativo": True, "tipo_senha": "missing"},
+    ]
+
+    assert [p["_id"] for p in ordenar_duplicadas(pessoas)] == [antigo, novo]